@@ -0,0 +1,101 @@
+import os
+import re
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Batch limits for one LLM call, and how many batches of a request run at once
+LLM_BATCH_MAX_IMAGES = int(os.environ.get("LLM_BATCH_MAX_IMAGES", 6))
+LLM_BATCH_MAX_BYTES = int(os.environ.get("LLM_BATCH_MAX_BYTES", 3_000_000))
+LLM_BATCH_PARALLELISM = int(os.environ.get("LLM_BATCH_PARALLELISM", 4))
+
+# Words that distinguish the two sides of the same card in a filename
+_SIDE_WORDS = re.compile(r"(?<![a-z])(front|back|frontside|backside|side|page|pg|f|b)(?![a-z])")
+_SEPARATORS = re.compile(r"[\s_\-\.()\[\]]+")
+
+
+def pairing_key(filename: str) -> str:
+    """
+    Normalizes a filename so the two sides of a card land on the same key:
+    "Aadhar_Front.jpg" and "aadhar back.png" both become "aadhar".
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    stem = _SEPARATORS.sub(" ", stem)
+    stem = _SIDE_WORDS.sub(" ", stem)
+    stem = re.sub(r"\d+", " ", stem)
+    return " ".join(stem.split()) or stem
+
+
+def _group_pages(items: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Groups page indices that should share a batch: pages of the same file
+    (kept in page order) and files whose names differ only by side words.
+    Groups are ordered by first appearance.
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        groups.setdefault(pairing_key(item["filename"]), []).append(i)
+    return list(groups.values())
+
+
+def plan_batches(items: List[Dict[str, Any]], sizes: List[int],
+                 max_images: Optional[int] = None, max_bytes: Optional[int] = None) -> List[List[int]]:
+    """
+    Splits pages into batches bounded by image count and payload bytes.
+    Related pages (see _group_pages) stay together when the group fits; an
+    oversized group is cut into runs of adjacent pages, even-length where
+    possible so front/back pairs aren't separated. Deterministic for a given input.
+    Returns batches as lists of indices into items.
+    """
+    max_images = max_images or LLM_BATCH_MAX_IMAGES
+    max_bytes = max_bytes or LLM_BATCH_MAX_BYTES
+    # Cut each group into chunks that individually respect the limits
+    chunks: List[List[int]] = []
+    for group in _group_pages(items):
+        chunk: List[int] = []
+        chunk_bytes = 0
+        for i in group:
+            if chunk and (len(chunk) >= max_images or chunk_bytes + sizes[i] > max_bytes):
+                # Prefer cutting after an even number of pages (keeps adjacent pairs)
+                if len(chunk) > 2 and len(chunk) % 2 == 1:
+                    carry = chunk.pop()
+                    chunks.append(chunk)
+                    chunk, chunk_bytes = [carry], sizes[carry]
+                else:
+                    chunks.append(chunk)
+                    chunk, chunk_bytes = [], 0
+            chunk.append(i)
+            chunk_bytes += sizes[i]
+        if chunk:
+            chunks.append(chunk)
+
+    # First-fit the chunks into batches, in order
+    batches: List[List[int]] = []
+    batch_bytes: List[int] = []
+    for chunk in chunks:
+        size = sum(sizes[i] for i in chunk)
+        for b, batch in enumerate(batches):
+            if len(batch) + len(chunk) <= max_images and batch_bytes[b] + size <= max_bytes:
+                batch.extend(chunk)
+                batch_bytes[b] += size
+                break
+        else:
+            batches.append(list(chunk))
+            batch_bytes.append(size)
+
+    # Keep the original page order inside each batch
+    return [sorted(batch) for batch in batches]
+
+
+async def run_batches(batches: List[List[int]], worker: Callable[[List[int]], Awaitable[Any]],
+                      parallelism: Optional[int] = None) -> List[Any]:
+    """
+    Runs worker(batch) for every batch with at most `parallelism` in flight.
+    Results come back in batch order regardless of completion order.
+    """
+    semaphore = asyncio.Semaphore(max(1, parallelism or LLM_BATCH_PARALLELISM))
+
+    async def run_one(batch):
+        async with semaphore:
+            return await worker(batch)
+
+    return await asyncio.gather(*(run_one(batch) for batch in batches))
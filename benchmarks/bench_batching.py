@@ -0,0 +1,76 @@
+"""
+Latency of batched LLM extraction for 4, 10 and 40 images, against the
+local mock server (fixed cost per call plus a cost per image, like a real
+vision model). Compares a single call carrying every image with the
+batching scheduler at a few batch sizes / parallelism settings.
+
+Usage:
+    python benchmarks/bench_batching.py [--latency 0.4] [--per-image-latency 0.15]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw
+
+from mock_llm_server import MockConfig, run_in_thread
+from page import Page
+import batch_scheduler
+import llm_extractor
+
+# (label, max images per batch, parallelism)
+CONFIGS = [
+    ("single call", 10_000, 1),
+    ("batch 4 x 4", 4, 4),
+    ("batch 6 x 4", 6, 4),
+    ("batch 4 x 8", 4, 8),
+]
+
+
+def make_items(count: int) -> list:
+    items = []
+    for i in range(count):
+        img = Image.new("RGB", (856, 540), (255, 255, 255))
+        ImageDraw.Draw(img).rectangle((40, 40, 816, 500), outline=(0, 0, 0), fill=(200 + i % 50, 220, 240))
+        side = "front" if i % 2 == 0 else "back"
+        items.append({"page": Page.from_pil(img), "filename": f"applicant{i // 2}_{side}.jpg"})
+    return items
+
+
+async def run(args, base_url):
+    print(f"{'images':>6} {'config':<14} {'calls':>6} {'latency s':>10}")
+    for count in (4, 10, 40):
+        for label, max_images, parallelism in CONFIGS:
+            backend = llm_extractor.AsyncLLMBackend(api_key="test", base_url=base_url)
+            items = make_items(count)
+            batch_scheduler.LLM_BATCH_MAX_IMAGES = max_images
+            batch_scheduler.LLM_BATCH_PARALLELISM = parallelism
+            start = time.perf_counter()
+            await llm_extractor.extract_all_documents(backend, items)
+            elapsed = time.perf_counter() - start
+            print(f"{count:>6} {label:<14} {backend.stats['calls']:>6} {elapsed:>10.2f}")
+            await backend.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--per-image-latency", type=float, default=0.15)
+    parser.add_argument("--port", type=int, default=8013)
+    args = parser.parse_args()
+
+    server, base_url = run_in_thread(MockConfig(latency=args.latency, per_image_latency=args.per_image_latency), port=args.port)
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
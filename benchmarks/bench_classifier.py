@@ -0,0 +1,193 @@
+"""
+Accuracy and speed of the local document classifier (document_classifier).
+
+Runs classify_page over a labelled set and reports overall and per-label
+accuracy, a confusion matrix, ID pages that would have been dropped (the
+costly mistake: those never reach the LLM), and ms/page.
+
+The labelled set is either a directory of real samples with a JSON file
+mapping filename -> label (aadhar_front, aadhar_back, pan, dl, blank,
+non_id; PDFs are labelled per file and every page gets that label), or, by
+default, synthetic pages: PAN-style pale blue cards, Aadhar backs with a
+tricolour header, perturbed copies of driving_licence_reference.jpg, blank
+scans and text-only cover letters. Synthetic pages carry no real face, so
+Aadhar fronts are only covered by --samples.
+
+Usage:
+    python benchmarks/bench_classifier.py [--samples DIR --labels labels.json] [--per-label 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from page import Page
+
+
+def _scan(card: Image.Image, rng: random.Random, a4: bool = False) -> Image.Image:
+    """Places the card on scanner background with a little rotation and noise."""
+    card = card.rotate(rng.uniform(-3, 3), expand=True, fillcolor=(250, 250, 250))
+    size = (1240, 1754) if a4 else (card.width + 120, card.height + 120)
+    canvas = Image.new("RGB", size, (250, 250, 250))
+    canvas.paste(card, (rng.randint(40, 80), rng.randint(40, 80)))
+    return canvas.filter(ImageFilter.GaussianBlur(rng.uniform(0, 0.8)))
+
+
+def _text(draw: ImageDraw.ImageDraw, lines: list, x: int, y: int, size: int = 26, fill=(20, 20, 20)):
+    font = ImageFont.load_default(size=size)
+    for line in lines:
+        draw.text((x, y), line, fill=fill, font=font)
+        y += int(size * 1.6)
+
+
+def synthetic_pan(rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", (1012, 638), (190, 222, 240))
+    draw = ImageDraw.Draw(img)
+    _text(draw, ["INCOME TAX DEPARTMENT", "GOVT. OF INDIA", "Permanent Account Number",
+                 "ABCPE1234F", "Name", "RAVI KUMAR", "Date of Birth", "01/01/1990"], 40, 30)
+    return _scan(img, rng, a4=rng.random() < 0.5)
+
+
+def synthetic_aadhar_back(rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", (1012, 638), (252, 252, 250))
+    draw = ImageDraw.Draw(img)
+    # Tricolour header band
+    draw.rectangle((0, 0, 1012, 40), fill=(240, 130, 30))
+    draw.rectangle((0, 40, 1012, 60), fill=(255, 255, 255))
+    draw.rectangle((0, 60, 1012, 90), fill=(40, 150, 60))
+    _text(draw, ["Unique Identification Authority of India", "Address: S/O Suresh Kumar,",
+                 "12 MG Road, New Delhi 110001", "2345 6789 0123"], 40, 130)
+    # QR code stand-in
+    for _ in range(300):
+        x, y = rng.randrange(760, 960, 10), rng.randrange(330, 530, 10)
+        draw.rectangle((x, y, x + 9, y + 9), fill=(0, 0, 0))
+    return _scan(img, rng)
+
+
+def synthetic_dl(rng: random.Random) -> Image.Image:
+    ref = Image.open(os.path.join(ROOT, "driving_licence_reference.jpg")).convert("RGB")
+    scale = rng.uniform(0.7, 1.2)
+    ref = ref.resize((int(ref.width * scale), int(ref.height * scale)))
+    return _scan(ref, rng)
+
+
+def synthetic_blank(rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", (1240, 1754), (248, 248, 246))
+    draw = ImageDraw.Draw(img)
+    # Scanner specks
+    for _ in range(rng.randint(0, 30)):
+        x, y = rng.randrange(1240), rng.randrange(1754)
+        draw.point((x, y), fill=(200, 200, 200))
+    return img
+
+
+def synthetic_letter(rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", (1240, 1754), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    words = "the applicant requests that the enclosed documents be verified for the account opening process".split()
+    lines = ["To,", "The Branch Manager,", "", "Subject: Submission of KYC documents", ""]
+    lines += [" ".join(rng.choice(words) for _ in range(11)) for _ in range(rng.randint(12, 25))]
+    lines += ["", "Yours faithfully,", "Ravi Kumar"]
+    _text(draw, lines, 100, 120, size=24)
+    return img
+
+
+SYNTHETIC = {
+    "pan": synthetic_pan,
+    "aadhar_back": synthetic_aadhar_back,
+    "dl": synthetic_dl,
+    "blank": synthetic_blank,
+    "non_id": synthetic_letter,
+}
+
+
+def load_samples(samples_dir: str, labels_path: str) -> list:
+    from pdf_processor import render_pdf_pages, load_image_page
+    with open(labels_path) as f:
+        labels = json.load(f)
+    dataset = []
+    for filename, label in sorted(labels.items()):
+        path = os.path.join(samples_dir, filename)
+        if filename.lower().endswith(".pdf"):
+            pages = render_pdf_pages(path)
+        else:
+            page = load_image_page(path)
+            pages = [page] if page is not None else []
+        if not pages:
+            print(f"skipping {filename}: could not load")
+        dataset.extend((f"{filename}#{i + 1}", label, page) for i, page in enumerate(pages))
+    return dataset
+
+
+def synthetic_dataset(per_label: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [(f"{label}_{i}", label, Page.from_pil(make(rng)))
+            for label, make in SYNTHETIC.items() for i in range(per_label)]
+
+
+def evaluate(dataset: list) -> dict:
+    from document_classifier import classify_page, DROP_LABELS
+    # Warm-up: template descriptors and the face cascade load once per process
+    classify_page(dataset[0][2])
+    confusion = defaultdict(Counter)
+    timings = []
+    wrongly_dropped = []
+    for name, expected, page in dataset:
+        start = time.perf_counter()
+        result = classify_page(page)
+        timings.append((time.perf_counter() - start) * 1000)
+        confusion[expected][result.label] += 1
+        if result.label in DROP_LABELS and expected not in DROP_LABELS:
+            wrongly_dropped.append((name, expected, result.label))
+    timings.sort()
+    return {
+        "confusion": confusion,
+        "correct": sum(row[label] for label, row in confusion.items()),
+        "total": len(dataset),
+        "wrongly_dropped": wrongly_dropped,
+        "ms_mean": sum(timings) / len(timings),
+        "ms_p50": timings[len(timings) // 2],
+        "ms_p95": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of labelled sample files")
+    parser.add_argument("--labels", help="JSON file mapping sample filename -> label")
+    parser.add_argument("--per-label", type=int, default=20, help="Synthetic pages per label")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.samples:
+        if not args.labels:
+            sys.exit("--samples needs --labels")
+        dataset = load_samples(args.samples, args.labels)
+    else:
+        dataset = synthetic_dataset(args.per_label, args.seed)
+    if not dataset:
+        sys.exit("no pages to classify")
+
+    r = evaluate(dataset)
+    predicted = sorted({p for row in r["confusion"].values() for p in row})
+    print(f"{'expected':<14} {'n':>4} {'acc':>6}   " + " ".join(f"{p:>12}" for p in predicted))
+    for label, row in sorted(r["confusion"].items()):
+        n = sum(row.values())
+        print(f"{label:<14} {n:>4} {row[label] / n:>6.1%}   " + " ".join(f"{row[p]:>12}" for p in predicted))
+    print(f"\naccuracy: {r['correct']}/{r['total']} = {r['correct'] / r['total']:.1%}")
+    print(f"ID pages wrongly dropped: {len(r['wrongly_dropped'])}")
+    for name, expected, got in r["wrongly_dropped"]:
+        print(f"  {name}: {expected} -> {got}")
+    print(f"ms/page: mean {r['ms_mean']:.1f}, p50 {r['ms_p50']:.1f}, p95 {r['ms_p95']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Concurrent-request throughput benchmark for process_files_logic.
+
+Renders a synthetic multi-page PDF per request and points the LLM backend at
+the local mock server with a fixed latency, so the numbers reflect how well
+the render / encode / face stages overlap across requests. Each worker count runs in a fresh subprocess
+because the pool sizes are read from the environment at import time.
+
+Usage:
+    python benchmarks/bench_concurrency.py --requests 16 --pages 4 --workers 1 2 4
+"""
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4 in points
+        page.insert_text((72, 72), f"Synthetic page {i + 1}", fontsize=24)
+        page.draw_rect(fitz.Rect(72, 120, 520, 400), color=(0.2, 0.3, 0.8), fill=(0.9, 0.9, 1.0))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def run_worker(requests: int, pages: int, llm_latency: float, port: int):
+    os.chdir(ROOT)
+    from mock_llm_server import MockConfig, run_in_thread
+    server, base_url = run_in_thread(MockConfig(latency=llm_latency), port=port)
+    os.environ["LLM_BASE_URL"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "test")
+
+    from starlette.datastructures import UploadFile
+    import main
+
+    pdf_bytes = make_pdf(pages)
+
+    async def one_request(i):
+        upload = UploadFile(file=io.BytesIO(pdf_bytes), filename=f"bench_{i}.pdf")
+        try:
+            await main.process_files_logic([upload])
+        except Exception:
+            pass
+
+    async def run_all():
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_all())
+    main.shutdown_executors()
+    server.should_exit = True
+    print(json.dumps({"elapsed": elapsed, "requests": requests}))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_worker(args.requests, args.pages, args.llm_latency, args.port)
+        return
+
+    print(f"{'cpu workers':>12} {'elapsed s':>10} {'req/s':>8}")
+    for workers in args.workers:
+        env = dict(os.environ, CPU_WORKERS=str(workers), CPU_QUEUE_DEPTH=str(args.requests * args.pages * 4))
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(args.requests),
+             "--pages", str(args.pages), "--llm-latency", str(args.llm_latency), "--port", str(args.port)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{workers:>12} {result['elapsed']:>10.2f} {result['requests'] / result['elapsed']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,213 @@
+"""
+Near-duplicate page detection: hashing throughput, accuracy and LLM savings.
+
+    throughput  hash_page over a large batch of A4 scans, as rendered pixel
+                pages and as passthrough JPEG pages (PDF fast path), plus
+                find_duplicates over --hashes random hashes
+    accuracy    pairs that should collapse (the same scan as a JPG and inside
+                a PDF, downscaled + re-encoded at q60, a second scan of the
+                same card) and pairs that must not (the same card type of
+                two different applicants): merged count per kind
+    savings     end to end through the app with the mock LLM: each applicant
+                uploads their four JPGs plus a PDF of the same scans, with
+                PAGE_DEDUP_ENABLED=0 and =1. Reports LLM images and bytes
+                sent, and checks every upload is still in "Source Files"
+
+Usage:
+    python benchmarks/bench_dedup.py [--pages 200] [--applicants 6] [--hashes 10000]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def card_images(applicant):
+    from PIL import Image
+    return [Image.open(io.BytesIO(data)).convert("RGB") for data, _ in applicant.files.values()]
+
+
+def same_scan_pdf(applicant) -> bytes:
+    """The applicant's four JPG scans again, as a scanner PDF."""
+    import synthetic_docs as sd
+    return sd._pdf(card_images(applicant))
+
+
+def bench_throughput(args):
+    import synthetic_docs as sd
+    from page import Page
+    from pdf_processor import render_pdf_pages
+    from page_dedup import hash_page, find_duplicates, PageHash
+
+    rendered = []
+    i = 0
+    while len(rendered) < args.pages:
+        rendered += render_pdf_pages(same_scan_pdf(sd.make_applicant(i)))
+        i += 1
+    rendered = rendered[:args.pages]
+    passthrough = [Page.from_jpeg(p.jpeg, p.width, p.height) for p in rendered]
+    print(f"throughput: {len(rendered)} pages, {rendered[0].width}x{rendered[0].height} px")
+    for name, pages in (("pixels", rendered), ("jpeg", passthrough)):
+        start = time.perf_counter()
+        for page in pages:
+            hash_page(page)
+        elapsed = time.perf_counter() - start
+        print(f"  hash_page ({name:<6}) {len(pages) / elapsed:>8.1f} pages/s  {elapsed / len(pages) * 1000:>6.2f} ms/page")
+
+    rng = random.Random(0)
+    hashes = [PageHash(rng.getrandbits(64), rng.getrandbits(64), 1.0, (0, 0, 1, 1), 0.0) for _ in range(args.hashes)]
+    start = time.perf_counter()
+    duplicates = find_duplicates(hashes)
+    elapsed = time.perf_counter() - start
+    print(f"  find_duplicates    {args.hashes} random hashes in {elapsed * 1000:.0f} ms "
+          f"({sum(d is not None for d in duplicates)} false candidates without verification)\n")
+
+
+def bench_accuracy(args):
+    from PIL import Image
+    import synthetic_docs as sd
+    from pdf_processor import load_image_page, render_pdf_pages
+    from page_dedup import dedupe_pages
+
+    def requant(img):
+        buffered = io.BytesIO()
+        img.resize((img.width * 2 // 3, img.height * 2 // 3), Image.BILINEAR).save(buffered, "JPEG", quality=60)
+        return load_image_page(buffered.getvalue())
+
+    applicants = [sd.make_applicant(i) for i in range(args.applicants)]
+    jpgs = [[load_image_page(data) for data, _ in a.files.values()] for a in applicants]
+    kinds = {"jpg vs pdf": [], "re-encoded": [], "rescan": [], "different people": []}
+    for i, a in enumerate(applicants):
+        for page, other in zip(jpgs[i], render_pdf_pages(same_scan_pdf(a))):
+            kinds["jpg vs pdf"].append((page, other))
+        for page, img in zip(jpgs[i], card_images(a)):
+            kinds["re-encoded"].append((page, requant(img)))
+        rescans = render_pdf_pages(list(sd.make_applicant(i, as_pdf=True, repeat=2).files.values())[0][0])
+        kinds["rescan"] += list(zip(rescans[::2], rescans[1::2]))
+        for j in range(i + 1, len(applicants)):
+            kinds["different people"] += list(zip(jpgs[i], jpgs[j]))
+
+    print(f"accuracy: pairs merged by dedupe_pages")
+    for name, pairs in kinds.items():
+        merged, elapsed = 0, 0.0
+        for a, b in pairs:
+            start = time.perf_counter()
+            merged += dedupe_pages([a, b]).duplicate_of[1] is not None
+            elapsed += time.perf_counter() - start
+        print(f"  {name:<17} {merged:>4}/{len(pairs):<4} {elapsed / len(pairs) * 1000:>6.1f} ms/pair")
+    print()
+
+
+def run_config(args) -> dict:
+    """End-to-end run for one PAGE_DEDUP_ENABLED value. Runs in its own process; prints a JSON result line."""
+    work = tempfile.mkdtemp(prefix="bench_dedup_")
+    os.makedirs(os.path.join(work, "static"))
+    shutil.copy(os.path.join(ROOT, "driving_licence_reference.jpg"), work)
+    os.chdir(work)
+
+    mock_port = free_port()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{mock_port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "test")
+    os.environ["EXTRACTION_CACHE_ENABLED"] = "0"
+    os.environ["TRACE_LOG"] = "0"
+    os.environ["PAGE_DEDUP_ENABLED"] = "1" if args.dedup else "0"
+    # Every page is a pool task; let a whole request through the queue on small machines
+    os.environ.setdefault("CPU_QUEUE_DEPTH", "256")
+
+    from synthetic_docs import make_applicant, documents_by_file
+    applicants = [make_applicant(i) for i in range(args.applicants)]
+    uploads = []
+    for i, a in enumerate(applicants):
+        files = [(name, data, ctype) for name, (data, ctype) in a.files.items()]
+        files.append((f"applicant{i}_scans.pdf", same_scan_pdf(a), "application/pdf"))
+        # The PDF holds the same cards, so the mock answers for it what it answers for the JPGs
+        a.expected[f"applicant{i}_scans.pdf"] = [dict(d, **{"Source Files": [f"applicant{i}_scans.pdf"]})
+                                                for docs in list(a.expected.values())[1:] for d in docs]
+        uploads.append(files)
+
+    from mock_llm_server import MockConfig, run_in_thread
+    mock, _ = run_in_thread(MockConfig(latency=0.05, documents_by_file=documents_by_file(applicants)), port=mock_port)
+
+    from fastapi.testclient import TestClient
+    import main
+    from metrics import DEDUP_PAGES, DEDUP_BYTES_SAVED
+
+    statuses, missing = {}, 0
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        for files in uploads:
+            response = client.post("/extract/?response_mode=url",
+                                   files=[("files", (name, data, ctype)) for name, data, ctype in files])
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code == 200:
+                cited = {name for doc in response.json().get("data", []) for name in doc.get("Source Files", [])}
+                missing += sum(1 for name, _, _ in files if name not in cited)
+    elapsed = time.perf_counter() - start
+    stats = mock.config.app.state.stats
+    return {
+        "config": "dedup on" if args.dedup else "dedup off",
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 2),
+        "llm_images": stats["images"],
+        "llm_kb": round(stats["image_bytes"] / 1024, 1),
+        "pages_deduped": DEDUP_PAGES.value(),
+        "bytes_saved_kb": round(DEDUP_BYTES_SAVED.value() / 1024, 1),
+        "uploads_missing_from_sources": missing,
+    }
+
+
+def bench_savings(args):
+    print(f"savings: {args.applicants} requests of 4 JPGs + a PDF of the same scans")
+    for dedup in (0, 1):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--dedup", str(dedup),
+               "--applicants", str(args.applicants)]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+        if out.returncode != 0 or not lines:
+            print(out.stderr[-2000:])
+            continue
+        r = json.loads(lines[-1])
+        print(f"  {r['config']:<10} LLM images {r['llm_images']:>4}  {r['llm_kb']:>8} KB  "
+              f"deduped {r['pages_deduped']:>4g}  saved {r['bytes_saved_kb']:>7} KB  "
+              f"uploads missing from sources {r['uploads_missing_from_sources']}  "
+              f"{r['elapsed_s']}s  statuses {r['statuses']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Batch size for the throughput run")
+    parser.add_argument("--applicants", type=int, default=6)
+    parser.add_argument("--hashes", type=int, default=10000)
+    parser.add_argument("--only", choices=("throughput", "accuracy", "savings"))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dedup", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(args)))
+        return
+    for name, run in (("throughput", bench_throughput), ("accuracy", bench_accuracy), ("savings", bench_savings)):
+        if args.only in (None, name):
+            run(args)
+
+
+if __name__ == "__main__":
+    main_cli()
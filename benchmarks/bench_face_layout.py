@@ -0,0 +1,116 @@
+"""
+Layout-aware face cropping vs full-frame detection, on synthetic cards.
+
+Each applicant contributes four pages (Aadhar front with a ghost image,
+Aadhar back, PAN, DL): the card is pasted at a known offset onto a white
+scan-sized page and upscaled by --upscale, so the true photo box is known.
+Every page is searched with:
+
+    full          full-frame detection, largest face (the previous behaviour)
+    layout:type   photo region from the document type, full-frame fallback
+                  (what the pipeline does when the classifier is off)
+    layout:label  photo region from the page label (Aadhar back skipped)
+
+A page scores "hit" when the chosen face's centre is inside the true photo
+box, "wrong" when a face elsewhere was chosen, "miss" when a photo page
+yielded nothing and "false+" when a face was reported on an Aadhar back.
+
+Usage:
+    python benchmarks/bench_face_layout.py [--applicants 10] [--upscale 2] [--repeat 3]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from PIL import Image
+
+import synthetic_docs as sd
+from page import Page
+from face_extractor import FaceDetector, photo_regions
+from payload_optimizer import find_content_bbox
+
+# card builder, classifier label, extracted document type, true photo box
+CARDS = [
+    (sd.aadhar_front, "aadhar_front", {"Document Type": "Aadhar", "Sides Detected": ["Front", "Back"]}, sd.AADHAR_PHOTO),
+    (sd.aadhar_back, "aadhar_back", {"Document Type": "Aadhar", "Sides Detected": ["Front", "Back"]}, None),
+    (sd.pan_card, "pan", {"Document Type": "PAN"}, sd.PAN_PHOTO),
+    (sd.dl_card, "dl", {"Document Type": "Driving Licence"}, sd.DL_PHOTO),
+]
+
+
+def build_pages(applicants: int, upscale: float):
+    """[(card label, page, doc, true box in page pixels or None)]"""
+    pages = []
+    for i in range(applicants):
+        rng = random.Random(1000 + i)
+        a = sd.make_applicant(i)
+        for build, label, doc, photo in CARDS:
+            card = build(a, rng)
+            ox, oy = rng.randint(40, 160), rng.randint(40, 160)
+            canvas = Image.new("RGB", (card.width + 2 * ox, card.height + 2 * oy), (250, 250, 250))
+            canvas.paste(card, (ox, oy))
+            canvas = canvas.resize((int(canvas.width * upscale), int(canvas.height * upscale)), Image.BILINEAR)
+            box = None
+            if photo:
+                x, y, w, h = photo
+                box = tuple(int(v * upscale) for v in (x + ox, y + oy, x + ox + w, y + oy + h))
+            pages.append((label, Page.from_pil(canvas), doc, box))
+    return pages
+
+
+def score(face, box) -> str:
+    if box is None:
+        return "false+" if face is not None else "ok"
+    if face is None:
+        return "miss"
+    cx, cy = face[0] + face[2] / 2, face[1] + face[3] / 2
+    return "hit" if box[0] <= cx <= box[2] and box[1] <= cy <= box[3] else "wrong"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applicants", type=int, default=10)
+    parser.add_argument("--upscale", type=float, default=2.0, help="Page scale (2 ~ a card rendered at 600 DPI)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = build_pages(args.applicants, args.upscale)
+    detector = FaceDetector()
+    detector.cascade  # load outside the timings
+    print(f"{len(pages)} pages, {pages[0][1].width}x{pages[0][1].height} px\n")
+
+    modes = {
+        "full": lambda label, doc: None,
+        "layout:type": lambda label, doc: photo_regions(doc),
+        "layout:label": lambda label, doc: photo_regions(doc, label),
+    }
+    print(f"{'mode':<14} {'ms/page':>8} {'hit':>5} {'wrong':>6} {'miss':>5} {'false+':>7} {'roi':>5} {'fallback':>9} {'skipped':>8}")
+    for name, regions_for in modes.items():
+        counts = {"hit": 0, "wrong": 0, "miss": 0, "false+": 0, "ok": 0, "roi": 0, "full": 0, "skipped": 0}
+        elapsed = 0.0
+        for _ in range(args.repeat):
+            for label, page, doc, box in pages:
+                page.derived.clear()  # the content box is recomputed per search, as in a pool worker
+                regions = regions_for(label, doc)
+                start = time.perf_counter()
+                bounds = find_content_bbox(page) if regions else None
+                face, how = detector.locate(page.array, rgb=True, regions=regions, bounds=bounds)
+                elapsed += time.perf_counter() - start
+                counts[score(face, box)] += 1
+                if regions is not None:
+                    counts[how or "full"] += 1
+        n = len(pages) * args.repeat
+        photo_pages = sum(1 for p in pages if p[3]) * args.repeat
+        print(f"{name:<14} {elapsed / n * 1000:>8.1f} {counts['hit'] / photo_pages:>5.0%} {counts['wrong']:>6} "
+              f"{counts['miss']:>5} {counts['false+']:>7} {counts['roi']:>5} {counts['full']:>9} {counts['skipped']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Identity merging: the original pairwise loop against the hash-indexed
+IdentityResolver, plus the persistent cross-request index.
+
+Synthetic records simulate a bulk run: each person contributes Aadhar front,
+Aadhar back, PAN and DL records, with number formatting varied between
+records ("1234 5678 9012" vs "123456789012"). The pairwise loop is O(n^2), so it
+only runs on a prefix (--legacy-docs), where the groupings are also checked
+against the resolver for equality.
+
+Usage:
+    python benchmarks/bench_identity.py [--docs 100000] [--legacy-docs 4000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from identity_resolver import IdentityResolver, IdentityIndex
+
+FIRST = ["Ravi", "Atul", "Priya", "Sunita", "Mohammed", "Anil", "Deepa", "Karan", "Meena", "Vikram"]
+LAST = ["Kumar", "Sharma", "Verma", "Iyer", "Khan", "Reddy", "Das", "Patel", "Singh", "Nair"]
+
+
+def make_documents(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    docs = []
+    person = 0
+    while len(docs) < count:
+        # Unique-ish names: common first/last plus a per-person middle name
+        name = f"{rng.choice(FIRST)} {rng.choice(LAST)} {person:06d}"
+        aadhar = f"{rng.randrange(10**11, 10**12)}"
+        pan = f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))}{rng.randrange(1000, 9999)}P"
+        spaced = " ".join(aadhar[i:i + 4] for i in range(0, 12, 4))
+        files = [f"p{person}_{kind}.jpg" for kind in ("af", "ab", "pan", "dl")]
+        docs.append({"Document Type": "Aadhar", "Name": name, "Aadhar Number": spaced,
+                     "Sides Detected": ["Front"], "Source Files": [files[0]]})
+        docs.append({"Document Type": "Aadhar", "Aadhar Number": spaced, "Address": "12 MG Road",
+                     "Sides Detected": ["Back"], "Source Files": [files[1]]})
+        docs.append({"Document Type": "PAN", "Name": name.upper(), "PAN Number": pan, "Source Files": [files[2]]})
+        docs.append({"Document Type": "Driving Licence", "Name": name, "DL Number": f"HR01 {person:011d}",
+                     "Source Files": [files[3]]})
+        person += 1
+    docs = docs[:count]
+    rng.shuffle(docs)
+    return docs
+
+
+def legacy_merge(extracted_documents: list) -> list:
+    """The original pairwise merge loop (photo handling omitted)."""
+    merged_results = []
+
+    def normalize(s):
+        return str(s).lower().strip().replace("  ", " ") if s else ""
+
+    for doc in extracted_documents:
+        match_index = -1
+        doc_aadhar = normalize(doc.get("Aadhar Number"))
+        doc_pan = normalize(doc.get("PAN Number"))
+        doc_name = normalize(doc.get("Name"))
+        for i, existing in enumerate(merged_results):
+            ext_aadhar = normalize(existing.get("Aadhar Number"))
+            ext_pan = normalize(existing.get("PAN Number"))
+            ext_name = normalize(existing.get("Name"))
+            if doc_aadhar and ext_aadhar and doc_aadhar == ext_aadhar:
+                match_index = i
+                break
+            if doc_pan and ext_pan and doc_pan == ext_pan:
+                match_index = i
+                break
+            if doc_name and ext_name and len(doc_name) > 3 and doc_name == ext_name:
+                match_index = i
+                break
+        if match_index >= 0:
+            existing = merged_results[match_index]
+            types = set(existing.get("Document Type", "").split(" + "))
+            types.add(doc.get("Document Type", "Unknown"))
+            existing["Document Type"] = " + ".join(sorted(list(types)))
+            for k, v in doc.items():
+                if k in ["Document Type", "Sides Detected", "Source Files", "Photo Path"]: continue
+                if v and (k not in existing or not existing[k]):
+                    existing[k] = v
+            existing["Source Files"] = list(set(existing.get("Source Files", []) + doc.get("Source Files", [])))
+            existing["Sides Detected"] = list(set(existing.get("Sides Detected", []) + doc.get("Sides Detected", [])))
+        else:
+            merged_results.append(doc.copy())
+    return merged_results
+
+
+def groups(identities: list) -> set:
+    return {frozenset(d.get("Source Files", [])) for d in identities}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--legacy-docs", type=int, default=4_000)
+    args = parser.parse_args()
+
+    docs = make_documents(args.docs)
+    prefix = docs[:args.legacy_docs]
+
+    start = time.perf_counter()
+    legacy = legacy_merge([dict(d) for d in prefix])
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    small = IdentityResolver().add_all([dict(d) for d in prefix])
+    small_s = time.perf_counter() - start
+
+    print(f"{'method':<22} {'docs':>8} {'identities':>11} {'seconds':>9} {'docs/s':>11}")
+    print(f"{'pairwise loop':<22} {len(prefix):>8} {len(legacy):>11} {legacy_s:>9.3f} {len(prefix) / legacy_s:>11.0f}")
+    print(f"{'IdentityResolver':<22} {len(prefix):>8} {len(small):>11} {small_s:>9.3f} {len(prefix) / small_s:>11.0f}")
+
+    # The loop compares numbers as-is, so it misses spaced vs unspaced Aadhar and
+    # PAN case differences; on this data both formats are identical per person,
+    # so the groupings should match exactly.
+    print(f"groupings identical on prefix: {groups(legacy) == groups(small)}")
+
+    start = time.perf_counter()
+    identities = IdentityResolver().add_all([dict(d) for d in docs])
+    full_s = time.perf_counter() - start
+    print(f"{'IdentityResolver':<22} {len(docs):>8} {len(identities):>11} {full_s:>9.3f} {len(docs) / full_s:>11.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = IdentityIndex(os.path.join(tmp, "index.sqlite3"))
+        start = time.perf_counter()
+        index.link(identities)
+        first_s = time.perf_counter() - start
+        # A second submission by the same people (fresh records) must reuse their ids
+        again = IdentityResolver().add_all([dict(d) for d in docs])
+        start = time.perf_counter()
+        index.link(again)
+        second_s = time.perf_counter() - start
+        relinked = sum(a.get("Identity ID") == b.get("Identity ID") for a, b in
+                       zip(sorted(identities, key=lambda d: d["Source Files"]), sorted(again, key=lambda d: d["Source Files"])))
+        print(f"{'index link (new)':<22} {len(identities):>8} {'':>11} {first_s:>9.3f} {len(identities) / first_s:>11.0f}")
+        print(f"{'index link (repeat)':<22} {len(again):>8} {'':>11} {second_s:>9.3f} {len(again) / second_s:>11.0f}")
+        print(f"identities relinked to the same id: {relinked}/{len(again)}")
+
+
+if __name__ == "__main__":
+    main()
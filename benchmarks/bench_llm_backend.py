@@ -0,0 +1,90 @@
+"""
+Load test for the async LLM backend against the local mock server.
+
+Fires concurrent extract_all_documents calls at the stub with injected
+latency and errors, and reports latency percentiles, retries and failures.
+
+Usage:
+    python benchmarks/bench_llm_backend.py --calls 200 --latency 0.3 --error-rate 0.2
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+from mock_llm_server import MockConfig, run_in_thread
+from page import Page
+from llm_extractor import AsyncLLMBackend, LLMExtractionError, extract_all_documents
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args, base_url):
+    backend = AsyncLLMBackend(
+        api_key="test", base_url=base_url,
+        max_concurrency=args.concurrency, route_concurrency=args.concurrency,
+        attempt_timeout=args.timeout, deadline=args.deadline,
+    )
+    image = Image.new("RGB", (856, 540), (240, 240, 240))
+    items = [{"page": Page.from_pil(image), "filename": "bench.jpg"}]
+    latencies, failures = [], 0
+
+    async def one_call():
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            await extract_all_documents(backend, items)
+            latencies.append(time.perf_counter() - start)
+        except LLMExtractionError:
+            failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(args.calls)))
+    elapsed = time.perf_counter() - start
+    await backend.aclose()
+
+    print(f"calls={args.calls} ok={len(latencies)} failed={failures} elapsed={elapsed:.2f}s "
+          f"throughput={len(latencies) / elapsed:.1f}/s")
+    print(f"latency p50={percentile(latencies, 50):.3f}s p95={percentile(latencies, 95):.3f}s "
+          f"max={max(latencies, default=0):.3f}s mean={statistics.mean(latencies) if latencies else 0:.3f}s")
+    print(f"backend stats: {backend.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--deadline", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    server, base_url = run_in_thread(
+        MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate),
+        port=args.port,
+    )
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Goodput vs offered load for the LLM call scheduler, against a rate-limited stub.
+
+The mock LLM behaves like a provider under load: it answers 429 (with
+Retry-After) above --rate-limit calls/s, and beyond --capacity concurrent
+calls every call slows down (they share the capacity). Calls arrive as a
+Poisson process at each offered rate for --duration seconds; a share of them
+(--interactive-share) are interactive with a short deadline, the rest bulk
+with a long one. Each rate is run with:
+
+    fixed     fixed semaphores at --max-concurrency (send everything at once)
+    fixed:N   fixed semaphores at a hand-tuned N (--tuned)
+    adaptive  AIMD limit up to --max-concurrency, earliest deadline first,
+              hopeless calls shed before they are sent
+
+Goodput is calls that completed before their deadline, per second of wall
+time (until the last call settled). Also reported: interactive p95 latency,
+429s the stub returned, calls shed and failed, and the final adaptive limit.
+
+Usage:
+    python benchmarks/bench_llm_scheduler.py [--rates 2,4,8,12,16,24] [--duration 15]
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_llm_server import MockConfig, TokenBucket, run_in_thread
+from llm_extractor import AsyncLLMBackend, LLMExtractionError, LLMDeadlineExceeded
+from llm_scheduler import request_deadline
+
+# A 1x1 JPEG: the stub only counts images
+PIXEL = ("data:image/jpeg;base64,/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAP//////////////////////////////////////////////"
+         "////////////////////////////////////////////wAALCAABAAEBAREA/8QAFAABAAAAAAAAAAAAAAAAAAAAA//EABQQAQAAAAAAAAAA"
+         "AAAAAAAAAAD/2gAIAQEAAD8AN//Z")
+MESSAGES = [{"role": "user", "content": [
+    {"type": "text", "text": "Extract the documents."},
+    {"type": "image_url", "image_url": {"url": PIXEL}},
+]}]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_level(args, base_url: str, mode: str, rate: float) -> dict:
+    adaptive = mode == "adaptive"
+    limit = args.tuned if mode.startswith("fixed:") else args.max_concurrency
+    backend = AsyncLLMBackend(api_key="test", base_url=base_url, max_concurrency=limit, route_concurrency=limit,
+                              attempt_timeout=args.attempt_timeout, deadline=args.bulk_deadline, adaptive=adaptive)
+    deadlines = {"interactive": args.interactive_deadline, "bulk": args.bulk_deadline}
+    results = {"ok": 0, "shed": 0, "failed": 0}
+    latencies = {"interactive": [], "bulk": []}
+    loop = asyncio.get_running_loop()
+
+    async def one(priority: str):
+        with request_deadline(priority, deadlines[priority]):
+            start = loop.time()
+            try:
+                await backend.create_completion(messages=MESSAGES, response_format={"type": "json_object"}, temperature=0.0)
+                results["ok"] += 1
+                latencies[priority].append(loop.time() - start)
+            except LLMDeadlineExceeded:
+                results["shed"] += 1
+            except LLMExtractionError:
+                results["failed"] += 1
+
+    rng = random.Random(int(rate * 1000))
+    tasks = []
+    start = loop.time()
+    at = 0.0
+    while True:
+        at += rng.expovariate(rate)
+        if at >= args.duration:
+            break
+        await asyncio.sleep(max(0.0, start + at - loop.time()))
+        priority = "interactive" if rng.random() < args.interactive_share else "bulk"
+        tasks.append(asyncio.create_task(one(priority)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+    snapshot = backend.route_limiter().snapshot() if adaptive else None
+    await backend.aclose()
+    return {
+        "offered": len(tasks),
+        "goodput": results["ok"] / elapsed,
+        "elapsed": elapsed,
+        "interactive_p95": percentile(latencies["interactive"], 95),
+        "bulk_p95": percentile(latencies["bulk"], 95),
+        "retries": backend.stats["retries"],
+        "limit": snapshot["limit"] if snapshot else limit,
+        **results,
+    }
+
+
+async def main_async(args):
+    config = MockConfig(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, capacity=args.capacity)
+    server, base_url = run_in_thread(config, port=args.port)
+    app = server.config.app
+    modes = ["fixed", f"fixed:{args.tuned}", "adaptive"]
+    ceiling = min(args.rate_limit or float("inf"), args.capacity / args.latency if args.capacity else float("inf"))
+    print(f"stub: {args.latency}s/call, {args.rate_limit:g} calls/s rate limit, capacity {args.capacity} "
+          f"(ceiling ~{ceiling:.1f} calls/s); deadlines interactive {args.interactive_deadline:g}s, "
+          f"bulk {args.bulk_deadline:g}s; {args.interactive_share:.0%} interactive\n")
+    print(f"{'rate/s':>6} {'mode':<9} {'offered':>7} {'goodput/s':>9} {'ok':>5} {'shed':>5} {'failed':>6} "
+          f"{'429s':>5} {'retries':>7} {'int p95':>8} {'bulk p95':>9} {'limit':>6}")
+    curves = {mode: [] for mode in modes}
+    for rate in args.rates:
+        for mode in modes:
+            # Fresh provider state per run
+            app.state.bucket = TokenBucket(config.rate_limit, config.rate_limit) if config.rate_limit else None
+            app.state.stats["rate_limited"] = 0
+            await asyncio.sleep(1.0)
+            r = await run_level(args, base_url, mode, rate)
+            curves[mode].append(r["goodput"])
+            print(f"{rate:>6g} {mode:<9} {r['offered']:>7} {r['goodput']:>9.2f} {r['ok']:>5} {r['shed']:>5} "
+                  f"{r['failed']:>6} {app.state.stats['rate_limited']:>5} {r['retries']:>7} "
+                  f"{r['interactive_p95']:>7.2f}s {r['bulk_p95']:>8.2f}s {r['limit']:>6g}")
+    server.should_exit = True
+
+    # Goodput curves, one bar per offered rate
+    print("\ngoodput vs offered load (each # = 0.25 calls/s)")
+    for mode in modes:
+        print(f"  {mode}")
+        for rate, goodput in zip(args.rates, curves[mode]):
+            print(f"    {rate:>5g}/s |{'#' * int(round(goodput * 4)):<{int(ceiling * 4) + 8}}| {goodput:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=lambda s: [float(r) for r in s.split(",")], default=[2, 4, 8, 12, 16, 24])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of arrivals per run")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit", type=float, default=8.0)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--tuned", type=int, default=4, help="Limit of the hand-tuned fixed run")
+    parser.add_argument("--interactive-share", type=float, default=0.3)
+    parser.add_argument("--interactive-deadline", type=float, default=5.0)
+    parser.add_argument("--bulk-deadline", type=float, default=30.0)
+    parser.add_argument("--attempt-timeout", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8012)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Stress test for the memory budget: a burst of large uploads at once.
+
+Each configuration runs in a fresh process that serves the app (uvicorn,
+mock LLM answering with the synthetic documents) and fires --burst
+concurrent POST /extract/ requests, each one multi-page PDF applicant
+(--repeat rescans per card, so 4 * repeat pages rendered at full size).
+RSS of the server process and its pool workers is sampled every 50 ms
+from /proc. Compare:
+
+    off       MEMORY_BUDGET_BYTES=0 (every request renders at once)
+    budget    MEMORY_BUDGET_BYTES=--budget-mb
+
+Reports peak RSS, the budget's peak reservation, statuses and wall time.
+
+Usage:
+    python benchmarks/bench_memory.py [--burst 8] [--repeat 4] [--budget-mb 300]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tree_rss_mb(root: int) -> float:
+    """RSS of root and its direct children (the pool workers), in MB."""
+    pids = [root]
+    try:
+        with open(f"/proc/{root}/task/{root}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def run_config(args) -> dict:
+    """One configuration. Runs in its own process; prints a JSON result line."""
+    work = tempfile.mkdtemp(prefix="bench_memory_")
+    os.makedirs(os.path.join(work, "static"))
+    shutil.copy(os.path.join(ROOT, "driving_licence_reference.jpg"), work)
+    os.chdir(work)
+
+    mock_port, app_port = free_port(), free_port()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{mock_port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "test")
+    os.environ["EXTRACTION_CACHE_ENABLED"] = "0"
+    os.environ["TRACE_LOG"] = "0"
+    os.environ["MEMORY_BUDGET_BYTES"] = str(args.budget_mb * 1024 * 1024)
+    os.environ["MEMORY_BUDGET_WAIT"] = str(args.wait)
+    # Let the burst through the pool queues; the memory budget is what's under test
+    os.environ.setdefault("CPU_QUEUE_DEPTH", "256")
+
+    from synthetic_docs import make_applicant, documents_by_file
+    applicants = [make_applicant(i, as_pdf=True, repeat=args.repeat) for i in range(args.burst)]
+
+    from mock_llm_server import MockConfig, run_in_thread
+    run_in_thread(MockConfig(latency=args.llm_latency, documents_by_file=documents_by_file(applicants)), port=mock_port)
+
+    import uvicorn
+    import httpx
+    import main
+    from memory_budget import memory_budget
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=app_port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    # Warm the pool so its start-up isn't part of the burst
+    with httpx.Client() as http:
+        while http.get(f"http://127.0.0.1:{app_port}/ready").status_code != 200:
+            time.sleep(0.05)
+
+    baseline = tree_rss_mb(os.getpid())
+    samples = []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            samples.append(tree_rss_mb(os.getpid()))
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    async def burst():
+        async with httpx.AsyncClient(timeout=600) as http:
+            async def one(applicant):
+                files = [("files", (name, data, ctype)) for name, (data, ctype) in applicant.files.items()]
+                start = time.perf_counter()
+                response = await http.post(f"http://127.0.0.1:{app_port}/extract/?response_mode=url", files=files)
+                return response.status_code, time.perf_counter() - start
+            return await asyncio.gather(*(one(a) for a in applicants))
+
+    start = time.perf_counter()
+    results = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    server.should_exit = True
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "config": "off" if args.budget_mb == 0 else f"budget {args.budget_mb} MB",
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 2),
+        "max_latency_s": round(max(t for _, t in results), 2),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(max(samples or [baseline]), 1),
+        "peak_reserved_mb": round(memory_budget.peak / (1024 * 1024), 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--repeat", type=int, default=4, help="Scans per card: each PDF has 4 * repeat pages")
+    parser.add_argument("--budget-mb", type=int, default=300)
+    parser.add_argument("--wait", type=float, default=300, help="MEMORY_BUDGET_WAIT for the budgeted run")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(args)))
+        return
+
+    print(f"burst of {args.burst} PDFs x {4 * args.repeat} pages, mock LLM {args.llm_latency}s")
+    for budget_mb in (0, args.budget_mb):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--burst", str(args.burst),
+               "--repeat", str(args.repeat), "--budget-mb", str(budget_mb), "--wait", str(args.wait),
+               "--llm-latency", str(args.llm_latency)]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+        if out.returncode != 0 or not lines:
+            print(out.stderr[-2000:])
+            continue
+        r = json.loads(lines[-1])
+        print(f"  {r['config']:<16} peak RSS {r['peak_rss_mb']:>7} MB (idle {r['baseline_rss_mb']} MB)  "
+              f"reserved peak {r['peak_reserved_mb']:>6} MB  {r['elapsed_s']:>6}s  "
+              f"slowest {r['max_latency_s']}s  statuses {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main_cli()
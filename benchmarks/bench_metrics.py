@@ -0,0 +1,74 @@
+"""
+Overhead of the instrumentation hooks in metrics.py.
+
+Times the primitives the pipeline calls on its hot path (Counter.inc,
+Histogram.observe, span() with and without a current trace) and a whole
+request's worth of tracing: one trace_request plus --spans spans, which
+is about what a multi-page request records. Runs with METRICS_ENABLED on
+and off, and also renders /metrics after the run.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 200000] [--spans 30]
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def request(spans: int):
+    with contextlib.redirect_stdout(None):
+        with metrics.trace_request("bench"):
+            for i in range(spans):
+                with metrics.span("bench_stage", pages=i):
+                    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--spans", type=int, default=30)
+    args = parser.parse_args()
+
+    counter = metrics.Counter("bench_total", "bench", ("kind",))
+    histogram = metrics.Histogram("bench_seconds", "bench", labelnames=("stage",))
+
+    def bare_span():
+        with metrics.span("bench_stage"):
+            pass
+
+    print(f"{'hook':<34} {'enabled ns':>11} {'disabled ns':>12}")
+    rows = [
+        ("Counter.inc", lambda: counter.inc(kind="a"), args.iterations),
+        ("Histogram.observe", lambda: histogram.observe(0.3, stage="a"), args.iterations),
+        ("span() (no trace)", bare_span, args.iterations),
+        (f"request: trace + {args.spans} spans", lambda: request(args.spans), max(1, args.iterations // 100)),
+    ]
+    for name, fn, iterations in rows:
+        results = []
+        for enabled in (True, False):
+            metrics.METRICS_ENABLED = enabled
+            results.append(per_call_ns(fn, iterations))
+        metrics.METRICS_ENABLED = True
+        print(f"{name:<34} {results[0]:>11.0f} {results[1]:>12.0f}")
+
+    start = time.perf_counter()
+    text = metrics.render_metrics()
+    print(f"\n/metrics render: {len(text)} bytes in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
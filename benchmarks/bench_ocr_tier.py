@@ -0,0 +1,122 @@
+"""
+Tiered extraction (local OCR + validators, LLM fallback) against LLM-only,
+on synthetic PAN / Aadhar / DL card images rendered with clean text, plus a
+share of "hard" pages (noisy, low contrast) that should escalate.
+
+Reports LLM calls, pages answered locally, and per-request p50/p95 latency.
+The LLM is the local mock server, so latency is mock latency + OCR cost.
+Needs the `tesseract` binary on PATH.
+
+Usage:
+    python benchmarks/bench_ocr_tier.py [--requests 20] [--hard 0.3] [--latency 0.8]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from mock_llm_server import MockConfig, run_in_thread
+from page import Page
+
+
+def aadhar_number(rng: random.Random) -> str:
+    from tiered_extractor import verhoeff_valid
+    while True:
+        digits = f"{rng.randrange(2 * 10**10, 10**11)}"
+        for d in "0123456789":
+            if verhoeff_valid(digits + d):
+                n = digits + d
+                return f"{n[:4]} {n[4:8]} {n[8:]}"
+
+
+def card(lines: list, hard: bool, rng: random.Random) -> Page:
+    img = Image.new("RGB", (1012, 638), (245, 245, 240))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=30)
+    y = 40
+    for line in lines:
+        draw.text((40, y), line, fill=(20, 20, 20), font=font)
+        y += 48
+    if hard:
+        # Blur + low contrast: OCR confidence drops and the page escalates
+        img = img.filter(ImageFilter.GaussianBlur(2.2)).point(lambda v: 150 + v // 3)
+    return Page.from_pil(img)
+
+
+def make_request(i: int, hard_share: float, rng: random.Random) -> list:
+    name, father = f"RAVI KUMAR {chr(65 + i % 26)}", "SURESH KUMAR"
+    aadhar = aadhar_number(rng)
+    pages = [
+        ("pan.jpg", ["INCOME TAX DEPARTMENT", "Name", name, "Father's Name", father,
+                     "Date of Birth", "01/01/1990", "Permanent Account Number", "ABCPE1234F"]),
+        ("aadhar_front.jpg", ["GOVERNMENT OF INDIA", name.title(), "DOB: 01/01/1990", "MALE", aadhar]),
+        ("aadhar_back.jpg", ["Unique Identification Authority of India", "Address: S/O Suresh Kumar,",
+                             "12 MG Road, New Delhi 110001", aadhar]),
+        ("dl.jpg", ["Union of India Driving Licence", "DL No: HR01 20000000856", f"Name: {name}",
+                    "Add: FLAT NO 401, SECTOR 5", "GURGAON"]),
+    ]
+    return [{"page": card(text, rng.random() < hard_share, rng), "filename": filename} for filename, text in pages]
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_mode(mode: str, requests: list, base_url: str) -> dict:
+    import tiered_extractor
+    import llm_extractor
+    tiered_extractor.OCR_FAST_PATH = mode == "tiered"
+    backend = llm_extractor.AsyncLLMBackend(api_key="test", base_url=base_url)
+    latencies = []
+    local = 0
+    pages = 0
+    for items in requests:
+        metrics = {}
+        start = time.perf_counter()
+        await tiered_extractor.extract_documents_tiered(backend, items, metrics=metrics)
+        latencies.append(time.perf_counter() - start)
+        local += metrics.get("llm_pages_avoided", 0)
+        pages += len(items)
+    await backend.aclose()
+    return {"calls": backend.stats["calls"], "local": local, "pages": pages,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--hard", type=float, default=0.3, help="Share of pages degraded so OCR should escalate")
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--per-image-latency", type=float, default=0.15)
+    parser.add_argument("--port", type=int, default=8014)
+    args = parser.parse_args()
+
+    if not shutil.which("tesseract"):
+        sys.exit("tesseract binary not found on PATH (apt-get install tesseract-ocr)")
+
+    from executors import shutdown_executors
+    rng = random.Random(3)
+    requests = [make_request(i, args.hard, rng) for i in range(args.requests)]
+    server, base_url = run_in_thread(MockConfig(latency=args.latency, per_image_latency=args.per_image_latency), port=args.port)
+    try:
+        print(f"{'mode':<10} {'pages':>6} {'LLM calls':>10} {'local pages':>12} {'p50 s':>7} {'p95 s':>7}")
+        for mode in ("llm-only", "tiered"):
+            r = asyncio.run(run_mode(mode, requests, base_url))
+            print(f"{mode:<10} {r['pages']:>6} {r['calls']:>10} {r['local']:>12} {r['p50']:>7.2f} {r['p95']:>7.2f}")
+    finally:
+        server.should_exit = True
+        shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
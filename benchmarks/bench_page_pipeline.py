@@ -0,0 +1,120 @@
+"""
+Per-stage timing and allocation comparison: legacy page chain vs Page.
+
+Legacy chain for one PDF page:
+    pixmap -> PNG bytes -> PIL decode -> JPEG on disk -> cv2.imread -> JPEG + base64 for the LLM
+Page pipeline:
+    pixmap samples -> Page -> zero-copy array for OpenCV -> memoized JPEG/base64
+
+Each stage is timed, and tracemalloc reports the peak Python-side
+allocation (NumPy and PIL buffers are included; OpenCV's are not).
+
+Usage:
+    python benchmarks/bench_page_pipeline.py --pages 5
+"""
+import os
+import io
+import sys
+import time
+import base64
+import argparse
+import tempfile
+import tracemalloc
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+import fitz
+from PIL import Image
+
+from page import Page
+
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(fitz.Rect(60, 60, 535, 700), filename=os.path.join(ROOT, "driving_licence_reference.jpg"))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class Timer:
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    def stage(self, name):
+        timer = self
+
+        class _Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.totals[name] += time.perf_counter() - self.start
+
+        return _Stage()
+
+
+def legacy(doc, tmp, timer):
+    disk_bytes = 0
+    for page in doc:
+        with timer.stage("render"):
+            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+            img = Image.open(io.BytesIO(pix.tobytes("png")))
+            img.load()
+        with timer.stage("save temp JPEG"):
+            path = os.path.join(tmp, "page.jpg")
+            img.save(path, "JPEG")
+            disk_bytes += os.path.getsize(path)
+        with timer.stage("face input"):
+            gray = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+        with timer.stage("LLM payload"):
+            buffered = io.BytesIO()
+            img.save(buffered, format="JPEG")
+            base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return disk_bytes
+
+
+def paged(doc, tmp, timer):
+    for page in doc:
+        with timer.stage("render"):
+            p = Page.from_pixmap(page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False))
+        with timer.stage("face input"):
+            gray = cv2.cvtColor(p.array, cv2.COLOR_RGB2GRAY)
+        with timer.stage("LLM payload"):
+            p.base64
+    return 0
+
+
+def measure(fn, pdf_bytes):
+    timer = Timer()
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        start = time.perf_counter()
+        disk_bytes = fn(doc, tmp, timer)
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return timer.totals, total, peak, disk_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pages)
+    for name, fn in (("legacy", legacy), ("page", paged)):
+        stages, total, peak, disk_bytes = measure(fn, pdf_bytes)
+        print(f"[{name}] total {total * 1000:.1f} ms, peak alloc {peak / 1e6:.1f} MB, temp bytes written {disk_bytes}")
+        for stage, seconds in stages.items():
+            print(f"    {stage:<16} {seconds * 1000 / args.pages:8.1f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+LLM payload size/quality trade-off benchmark.
+
+For every image in a sample directory (or a synthetic A4 page with a card on
+it), reports the baseline payload (full-resolution JPEG at PIL defaults,
+what encode_image used to send) against the optimizer at several
+long-edge / byte-budget settings.
+
+With --labels (a JSON file mapping filename -> expected fields) and a
+reachable LLM (GROQ_API_KEY / LLM_BASE_URL), each setting is also run
+through extract_all_documents and scored by exact field matches, so
+accuracy can be traded against payload size.
+
+Usage:
+    python benchmarks/bench_payload.py [--samples DIR] [--labels labels.json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+from page import Page
+
+SETTINGS = [
+    # (max long edge, byte budget)
+    (2400, 1_000_000),
+    (1600, 350_000),
+    (1200, 200_000),
+    (900, 120_000),
+]
+
+
+def synthetic_sample() -> dict:
+    card = Image.open(os.path.join(ROOT, "driving_licence_reference.jpg")).convert("RGB")
+    card.thumbnail((700, 700))
+    page = Image.new("RGB", (1190, 1684), (255, 255, 255))  # A4 at 2x zoom
+    page.paste(card, (120, 160))
+    return {"synthetic_a4.jpg": page}
+
+
+def load_samples(directory: str) -> dict:
+    samples = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            samples[name] = Image.open(os.path.join(directory, name)).convert("RGB")
+    return samples
+
+
+def baseline_bytes(img: Image.Image) -> int:
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG")
+    return len(buffered.getvalue())
+
+
+def configure(max_edge: int, budget: int):
+    os.environ["LLM_MAX_LONG_EDGE"] = str(max_edge)
+    os.environ["LLM_IMAGE_BYTE_BUDGET"] = str(budget)
+    import payload_optimizer
+    importlib.reload(payload_optimizer)
+    import llm_extractor
+    importlib.reload(llm_extractor)
+    return payload_optimizer, llm_extractor
+
+
+def score(documents: list, expected: dict) -> tuple:
+    found = {}
+    for doc in documents:
+        for k, v in doc.items():
+            found.setdefault(k, str(v).strip().lower())
+    hits = sum(1 for k, v in expected.items() if found.get(k) == str(v).strip().lower())
+    return hits, len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="directory of sample images")
+    parser.add_argument("--labels", help="JSON file: filename -> {field: expected value}")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples) if args.samples else synthetic_sample()
+    labels = json.load(open(args.labels)) if args.labels else None
+
+    base = sum(baseline_bytes(img) for img in samples.values())
+    print(f"{len(samples)} sample(s), baseline payload {base / 1024:.0f} KiB")
+    print(f"{'max edge':>9} {'budget':>9} {'KiB':>8} {'vs base':>8} {'ms/img':>7} {'accuracy':>9}")
+
+    for max_edge, budget in SETTINGS:
+        optimizer, extractor = configure(max_edge, budget)
+        total, elapsed = 0, 0.0
+        for img in samples.values():
+            start = time.perf_counter()
+            total += len(optimizer.optimize_page_payload(Page.from_pil(img)).jpeg)
+            elapsed += time.perf_counter() - start
+
+        accuracy = "-"
+        if labels and extractor.backend:
+            async def evaluate():
+                hits = fields = 0
+                for name, img in samples.items():
+                    if name not in labels:
+                        continue
+                    docs = await extractor.extract_all_documents(
+                        extractor.backend, [{"page": Page.from_pil(img), "filename": name}])
+                    h, n = score(docs, labels[name])
+                    hits, fields = hits + h, fields + n
+                await extractor.backend.aclose()
+                return hits / fields if fields else 0.0
+            accuracy = f"{asyncio.run(evaluate()):.1%}"
+
+        print(f"{max_edge:>9} {budget:>9} {total / 1024:>8.0f} {total / base:>8.1%} "
+              f"{elapsed * 1000 / len(samples):>7.1f} {accuracy:>9}")
+
+
+if __name__ == "__main__":
+    main()
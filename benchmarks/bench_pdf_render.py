@@ -0,0 +1,131 @@
+"""
+PDF rendering benchmark: wall time and peak memory per strategy.
+
+Strategies:
+    legacy    fixed 2x zoom, PNG round trip, fully materialized list
+    adaptive  DPI chosen from page size, materialized list (embedded-JPEG
+              fast path on)
+    no-fast   adaptive with the embedded-JPEG fast path switched off
+    stream    adaptive, consumed lazily one page at a time
+    parallel  adaptive, page ranges spread over the CPU process pool
+    preview   grayscale low-res preview render
+
+Each strategy runs in a fresh subprocess so ru_maxrss is not polluted by
+earlier runs. Peak RSS includes pool worker processes (RUSAGE_CHILDREN).
+
+Usage:
+    python benchmarks/bench_pdf_render.py [--pages 24]
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STRATEGIES = ["legacy", "adaptive", "no-fast", "stream", "parallel", "preview"]
+
+
+def make_pdf(path: str, pages: int, card: bool, scanned: bool = False):
+    import fitz
+    doc = fitz.open()
+    # ID-1 card is 85.6 x 54 mm; A4 is 595 x 842 pt
+    width, height = (243, 153) if card else (595, 842)
+    for _ in range(pages):
+        page = doc.new_page(width=width, height=height)
+        if scanned:
+            # Phone-scan style: the page is one full-bleed JPEG
+            page.insert_image(page.rect, filename=os.path.join(ROOT, "driving_licence_reference.jpg"), keep_proportion=False)
+            continue
+        page.insert_image(page.rect, filename=os.path.join(ROOT, "driving_licence_reference.jpg"), keep_proportion=True)
+        page.insert_text((10, 20), "INCOME TAX DEPARTMENT", fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def run_strategy(strategy: str, path: str) -> dict:
+    if strategy == "no-fast":
+        os.environ["PDF_EMBEDDED_FAST_PATH"] = "0"
+    import fitz
+    from PIL import Image
+    import pdf_processor
+    from executors import shutdown_executors
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    pixels = 0
+    fast = 0
+    if strategy == "legacy":
+        doc = fitz.open(path)
+        images = []
+        for page in doc:
+            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+            img = Image.open(io.BytesIO(pix.tobytes("png")))
+            img.load()
+            images.append(img)
+        pixels = sum(i.width * i.height for i in images)
+    elif strategy in ("adaptive", "no-fast"):
+        pages = pdf_processor.render_pdf_pages(path, max_pages=10_000)
+        pixels = sum(p.width * p.height for p in pages)
+        fast = sum(p.source == "embedded" for p in pages)
+    elif strategy == "stream":
+        for p in pdf_processor.iter_pdf_pages(path, max_pages=10_000):
+            pixels += p.width * p.height
+            fast += p.source == "embedded"
+    elif strategy == "parallel":
+        pages = asyncio.run(pdf_processor.render_pdf_pages_parallel(path, max_pages=10_000))
+        pixels = sum(p.width * p.height for p in pages)
+        fast = sum(p.source == "embedded" for p in pages)
+        shutdown_executors()
+    elif strategy == "preview":
+        for p in pdf_processor.iter_pdf_pages(path, max_pages=10_000, preview=True):
+            pixels += p.width * p.height
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"elapsed": elapsed, "py_peak": peak, "rss_kb": self_rss, "child_rss_kb": child_rss,
+            "pixels": pixels, "fast_path": fast}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--child", nargs=2, metavar=("STRATEGY", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_strategy(*args.child)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("single card", 1, True, False),
+            (f"{args.pages}-page A4", args.pages, False, False),
+            (f"{args.pages}-page scanned A4", args.pages, False, True),
+        ]
+        for label, pages, card, scanned in cases:
+            path = os.path.join(tmp, f"{pages}_{card}_{scanned}.pdf")
+            make_pdf(path, pages, card, scanned)
+            print(f"\n{label}")
+            print(f"{'strategy':<10} {'wall ms':>9} {'Mpixels':>8} {'py peak MB':>11} {'RSS MB':>8} {'pool RSS MB':>12} {'fast path':>10}")
+            for strategy in STRATEGIES:
+                out = subprocess.run([sys.executable, __file__, "--child", strategy, path],
+                                     capture_output=True, text=True, check=True, cwd=ROOT)
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{strategy:<10} {r['elapsed'] * 1000:>9.1f} {r['pixels'] / 1e6:>8.2f} "
+                      f"{r['py_peak'] / 1e6:>11.1f} {r['rss_kb'] / 1024:>8.1f} {r['child_rss_kb'] / 1024:>12.1f} "
+                      f"{r['fast_path']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+/extract/ response size and serialization time per response mode.
+
+Synthetic identities each carry a 413x531 face JPEG (the size the face
+extractor writes) in a temp directory. For every mode the benchmark
+formats the documents and serializes the response the way main.py does
+(json.dumps for the JSON modes, the full multipart/mixed body for
+"multipart"), and reports bytes, bytes per identity and ms per response.
+Thumbnails are memoized per face file, so the first (cold) thumbnail
+response is reported separately.
+
+Usage:
+    python benchmarks/bench_response.py [--identities 4] [--repeat 50]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw, ImageFilter
+
+import response_modes
+from response_modes import format_documents, photo_files, multipart_body, new_boundary, RESPONSE_MODES
+
+
+def make_face(path: str, rng: random.Random):
+    """Photo-like 413x531 JPEG: gradient background, an ellipse face, blur and noise."""
+    img = Image.new("RGB", (413, 531), (rng.randint(150, 220),) * 3)
+    draw = ImageDraw.Draw(img)
+    for y in range(0, 531, 3):
+        shade = 120 + (y * 100) // 531
+        draw.line((0, y, 413, y), fill=(shade, shade - 10, shade - 20))
+    draw.ellipse((90, 80, 320, 380), fill=(rng.randint(170, 220), rng.randint(120, 160), rng.randint(90, 130)))
+    draw.rectangle((60, 400, 350, 531), fill=(rng.randint(0, 80),) * 3)
+    noise = Image.effect_noise((413, 531), 25).convert("RGB")
+    img = Image.blend(img, noise, 0.15).filter(ImageFilter.GaussianBlur(0.6))
+    img.save(path, format="JPEG", quality=95)
+
+
+def make_documents(count: int, faces_dir: str) -> list:
+    rng = random.Random(5)
+    docs = []
+    for i in range(count):
+        path = os.path.join(faces_dir, f"face_{i}.jpg")
+        make_face(path, rng)
+        docs.append({"Document Type": "Aadhar, PAN", "Name": f"RAVI KUMAR {i}",
+                     "Date of Birth": "1990-01-01", "Aadhar Number": "2345 6789 0123",
+                     "PAN Number": "ABCPE1234F", "Address": "12 MG Road, New Delhi 110001",
+                     "Source Files": ["aadhar_front.jpg", "aadhar_back.jpg", "pan.jpg"],
+                     "Photo Path": path})
+    return docs
+
+
+def render(docs: list, mode: str) -> bytes:
+    content = {"status": "success", "request_id": "bench", "data": format_documents(docs, mode)}
+    if mode == "multipart":
+        payload = json.dumps(content).encode("utf-8")
+        return b"".join(multipart_body(payload, photo_files(docs), new_boundary()))
+    return json.dumps(content).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--identities", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as faces_dir:
+        docs = make_documents(args.identities, faces_dir)
+        face_bytes = sum(os.path.getsize(d["Photo Path"]) for d in docs)
+        print(f"{args.identities} identities, face JPEGs {face_bytes / args.identities / 1024:.1f} KiB each\n")
+
+        start = time.perf_counter()
+        render(docs, "thumbnail")
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{'mode':<10} {'bytes':>9} {'bytes/id':>9} {'vs face':>8} {'ms':>7}")
+        for mode in RESPONSE_MODES:
+            body = render(docs, mode)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                render(docs, mode)
+            ms = (time.perf_counter() - start) * 1000 / args.repeat
+            per_id = len(body) / args.identities
+            print(f"{mode:<10} {len(body):>9} {per_id:>9.0f} {per_id * args.identities / face_bytes:>7.2f}x {ms:>7.2f}")
+        print(f"\nthumbnail, cold (first build, {response_modes.FACE_THUMBNAIL_EDGE}px): {cold_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Cold start and memory of the server modes.
+
+For each mode the app is launched in a fresh process (in a temp working
+directory, LLM served by mock_llm_server):
+
+    uvicorn      uvicorn main:app (one process)
+    server:N     python server.py --workers N (preforked)
+
+and the benchmark records, from launch:
+    listen_ms    first accepted connection
+    first_ms     first successful POST /extract/ (one synthetic applicant),
+                 sent as soon as the port accepts
+    ready_ms     every worker answering 200 on GET /ready
+
+then RSS and PSS (proportional set size: shared pages split between the
+processes sharing them) of every process in the tree. Summed PSS is what
+the mode really costs; RSS counts shared preloaded pages in every worker.
+
+Usage:
+    python benchmarks/bench_startup.py [--workers 2 4] [--runs 3]
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import httpx
+from synthetic_docs import make_applicant, documents_by_file
+from mock_llm_server import MockConfig, run_in_thread
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_kb(pid: int) -> dict:
+    """Rss and Pss (kB) from /proc/<pid>/smaps_rollup."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    values[key.lower()] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def process_tree(root: int) -> list:
+    """(pid, depth) for root and its descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [(root, 0)]
+    while stack:
+        pid, depth = stack.pop()
+        tree.append((pid, depth))
+        stack.extend((child, depth + 1) for child in sorted(children.get(pid, []), reverse=True))
+    return tree
+
+
+def run_mode(mode: str, workers: int, applicant, llm_port: int) -> dict:
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    os.makedirs(os.path.join(work, "static"))
+    shutil.copy(os.path.join(ROOT, "driving_licence_reference.jpg"), work)
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT, LLM_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+               EXTRACTION_CACHE_ENABLED="0", TRACE_LOG="0")
+    if mode == "uvicorn":
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--workers", str(workers),
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=work, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"mode": mode if mode == "uvicorn" else f"server:{workers}"}
+    try:
+        base = f"http://127.0.0.1:{port}"
+        with httpx.Client(timeout=120) as http:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"{cmd} exited with {proc.returncode}")
+                try:
+                    http.get(base + "/ready")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            result["listen_ms"] = round((time.perf_counter() - start) * 1000)
+
+            files = [("files", (name, data, ctype)) for name, (data, ctype) in applicant.files.items()]
+            response = http.post(base + "/extract/?response_mode=url", files=files)
+            result["first_status"] = response.status_code
+            result["first_ms"] = round((time.perf_counter() - start) * 1000)
+
+            # Connections land on any worker: poll until each has said ready
+            ready = set()
+            while len(ready) < workers:
+                state = http.get(base + "/ready", headers={"Connection": "close"})
+                if state.status_code == 200:
+                    ready.add(state.json()["pid"])
+                else:
+                    time.sleep(0.01)
+            result["ready_ms"] = round((time.perf_counter() - start) * 1000)
+
+        processes = []
+        for pid, depth in process_tree(proc.pid):
+            mem = memory_kb(pid)
+            processes.append({"pid": pid, "depth": depth, "rss_mb": round(mem.get("rss", 0) / 1024, 1),
+                              "pss_mb": round(mem.get("pss", 0) / 1024, 1)})
+        result["processes"] = processes
+        result["total_rss_mb"] = round(sum(p["rss_mb"] for p in processes), 1)
+        result["total_pss_mb"] = round(sum(p["pss_mb"] for p in processes), 1)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    applicant = make_applicant(0)
+    llm_port = free_port()
+    run_in_thread(MockConfig(latency=args.llm_latency, documents_by_file=documents_by_file([applicant])), port=llm_port)
+
+    modes = [("uvicorn", 1)] + [("server", n) for n in args.workers]
+    print(f"{'mode':<10} {'listen ms':>10} {'first ms':>9} {'ready ms':>9} {'status':>7} "
+          f"{'procs':>6} {'RSS MB':>8} {'PSS MB':>8}  per process RSS/PSS")
+    for mode, workers in modes:
+        for _ in range(args.runs):
+            r = run_mode(mode, workers, applicant, llm_port)
+            per_process = " ".join(f"{p['rss_mb']:.0f}/{p['pss_mb']:.0f}" for p in r["processes"])
+            print(f"{r['mode']:<10} {r['listen_ms']:>10} {r['first_ms']:>9} {r['ready_ms']:>9} {r['first_status']:>7} "
+                  f"{len(r['processes']):>6} {r['total_rss_mb']:>8} {r['total_pss_mb']:>8}  {per_process}")
+
+
+if __name__ == "__main__":
+    main()
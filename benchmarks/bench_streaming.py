@@ -0,0 +1,196 @@
+"""
+Streamed vs blocking LLM replies, end to end: time to first document and
+total latency.
+
+The app is served by uvicorn on a local port against mock_llm_server, which
+answers each file's known documents and, for streamed calls, sends the reply
+in chunks: --stream-prefill of --llm-latency passes before the first chunk,
+the rest is spread over the reply. Each applicant (four card scans) is
+POSTed one at a time to
+
+    /extract/stream  time to the first document line, to the first photo
+                     line, and to the result line
+    /extract/        total latency
+
+with LLM_STREAMING=0 (blocking completions: a call's records all arrive
+when it returns) and LLM_STREAMING=1 (records are handed on as the reply
+streams, and face crops start on the first one). One fresh subprocess per
+setting, since settings are read at import time.
+
+Streaming pays off when one reply carries several records. With the
+classifier's type-specific prompts each card type goes in its own call
+(one record each), so the default run sets LLM_TYPE_PROMPTS=0: one call
+per applicant. `--env KEY=VALUE` sets other app settings (repeatable).
+
+Usage:
+    python benchmarks/bench_streaming.py [--requests 12] [--llm-latency 4.0] [--stream-prefill 0.2]
+    python benchmarks/bench_streaming.py --env LLM_TYPE_PROMPTS=1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_config(args) -> dict:
+    """One LLM_STREAMING setting. Runs in its own process; prints a JSON result line."""
+    work = tempfile.mkdtemp(prefix="bench_streaming_")
+    os.makedirs(os.path.join(work, "static"))
+    shutil.copy(os.path.join(ROOT, "driving_licence_reference.jpg"), work)
+    os.chdir(work)
+
+    mock_port, app_port = free_port(), free_port()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{mock_port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "test")
+    os.environ["EXTRACTION_CACHE_ENABLED"] = "0"
+    os.environ["TRACE_LOG"] = "0"
+    os.environ["LLM_TYPE_PROMPTS"] = "0"
+    for entry in args.env:
+        key, _, value = entry.partition("=")
+        os.environ[key] = value
+    os.environ["LLM_STREAMING"] = str(args.streaming)
+
+    from synthetic_docs import make_applicant, documents_by_file
+    applicants = [make_applicant(i) for i in range(args.applicants)]
+
+    from mock_llm_server import MockConfig, run_in_thread
+    mock, _ = run_in_thread(MockConfig(
+        latency=args.llm_latency, stream_prefill=args.stream_prefill,
+        documents_by_file=documents_by_file(applicants),
+    ), port=mock_port)
+
+    import uvicorn
+    import httpx
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=app_port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    async def drive():
+        timings = {"first_document": [], "first_photo": [], "stream_total": [], "blocking_total": []}
+        outcomes = {}
+        async with httpx.AsyncClient(timeout=600) as http:
+            for i in range(args.requests):
+                applicant = applicants[i % len(applicants)]
+                files = [("files", (name, data, ctype)) for name, (data, ctype) in applicant.files.items()]
+
+                start = time.perf_counter()
+                first_document = first_photo = None
+                outcome = "no result"
+                async with http.stream("POST", f"http://127.0.0.1:{app_port}/extract/stream", files=files) as r:
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        now = time.perf_counter() - start
+                        if event["type"] == "document" and first_document is None:
+                            first_document = now
+                        elif event["type"] == "photo" and first_photo is None:
+                            first_photo = now
+                        elif event["type"] in ("result", "error"):
+                            outcome = event.get("status") or str(event["status_code"])
+                timings["stream_total"].append(time.perf_counter() - start)
+                if first_document is not None:
+                    timings["first_document"].append(first_document)
+                if first_photo is not None:
+                    timings["first_photo"].append(first_photo)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+                start = time.perf_counter()
+                r = await http.post(f"http://127.0.0.1:{app_port}/extract/?response_mode=url", files=files)
+                timings["blocking_total"].append(time.perf_counter() - start)
+                outcomes[str(r.status_code)] = outcomes.get(str(r.status_code), 0) + 1
+        return timings, outcomes
+
+    with open(os.devnull, "w") as devnull:
+        # The pipeline prints per request; keep the report line clean
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            timings, outcomes = asyncio.run(drive())
+        finally:
+            sys.stdout = stdout
+
+    server.should_exit = True
+    thread.join(timeout=30)
+    stats = mock.config.app.state.stats
+    mock.should_exit = True
+    main.shutdown_executors(wait=True)
+    shutil.rmtree(work, ignore_errors=True)
+    return {
+        "config": "streaming" if args.streaming else "blocking",
+        "outcomes": outcomes,
+        "llm_calls": stats["requests"],
+        "llm_streamed": stats["streamed"],
+        **{f"{name}_p50": round(percentile(values, 50), 3) for name, values in timings.items()},
+        **{f"{name}_p95": round(percentile(values, 95), 3) for name, values in timings.items()},
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--applicants", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=4.0, help="Seconds per LLM call (whole reply)")
+    parser.add_argument("--stream-prefill", type=float, default=0.2, help="Share of the latency before the first chunk")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE app setting for both runs")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--streaming", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(args)))
+        return
+
+    print(f"{args.requests} requests of 4 card scans, one at a time; mock LLM {args.llm_latency:g}s per call, "
+          f"first chunk after {args.stream_prefill:.0%}\n")
+    print(f"{'config':<10} {'first doc p50/p95':>18} {'first photo p50/p95':>20} {'/stream total p50/p95':>22} "
+          f"{'/extract/ p50/p95':>18}  outcomes")
+    for streaming in (0, 1):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--streaming", str(streaming),
+               "--requests", str(args.requests), "--applicants", str(args.applicants),
+               "--llm-latency", str(args.llm_latency), "--stream-prefill", str(args.stream_prefill)]
+        cmd += [f"--env={entry}" for entry in args.env]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+        if out.returncode != 0 or not lines:
+            print(out.stderr[-2000:])
+            continue
+        r = json.loads(lines[-1])
+
+        def pair(name):
+            return f"{r[name + '_p50']:.2f}/{r[name + '_p95']:.2f}s"
+
+        print(f"{r['config']:<10} {pair('first_document'):>18} {pair('first_photo'):>20} {pair('stream_total'):>22} "
+              f"{pair('blocking_total'):>18}  {r['outcomes']} ({r['llm_calls']} LLM calls, {r['llm_streamed']} streamed)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,338 @@
+"""
+End-to-end benchmark suite: synthetic applicants, a local mock LLM, and a
+machine-readable report that can be compared between commits.
+
+Stages (in this process, N iterations each, on synthetic documents):
+    convert_pdf_to_images  one 4-page applicant PDF -> PIL images
+    encode_image           one scanned card -> base64 JPEG
+    extract_face           one Aadhar front -> face crop (hit rate reported)
+    merge                  one applicant's documents -> IdentityResolver
+
+End to end (one fresh subprocess per concurrency level, so peak RSS is per
+level): the app is served by uvicorn on a local port, the LLM is
+mock_llm_server answering with each file's known documents, and
+--concurrency clients POST applicants to /extract/ in a closed loop.
+Reports requests/s, p50/p95/p99 latency, errors and peak RSS of the
+server process and of its pool workers.
+
+The extraction cache is off unless --cache is given, so repeated
+applicants still reach the (mock) LLM.
+
+Usage:
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+    python benchmarks/bench_suite.py --concurrency 1 4 16 --requests 48 --format pdf --error-rate 0.05
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_docs import make_applicant, documents_by_file
+
+REPORT_VERSION = 1
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def timed(fn, iterations: int) -> dict:
+    fn()  # warm-up (lazy imports, cascade load)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(who) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- Stages ---
+
+def run_stages(iterations: int) -> dict:
+    from PIL import Image
+    from pdf_processor import convert_pdf_to_images
+    from llm_extractor import encode_image
+    from face_extractor import extract_face
+    from identity_resolver import IdentityResolver
+
+    work = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        pdf_applicant = make_applicant(0, as_pdf=True)
+        (pdf_name, (pdf_bytes, _)), = pdf_applicant.files.items()
+        pdf_path = os.path.join(work, pdf_name)
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+
+        applicant = make_applicant(1)
+        front_name = next(name for name in applicant.files if name.endswith("aadhar_front.jpg"))
+        front_path = os.path.join(work, front_name)
+        with open(front_path, "wb") as f:
+            f.write(applicant.files[front_name][0])
+        card = Image.open(io.BytesIO(applicant.files[front_name][0])).convert("RGB")
+        documents = [doc for docs in applicant.expected.values() for doc in docs]
+
+        faces = []
+        faces_dir = os.path.join(work, "faces")
+
+        def face():
+            faces.append(extract_face(front_path, output_dir=faces_dir))
+
+        def merge():
+            resolver = IdentityResolver()
+            for doc in documents:
+                resolver.add(dict(doc))
+
+        stages = {
+            "convert_pdf_to_images": timed(lambda: convert_pdf_to_images(pdf_path), iterations),
+            "encode_image": timed(lambda: encode_image(card), iterations),
+            "extract_face": timed(face, iterations),
+            "merge": timed(merge, iterations * 50),
+        }
+        stages["extract_face"]["hit_rate"] = round(sum(1 for f in faces if f) / len(faces), 3)
+        return stages
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+# --- End to end (child process) ---
+
+def run_level(args) -> dict:
+    """One concurrency level. Runs in its own process; prints a JSON result line."""
+    work = tempfile.mkdtemp(prefix="bench_suite_app_")
+    os.makedirs(os.path.join(work, "static"))
+    shutil.copy(os.path.join(ROOT, "driving_licence_reference.jpg"), work)
+    os.chdir(work)
+
+    # Settings are read at import time, and generating applicants already
+    # imports the pipeline modules: set the environment first
+    mock_port, app_port = free_port(), free_port()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{mock_port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "test")
+    os.environ["EXTRACTION_CACHE_ENABLED"] = "1" if args.cache else "0"
+    os.environ.setdefault("TRACE_LOG", "0")
+    for entry in args.env:
+        key, _, value = entry.partition("=")
+        os.environ[key] = value
+
+    applicants = [make_applicant(i, as_pdf=(args.format == "pdf")) for i in range(args.applicants)]
+
+    from mock_llm_server import MockConfig, run_in_thread
+    mock, _ = run_in_thread(MockConfig(
+        latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.error_rate,
+        documents_by_file=documents_by_file(applicants),
+    ), port=mock_port)
+
+    import uvicorn
+    import httpx
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=app_port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    async def drive():
+        queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(applicants[i % len(applicants)])
+        latencies, statuses = [], {}
+
+        async def client(http):
+            while not queue.empty():
+                applicant = queue.get_nowait()
+                files = [("files", (name, data, ctype)) for name, (data, ctype) in applicant.files.items()]
+                t = time.perf_counter()
+                try:
+                    r = await http.post(f"http://127.0.0.1:{app_port}/extract/?response_mode=url", files=files)
+                    status = r.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - t)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        async with httpx.AsyncClient(timeout=600) as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(http) for _ in range(args.level)))
+            return latencies, statuses, time.perf_counter() - start
+
+    with open(os.devnull, "w") as devnull:
+        # The pipeline prints per request; keep the report line clean
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            latencies, statuses, elapsed = asyncio.run(drive())
+        finally:
+            sys.stdout = stdout
+
+    server.should_exit = True
+    thread.join(timeout=30)
+    mock.should_exit = True
+    main.shutdown_executors(wait=True)
+
+    result = summarize(latencies, elapsed)
+    result.pop("ops_per_sec")
+    result.update({
+        "concurrency": args.level,
+        "requests": args.requests,
+        "requests_per_sec": round(args.requests / elapsed, 2),
+        "statuses": statuses,
+        "errors": sum(n for s, n in statuses.items() if s != "200"),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    })
+    shutil.rmtree(work, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def run_e2e(args) -> list:
+    results = []
+    for level in args.concurrency:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--level", str(level),
+               "--requests", str(args.requests), "--applicants", str(args.applicants), "--format", args.format,
+               "--llm-latency", str(args.llm_latency), "--llm-jitter", str(args.llm_jitter),
+               "--error-rate", str(args.error_rate)] + (["--cache"] if args.cache else [])
+        cmd += [f"--env={entry}" for entry in args.env]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(proc.stderr[-2000:], file=sys.stderr)
+            results.append({"concurrency": level, "failed": True})
+            continue
+        result = json.loads(lines[-1])
+        results.append(result)
+        print(f"  c={level:<3} {result['requests_per_sec']:>7.2f} req/s  p50 {result['p50_ms']:>8.1f}  "
+              f"p95 {result['p95_ms']:>8.1f}  p99 {result['p99_ms']:>8.1f} ms  errors {result['errors']}  "
+              f"rss {result['peak_rss_mb']} MB (+workers {result['peak_worker_rss_mb']} MB)"
+              + (f"  statuses {result['statuses']}" if result["errors"] else ""))
+    return results
+
+
+# --- Report ---
+
+def git_revision() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "-uno"))}
+
+
+def compare(report: dict, baseline: dict):
+    def delta(new, old, higher_is_better):
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            return ""
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        return f"{change:+6.1f}% {'better' if better else 'worse' if abs(change) >= 1 else ''}"
+
+    print(f"\nvs {baseline.get('meta', {}).get('commit')}:")
+    for name, new in report.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(name)
+        if old:
+            print(f"  {name:<22} ops/s {old['ops_per_sec']:>9} -> {new['ops_per_sec']:>9} "
+                  f"{delta(new['ops_per_sec'], old['ops_per_sec'], True)}")
+    old_levels = {r.get("concurrency"): r for r in baseline.get("e2e", [])}
+    for new in report.get("e2e", []):
+        old = old_levels.get(new.get("concurrency"))
+        if not old or old.get("failed") or new.get("failed"):
+            continue
+        print(f"  c={new['concurrency']:<3} req/s {old['requests_per_sec']} -> {new['requests_per_sec']} "
+              f"{delta(new['requests_per_sec'], old['requests_per_sec'], True)}; "
+              f"p95 {old['p95_ms']} -> {new['p95_ms']} ms {delta(new['p95_ms'], old['p95_ms'], False)}; "
+              f"rss {old['peak_rss_mb']} -> {new['peak_rss_mb']} MB")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--applicants", type=int, default=8, help="Distinct synthetic applicants, cycled")
+    parser.add_argument("--format", choices=("images", "pdf"), default="images",
+                        help="Upload each applicant as 4 JPEGs or one 4-page PDF")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock LLM calls answered 429/500")
+    parser.add_argument("--cache", action="store_true", help="Leave the extraction cache on")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting for the app under test, e.g. --env CPU_QUEUE_DEPTH=64 (repeatable)")
+    parser.add_argument("--stage-iterations", type=int, default=20)
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--level", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_level(args)
+        return
+
+    report = {
+        "version": REPORT_VERSION,
+        "meta": {**git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                 "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "config": {k: v for k, v in vars(args).items() if k not in ("child", "level", "output", "compare")}},
+    }
+    if not args.skip_stages:
+        print("stages:")
+        report["stages"] = run_stages(args.stage_iterations)
+        for name, r in report["stages"].items():
+            print(f"  {name:<22} {r['ops_per_sec']:>9} ops/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+                  f"p99 {r['p99_ms']:>8.2f} ms" + (f"  hit rate {r['hit_rate']}" if "hit_rate" in r else ""))
+    if not args.skip_e2e:
+        print(f"/extract/ ({args.format}, mock LLM {args.llm_latency}s, errors {args.error_rate}):")
+        report["e2e"] = run_e2e(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,285 @@
+"""
+Local OpenAI-compatible stand-in for the Groq chat-completions endpoint.
+
+Answers POST /v1/chat/completions with a canned `{"documents": [...]}` JSON
+body after a configurable delay, and injects 429/500 errors at a configurable
+rate, so latency and failure handling can be load-tested without the network.
+
+Requests with "stream": true get the same body as server-sent chat
+completion chunks: --stream-prefill of the latency passes before the first
+chunk (time to first token), the rest is spread over the chunks.
+
+It can also behave like a provider under load: --rate-limit answers 429
+(with Retry-After) above a request rate, and --capacity stretches latency
+once more than that many calls are in flight (they share the capacity).
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8001 --latency 0.8 --jitter 0.2 --error-rate 0.1
+    python benchmarks/mock_llm_server.py --latency 0.5 --rate-limit 10 --capacity 4
+    python benchmarks/mock_llm_server.py --latency 4 --stream-prefill 0.2 --stream-chunk-chars 8
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 GROQ_API_KEY=test uvicorn main:app
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+
+DEFAULT_DOCUMENTS = [
+    {
+        "Document Type": "PAN",
+        "Name": "Ravi Kumar",
+        "Father Name": "Suresh Kumar",
+        "Date of Birth": "1990-01-01",
+        "PAN Number": "ABCDE1234F",
+    },
+    {
+        "Document Type": "Driving Licence",
+        "Name": "Ravi Kumar",
+        "DL Number": "HR01 20000000856",
+        "Address": "FLAT NO 401, SECTOR 5, GURGAON",
+    },
+]
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.5       # mean seconds per completion
+    per_image_latency: float = 0.0  # extra seconds per image in the request
+    jitter: float = 0.0        # +/- uniform jitter in seconds
+    error_rate: float = 0.0    # fraction of calls answered with an error
+    error_status: list = field(default_factory=lambda: [429, 500])
+    documents: list = field(default_factory=lambda: list(DEFAULT_DOCUMENTS))
+    # filename -> documents for that file (see synthetic_docs); when set, a
+    # call returns the documents of the files it was sent instead of `documents`
+    documents_by_file: dict = field(default_factory=dict)
+    # Provider limits: requests/s above which calls get a 429 (token bucket of
+    # rate_burst), and in-flight calls beyond which latency stretches (0 = off)
+    rate_limit: float = 0.0
+    rate_burst: float = 0.0    # defaults to one second of rate_limit
+    capacity: int = 0
+    # Streamed replies: share of the latency before the first chunk, and chunk size
+    stream_prefill: float = 0.2
+    stream_chunk_chars: int = 8
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def answer_by_file(documents_by_file: dict, files: list) -> list:
+    """
+    The known documents of the files in this call, each once, with Source
+    Files narrowed to the files actually sent (so a call with only one side
+    of an Aadhar card reports one side, like the real model would).
+    """
+    documents, seen = [], set()
+    for name in files:
+        for doc in documents_by_file.get(name, []):
+            key = json.dumps(doc, sort_keys=True)
+            if key in seen:
+                continue
+            seen.add(key)
+            sent = [f for f in doc.get("Source Files", [name]) if f in files]
+            documents.append(dict(doc, **{"Source Files": sent}))
+    return documents
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "errors": 0, "images": 0, "image_bytes": 0, "rate_limited": 0, "peak_in_flight": 0,
+                       "streamed": 0}
+    app.state.in_flight = 0
+    app.state.bucket = TokenBucket(config.rate_limit, config.rate_burst or config.rate_limit) if config.rate_limit else None
+
+    def source_files(messages):
+        # Attribute every canned document to the files named in the prompt
+        names = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, list):
+                continue
+            for part in content:
+                text = part.get("text", "") if part.get("type") == "text" else ""
+                if text.startswith("Above image is from file: "):
+                    names.append(text[len("Above image is from file: "):])
+        return sorted(set(names))
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        cfg = app.state.config
+        app.state.stats["requests"] += 1
+
+        image_urls = [
+            part["image_url"]["url"] for message in body.get("messages", []) if isinstance(message.get("content"), list)
+            for part in message["content"] if part.get("type") == "image_url"
+        ]
+        images = len(image_urls)
+        app.state.stats["images"] += images
+        app.state.stats["image_bytes"] += sum(len(url.partition(",")[2]) * 3 // 4 for url in image_urls)
+
+        if app.state.bucket is not None:
+            wait = app.state.bucket.take()
+            if wait:
+                app.state.stats["rate_limited"] += 1
+                return JSONResponse(status_code=429, headers={"Retry-After": f"{wait:.2f}"}, content={
+                    "error": {"message": "Rate limit reached", "type": "rate_limit_exceeded", "code": 429}
+                })
+
+        delay = max(0.0, cfg.latency + images * cfg.per_image_latency + random.uniform(-cfg.jitter, cfg.jitter))
+        stream = bool(body.get("stream"))
+        prefill = delay * cfg.stream_prefill if stream else delay
+        app.state.in_flight += 1
+        app.state.stats["peak_in_flight"] = max(app.state.stats["peak_in_flight"], app.state.in_flight)
+        try:
+            await serve(prefill)
+        finally:
+            app.state.in_flight -= 1
+
+        if cfg.error_rate and random.random() < cfg.error_rate:
+            app.state.stats["errors"] += 1
+            status = random.choice(cfg.error_status)
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            return JSONResponse(status_code=status, headers=headers, content={
+                "error": {"message": f"Injected {status}", "type": "mock_error", "code": status}
+            })
+
+        files = source_files(body.get("messages", []))
+        if cfg.documents_by_file:
+            documents = answer_by_file(cfg.documents_by_file, files)
+        else:
+            documents = [dict(doc, **{"Source Files": files}) for doc in cfg.documents]
+        content = json.dumps({"documents": documents})
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "mock-model")
+        if stream:
+            app.state.stats["streamed"] += 1
+            return StreamingResponse(stream_chunks(completion_id, model, content, delay - prefill),
+                                     media_type="text/event-stream")
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    async def serve(seconds: float):
+        """Waits `seconds` of service time (stretched when over capacity)."""
+        cfg = app.state.config
+        if not cfg.capacity:
+            await asyncio.sleep(seconds)
+            return
+        # Processor sharing: beyond `capacity` concurrent calls each one progresses
+        # at capacity / in_flight of full speed
+        remaining = seconds
+        last = time.monotonic()
+        while remaining > 0:
+            await asyncio.sleep(min(0.05, remaining))
+            now = time.monotonic()
+            remaining -= (now - last) * min(1.0, cfg.capacity / app.state.in_flight)
+            last = now
+
+    async def stream_chunks(completion_id: str, model: str, content: str, seconds: float):
+        """The reply as chat.completion.chunk events, generated over `seconds`."""
+        size = max(1, app.state.config.stream_chunk_chars)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+
+        def event(delta: dict, finish_reason=None) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        app.state.in_flight += 1
+        try:
+            yield event({"role": "assistant", "content": ""})
+            for piece in pieces:
+                await serve(seconds / len(pieces))
+                yield event({"content": piece})
+            yield event({}, "stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            app.state.in_flight -= 1
+
+    return app
+
+
+def run_in_thread(config: MockConfig, host: str = "127.0.0.1", port: int = 8001):
+    """Starts the stub in a background thread. Returns (server, base_url)."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--per-image-latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, nargs="+", default=[429, 500])
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests/s before 429s (0 = off)")
+    parser.add_argument("--rate-burst", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=0, help="In-flight calls before latency stretches (0 = off)")
+    parser.add_argument("--stream-prefill", type=float, default=0.2, help="Share of the latency before the first streamed chunk")
+    parser.add_argument("--stream-chunk-chars", type=int, default=8)
+    parser.add_argument("--documents", help="JSON file with the documents list to return")
+    parser.add_argument("--documents-by-file", help="JSON file mapping filename -> documents for that file")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, per_image_latency=args.per_image_latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status,
+        rate_limit=args.rate_limit, rate_burst=args.rate_burst, capacity=args.capacity,
+        stream_prefill=args.stream_prefill, stream_chunk_chars=args.stream_chunk_chars,
+    )
+    if args.documents:
+        with open(args.documents) as f:
+            config.documents = json.load(f)
+    if args.documents_by_file:
+        with open(args.documents_by_file) as f:
+            config.documents_by_file = json.load(f)
+
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
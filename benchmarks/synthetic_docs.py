@@ -0,0 +1,234 @@
+"""
+Synthetic Aadhar / PAN / DL documents with known field values.
+
+Each applicant gets a consistent identity (valid Aadhar check digit, PAN
+and DL formats, matching names) rendered onto card images. The Aadhar
+front, PAN and DL cards carry a drawn face that the Haar cascade detects,
+at the *_PHOTO positions (the Aadhar front also has a faint ghost copy).
+An applicant can be uploaded as separate JPEGs or as one multi-page PDF.
+`expected` holds the documents a perfect extractor would return per
+uploaded filename, in the shape the LLM is asked for. mock_llm_server can
+answer with them (MockConfig.documents_by_file), so runs pass the
+pipeline's validation like real uploads.
+"""
+import io
+import os
+import sys
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+CARD_SIZE = (1012, 638)  # CR80 at ~300 DPI
+
+# Where each card's portrait is pasted: (x, y, width, height) in card pixels
+AADHAR_PHOTO = (50, 140, 220, 280)
+PAN_PHOTO = (40, 330, 200, 250)
+DL_PHOTO = (40, 110, 200, 250)
+# Faint duplicate portrait, like the ghost image on PVC Aadhar cards
+AADHAR_GHOST = (850, 330, 110, 140)
+
+FIRST = ["Ravi", "Atul", "Priya", "Sunita", "Mohammed", "Anil", "Deepa", "Karan", "Meena", "Vikram"]
+LAST = ["Kumar", "Sharma", "Verma", "Iyer", "Khan", "Reddy", "Das", "Patel", "Singh", "Nair"]
+CITIES = [("New Delhi", "110001", "DL"), ("Gurgaon", "122001", "HR"), ("Mumbai", "400001", "MH"),
+          ("Bengaluru", "560001", "KA"), ("Chennai", "600001", "TN")]
+
+
+@dataclass
+class Applicant:
+    name: str
+    father: str
+    dob: str            # YYYY-MM-DD
+    gender: str
+    aadhar: str         # "1234 5678 9012"
+    pan: str
+    dl: str
+    address: str
+    # filename -> (bytes, content type), in upload order
+    files: Dict[str, Tuple[bytes, str]] = field(default_factory=dict)
+    # filename -> documents the extractor should return for that file
+    expected: Dict[str, List[dict]] = field(default_factory=dict)
+
+
+def _aadhar_number(rng: random.Random) -> str:
+    from tiered_extractor import verhoeff_valid
+    while True:
+        digits = f"{rng.randrange(2 * 10**10, 10**11)}"
+        for d in "0123456789":
+            if verhoeff_valid(digits + d):
+                n = digits + d
+                return f"{n[:4]} {n[4:8]} {n[8:]}"
+
+
+def _font(size: int):
+    return ImageFont.load_default(size=size)
+
+
+def draw_face(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """A simple drawn portrait (hair, skin, eyes, nose, mouth) the frontal-face cascade picks up."""
+    w, h = size
+    skin = (rng.randint(180, 220), rng.randint(135, 170), rng.randint(105, 140))
+    img = Image.new("RGB", size, (235, 235, 240))
+    d = ImageDraw.Draw(img)
+    d.ellipse((0.05 * w, -0.1 * h, 0.95 * w, 0.5 * h), fill=(40, 30, 25))
+    d.ellipse((0.12 * w, 0.08 * h, 0.88 * w, 0.95 * h), fill=skin)
+    for cx in (0.35, 0.65):
+        d.line((cx * w - 0.1 * w, 0.36 * h, cx * w + 0.1 * w, 0.34 * h), fill=(50, 35, 30), width=max(1, int(0.03 * h)))
+        d.ellipse((cx * w - 0.08 * w, 0.42 * h, cx * w + 0.08 * w, 0.49 * h), fill=(245, 245, 245))
+        d.ellipse((cx * w - 0.035 * w, 0.425 * h, cx * w + 0.035 * w, 0.485 * h), fill=(30, 20, 15))
+    d.polygon([(0.5 * w, 0.47 * h), (0.44 * w, 0.64 * h), (0.56 * w, 0.64 * h)],
+              fill=(skin[0] - 25, skin[1] - 30, skin[2] - 30))
+    d.ellipse((0.38 * w, 0.72 * h, 0.62 * w, 0.79 * h), fill=(150, 70, 70))
+    d.rectangle((0, 0.95 * h, w, h), fill=(60, 60, 90))
+    return img.filter(ImageFilter.GaussianBlur(2))
+
+
+def _text(draw: ImageDraw.ImageDraw, lines: List[str], x: int, y: int, size: int = 28, fill=(20, 20, 20)):
+    for line in lines:
+        draw.text((x, y), line, fill=fill, font=_font(size))
+        y += int(size * 1.5)
+
+
+def _tricolour(draw: ImageDraw.ImageDraw, width: int):
+    draw.rectangle((0, 0, width, 40), fill=(240, 130, 30))
+    draw.rectangle((0, 40, width, 60), fill=(255, 255, 255))
+    draw.rectangle((0, 60, width, 90), fill=(40, 150, 60))
+
+
+def _dmy(iso: str) -> str:
+    y, m, d = iso.split("-")
+    return f"{d}/{m}/{y}"
+
+
+def aadhar_front(a: Applicant, rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", CARD_SIZE, (252, 252, 250))
+    draw = ImageDraw.Draw(img)
+    _tricolour(draw, CARD_SIZE[0])
+    _text(draw, ["GOVERNMENT OF INDIA"], 330, 45, 26)
+    x, y, w, h = AADHAR_PHOTO
+    face = draw_face((w, h), rng)
+    img.paste(face, (x, y))
+    gx, gy, gw, gh = AADHAR_GHOST
+    img.paste(Image.blend(img.crop((gx, gy, gx + gw, gy + gh)), face.resize((gw, gh)), 0.35), (gx, gy))
+    _text(draw, [a.name, f"DOB: {_dmy(a.dob)}", a.gender.upper()], 310, 170)
+    _text(draw, [a.aadhar], 330, 520, 44)
+    return img
+
+
+def aadhar_back(a: Applicant, rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", CARD_SIZE, (252, 252, 250))
+    draw = ImageDraw.Draw(img)
+    _tricolour(draw, CARD_SIZE[0])
+    _text(draw, ["Unique Identification Authority of India", "Address:"] + a.address.split(", "), 40, 120, 26)
+    for _ in range(300):
+        x, y = rng.randrange(760, 960, 10), rng.randrange(330, 530, 10)
+        draw.rectangle((x, y, x + 9, y + 9), fill=(0, 0, 0))
+    _text(draw, [a.aadhar], 330, 560, 40)
+    return img
+
+
+def pan_card(a: Applicant, rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", CARD_SIZE, (190, 222, 240))
+    draw = ImageDraw.Draw(img)
+    _text(draw, ["INCOME TAX DEPARTMENT", "GOVT. OF INDIA"], 40, 30, 30)
+    _text(draw, ["Permanent Account Number", a.pan, "Name", a.name.upper(), "Father's Name", a.father.upper(),
+                 "Date of Birth", _dmy(a.dob)], 300, 130, 26)
+    x, y, w, h = PAN_PHOTO
+    img.paste(draw_face((w, h), rng), (x, y))
+    return img
+
+
+def dl_card(a: Applicant, rng: random.Random) -> Image.Image:
+    img = Image.new("RGB", CARD_SIZE, (236, 240, 226))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, CARD_SIZE[0], 70), fill=(70, 110, 170))
+    _text(draw, ["Union of India Driving Licence"], 40, 18, 30, fill=(255, 255, 255))
+    x, y, w, h = DL_PHOTO
+    img.paste(draw_face((w, h), rng), (x, y))
+    _text(draw, [f"DL No: {a.dl}", f"Name: {a.name.upper()}", f"S/W/D: {a.father.upper()}", f"DOB: {_dmy(a.dob)}",
+                 "Add: " + a.address.split(", ")[0]] + a.address.split(", ")[1:], 280, 110, 26)
+    return img
+
+
+def scan(card: Image.Image, rng: random.Random) -> Image.Image:
+    """Scanner look: slight rotation, border and blur."""
+    card = card.rotate(rng.uniform(-2, 2), expand=True, fillcolor=(250, 250, 250))
+    canvas = Image.new("RGB", (card.width + 100, card.height + 100), (250, 250, 250))
+    canvas.paste(card, (rng.randint(30, 70), rng.randint(30, 70)))
+    return canvas.filter(ImageFilter.GaussianBlur(rng.uniform(0.2, 0.8)))
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def _pdf(images: List[Image.Image]) -> bytes:
+    """One A4 page per card, each card embedded as a JPEG (like a scanner's PDF)."""
+    import fitz
+    doc = fitz.open()
+    for img in images:
+        page = doc.new_page(width=595, height=842)
+        scale = 450 / img.width
+        rect = fitz.Rect(72, 72, 72 + img.width * scale, 72 + img.height * scale)
+        page.insert_image(rect, stream=_jpeg(img))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_applicant(i: int, seed: int = 11, as_pdf: bool = False, repeat: int = 1) -> Applicant:
+    """
+    Applicant `i` (deterministic for a seed), as 4 JPEG uploads or one 4-page
+    PDF. With as_pdf, `repeat` rescans every card that many times (a long
+    scanned bundle of 4 * repeat pages).
+    """
+    rng = random.Random(seed * 100_003 + i)
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    city, pin, state = rng.choice(CITIES)
+    a = Applicant(
+        name=f"{first} {last}",
+        father=f"{rng.choice(FIRST)} {last}",
+        dob=f"{rng.randint(1960, 2002)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        gender=rng.choice(["Male", "Female"]),
+        aadhar=_aadhar_number(rng),
+        pan=f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(3))}P{last[0].upper()}"
+            f"{rng.randrange(1000, 9999)}{rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}",
+        dl=f"{state}{rng.randint(1, 99):02d} {rng.randint(1990, 2022)}{rng.randrange(10**6, 10**7):07d}",
+        address=f"House {rng.randint(1, 999)}, Sector {rng.randint(1, 60)}, {city} {pin}",
+    )
+    cards = [
+        (f"applicant{i}_aadhar_front.jpg", aadhar_front(a, rng)),
+        (f"applicant{i}_aadhar_back.jpg", aadhar_back(a, rng)),
+        (f"applicant{i}_pan.jpg", pan_card(a, rng)),
+        (f"applicant{i}_dl.jpg", dl_card(a, rng)),
+    ]
+    aadhar_doc = {"Document Type": "Aadhar", "Name": a.name, "Date of Birth": a.dob, "Gender": a.gender,
+                  "Aadhar Number": a.aadhar, "Address": a.address, "Sides Detected": ["Front", "Back"]}
+    pan_doc = {"Document Type": "PAN", "Name": a.name, "Father Name": a.father, "Date of Birth": a.dob,
+               "PAN Number": a.pan}
+    dl_doc = {"Document Type": "Driving Licence", "Name": a.name, "DL Number": a.dl, "Address": a.address}
+
+    if as_pdf:
+        filename = f"applicant{i}.pdf"
+        a.files[filename] = (_pdf([scan(img, rng) for _, img in cards for _ in range(repeat)]), "application/pdf")
+        a.expected[filename] = [dict(d, **{"Source Files": [filename]}) for d in (aadhar_doc, pan_doc, dl_doc)]
+        return a
+
+    front, back = cards[0][0], cards[1][0]
+    for (filename, img), doc in zip(cards, (aadhar_doc, aadhar_doc, pan_doc, dl_doc)):
+        a.files[filename] = (_jpeg(scan(img, rng)), "image/jpeg")
+        sources = [front, back] if doc is aadhar_doc else [filename]
+        a.expected[filename] = [dict(doc, **{"Source Files": sources})]
+    return a
+
+
+def documents_by_file(applicants: List[Applicant]) -> Dict[str, List[dict]]:
+    """filename -> expected documents, for MockConfig.documents_by_file."""
+    return {name: docs for a in applicants for name, docs in a.expected.items()}
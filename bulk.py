@@ -0,0 +1,247 @@
+"""
+Offline bulk extraction over a directory tree or ZIP archive of applicant folders.
+
+Every folder that directly contains PDF/JPEG/PNG files is one applicant and
+goes through the same render -> extract -> merge -> validate pipeline as
+POST /extract/, without FastAPI. Folders run across a process pool; the total
+number of in-flight LLM calls is capped across all processes.
+
+Results (and per-folder errors) are appended to a JSONL file. Completed
+folders are recorded in a checkpoint file, so re-running the same command
+after an interruption skips them. Only successes and errors caused by the
+folder itself (4xx: bad or incomplete documents) are checkpointed; server-side
+errors (5xx: LLM unavailable, server busy, crashes) are not, so the folder
+runs again. The run refuses to start without GROQ_API_KEY.
+
+Usage:
+    python bulk.py /data/kyc --output results.jsonl --workers 4 --llm-concurrency 8
+    python bulk.py backfill.zip --output results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", os.cpu_count() or 1))
+BULK_LLM_CONCURRENCY = int(os.environ.get("BULK_LLM_CONCURRENCY", 8))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png")
+# Client errors that say nothing about the folder's content: retried like 5xx
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+# A folder task: (folder id, archive path or None, [(filename, path or archive member)])
+FolderTask = Tuple[str, Optional[str], List[Tuple[str, str]]]
+
+
+def discover_folders(source: str) -> Iterator[FolderTask]:
+    """Yields one task per applicant folder, in a stable (sorted) order."""
+    if zipfile.is_zipfile(source):
+        groups: Dict[str, List[Tuple[str, str]]] = {}
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                groups.setdefault(os.path.dirname(name), []).append((os.path.basename(name), name))
+        for folder in sorted(groups):
+            yield f"{os.path.basename(source)}:{folder or '.'}", source, sorted(groups[folder])
+        return
+
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        entries = sorted((f, os.path.join(root, f)) for f in files if f.lower().endswith(SUPPORTED_EXTENSIONS))
+        if entries:
+            yield os.path.relpath(root, source), None, entries
+
+
+# --- Worker process ---
+
+_loop = None
+
+
+def _init_worker(llm_limiter):
+    # Parallelism comes from the folder processes; each runs its CPU stages on
+    # one thread instead of forking a process pool of its own.
+    os.environ.setdefault("CPU_POOL", "thread")
+    os.environ.setdefault("CPU_WORKERS", "1")
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    import llm_extractor
+    if llm_extractor.backend is not None:
+        llm_extractor.backend.process_limiter = llm_limiter
+
+    # One loop per process so the pooled HTTP client and semaphores are reused across folders
+    global _loop
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+
+def _read_files(archive_path: Optional[str], entries: List[Tuple[str, str]]) -> List[Tuple[str, bytes]]:
+    if archive_path is None:
+        out = []
+        for filename, path in entries:
+            with open(path, "rb") as f:
+                out.append((filename, f.read()))
+        return out
+    with zipfile.ZipFile(archive_path) as archive:
+        return [(filename, archive.read(member)) for filename, member in entries]
+
+
+async def _process_folder(task: FolderTask) -> dict:
+    from ingest import ingest_bytes, UploadRejected
+    from pipeline import process_ingested_files, ProcessingError
+    from llm_extractor import backend
+    from extraction_cache import extraction_cache
+
+    folder, archive_path, entries = task
+    start = time.perf_counter()
+    calls_before = backend.stats["calls"] if backend else 0
+    hits_before = (extraction_cache.stats["memory_hits"] + extraction_cache.stats["disk_hits"]) if extraction_cache else 0
+    stages = {}
+
+    result = {"folder": folder, "files": [filename for filename, _ in entries]}
+    try:
+        ingested_files = []
+        for filename, data in _read_files(archive_path, entries):
+            ingested = ingest_bytes(filename, data)
+            if ingested is not None:
+                ingested_files.append(ingested)
+        if not ingested_files:
+            raise ProcessingError(415, "No PDF, JPEG or PNG content in folder.")
+        request_id, documents = await process_ingested_files(
+            folder, ingested_files, progress=lambda stage, **details: stages.update({stage: details}),
+            priority="bulk",
+        )
+        result.update(status="ok", documents=documents)
+    except (ProcessingError, UploadRejected) as e:
+        result.update(status="error", status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        result.update(status="error", status_code=500, detail=str(e))
+
+    result["pages"] = stages.get("rendered", {}).get("pages", 0)
+    result["llm_calls"] = (backend.stats["calls"] if backend else 0) - calls_before
+    result["cache_hits"] = ((extraction_cache.stats["memory_hits"] + extraction_cache.stats["disk_hits"]) if extraction_cache else 0) - hits_before
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def process_folder(task: FolderTask) -> dict:
+    """Pool entry point: runs one folder on the worker's event loop."""
+    return _loop.run_until_complete(_process_folder(task))
+
+
+# --- Driver ---
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def is_final(result: dict) -> bool:
+    """Whether a folder's result stands: success, or an error in the folder's own documents."""
+    if result["status"] == "ok":
+        return True
+    code = result.get("status_code") or 500
+    return 400 <= code < 500 and code not in RETRYABLE_CLIENT_STATUS
+
+
+def run(source: str, output: str, checkpoint: str, workers: int, llm_concurrency: int, max_folders: Optional[int] = None) -> dict:
+    done = load_checkpoint(checkpoint)
+    tasks = (t for t in discover_folders(source) if t[0] not in done)
+    if done:
+        print(f"Resuming: {len(done)} folder(s) already done per {checkpoint}")
+
+    # Spawned workers start clean (no inherited PyMuPDF/OpenCV state or event loop)
+    ctx = multiprocessing.get_context("spawn")
+    llm_limiter = ctx.BoundedSemaphore(llm_concurrency)
+    totals = {"folders": 0, "ok": 0, "errors": 0, "retryable": 0, "pages": 0, "llm_calls": 0, "cache_hits": 0}
+    start = time.perf_counter()
+
+    with open(output, "a") as out, open(checkpoint, "a") as ckpt, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(llm_limiter,)) as pool:
+        pending = set()
+        submitted = 0
+
+        def fill():
+            # Keep a small window in flight instead of submitting every folder up front
+            nonlocal submitted
+            while len(pending) < workers * 2 and (max_folders is None or submitted < max_folders):
+                task = next(tasks, None)
+                if task is None:
+                    return
+                pending.add(pool.submit(process_folder, task))
+                submitted += 1
+
+        fill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pending.discard(future)
+                result = future.result()
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                retryable = not is_final(result)
+                if not retryable:
+                    # Written after the result line: a crash in between repeats the folder, never loses it
+                    ckpt.write(result["folder"] + "\n")
+                    ckpt.flush()
+
+                totals["folders"] += 1
+                totals["ok" if result["status"] == "ok" else "errors"] += 1
+                totals["retryable"] += retryable
+                for key in ("pages", "llm_calls", "cache_hits"):
+                    totals[key] += result[key]
+                if totals["folders"] % 50 == 0:
+                    print_summary(totals, time.perf_counter() - start)
+            fill()
+
+    totals["elapsed"] = time.perf_counter() - start
+    return totals
+
+
+def print_summary(totals: dict, elapsed: float):
+    minutes = max(elapsed, 1e-9) / 60
+    # Pages that did not need their own LLM call (cache hits and batching)
+    saved = max(0, totals["pages"] - totals["llm_calls"])
+    print(
+        f"{totals['folders']} folders ({totals['ok']} ok, {totals['errors']} errors, {totals['retryable']} to retry) "
+        f"in {elapsed:.1f}s | {totals['folders'] / minutes:.1f} folders/min, {totals['pages'] / minutes:.1f} pages/min | "
+        f"{totals['llm_calls']} LLM calls for {totals['pages']} pages ({saved} saved, {totals['cache_hits']} cache hits)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory tree or ZIP archive of applicant folders")
+    parser.add_argument("--output", default="bulk_results.jsonl")
+    parser.add_argument("--checkpoint", help="Completed-folder list (default: OUTPUT.checkpoint)")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--llm-concurrency", type=int, default=BULK_LLM_CONCURRENCY,
+                        help="Maximum LLM calls in flight across all workers")
+    parser.add_argument("--max-folders", type=int, help="Stop after this many folders (for trial runs)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        sys.exit(f"Not found: {args.source}")
+    from dotenv import load_dotenv
+    load_dotenv()
+    import llm_extractor
+    if llm_extractor.backend is None:
+        # Every folder would fail with a 500; nothing to gain from walking the tree
+        sys.exit("LLM client not initialized: set GROQ_API_KEY (environment or .env) and re-run.")
+    totals = run(args.source, args.output, args.checkpoint or args.output + ".checkpoint",
+                 args.workers, args.llm_concurrency, args.max_folders)
+    print_summary(totals, totals["elapsed"])
+
+
+if __name__ == "__main__":
+    main()
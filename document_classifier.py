@@ -0,0 +1,159 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import cv2
+import numpy as np
+
+from page import Page
+from payload_optimizer import find_content_bbox
+from face_extractor import get_detector
+
+# Local page classification before extraction
+DOC_CLASSIFIER_ENABLED = os.environ.get("DOC_CLASSIFIER_ENABLED", "1") == "1"
+# Drop pages classified as blank / non-ID instead of sending them to the LLM
+DOC_CLASSIFIER_DROP = os.environ.get("DOC_CLASSIFIER_DROP", "1") == "1"
+# Reference images for template matching: "label=path,label=path"
+DOC_CLASSIFIER_TEMPLATES = os.environ.get("DOC_CLASSIFIER_TEMPLATES", "dl=driving_licence_reference.jpg")
+# ORB matches (after the ratio test) needed to accept a template match
+DOC_TEMPLATE_MIN_MATCHES = int(os.environ.get("DOC_TEMPLATE_MIN_MATCHES", 40))
+
+# Labels. "unknown" pages are kept and go through the generic prompt.
+AADHAR_FRONT, AADHAR_BACK, PAN, DL = "aadhar_front", "aadhar_back", "pan", "dl"
+UNKNOWN, BLANK, NON_ID = "unknown", "blank", "non_id"
+DROP_LABELS = (BLANK, NON_ID)
+
+# Features are computed on a small probe of the card region
+_PROBE_EDGE = 320
+_TEMPLATE_EDGE = 480
+
+
+@dataclass
+class Classification:
+    label: str
+    features: Dict[str, float] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def _probe(image: np.ndarray, edge: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    scale = min(1.0, edge / float(max(h, w)))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return image
+
+
+# --- Template matching ---
+
+_orb = None
+_templates: Optional[Dict[str, tuple]] = None
+
+
+def _load_templates() -> Dict[str, tuple]:
+    """ORB descriptors for each reference image, computed once per process."""
+    global _orb, _templates
+    if _templates is None:
+        _orb = cv2.ORB_create(nfeatures=500)
+        _templates = {}
+        for entry in filter(None, DOC_CLASSIFIER_TEMPLATES.split(",")):
+            label, path = entry.split("=", 1)
+            ref = cv2.imread(path.strip(), cv2.IMREAD_GRAYSCALE)
+            if ref is None:
+                print(f"Classifier template not found: {path}")
+                continue
+            _, descriptors = _orb.detectAndCompute(_probe(ref, _TEMPLATE_EDGE), None)
+            if descriptors is not None:
+                _templates[label.strip()] = descriptors
+    return _templates
+
+
+def template_scores(gray: np.ndarray) -> Dict[str, int]:
+    """Good ORB matches (Lowe ratio test) between the page and each template."""
+    templates = _load_templates()
+    if not templates:
+        return {}
+    _, descriptors = _orb.detectAndCompute(_probe(gray, _TEMPLATE_EDGE), None)
+    if descriptors is None or len(descriptors) < 2:
+        return {label: 0 for label in templates}
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+    scores = {}
+    for label, ref in templates.items():
+        pairs = matcher.knnMatch(descriptors, ref, k=2)
+        scores[label] = sum(1 for p in pairs if len(p) == 2 and p[0].distance < 0.75 * p[1].distance)
+    return scores
+
+
+# --- Features ---
+
+def page_features(page: Page) -> Dict[str, float]:
+    """Colour, layout and face features of the page's card region."""
+    rgb = page.array if page.mode == "RGB" else cv2.cvtColor(page.array, cv2.COLOR_GRAY2RGB)
+    bbox = find_content_bbox(page)
+    full_h, full_w = rgb.shape[:2]
+    if bbox:
+        x0, y0, x1, y1 = bbox
+        rgb = rgb[y0:y1, x0:x1]
+    small = _probe(rgb, _PROBE_EDGE)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    hsv = cv2.cvtColor(small, cv2.COLOR_RGB2HSV)
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    h, w = gray.shape
+
+    # Ink: pixels clearly darker than the local paper colour
+    ink = gray < (np.median(gray) - 60)
+    return {
+        "aspect": w / float(h),
+        "portrait_page": float(full_h > full_w * 1.2 and not bbox),
+        "gray_std": float(gray.std()),
+        "ink": float(ink.mean()),
+        "white": float(((sat < 30) & (val > 200)).mean()),
+        "saturated": float((sat > 80).mean()),
+        # OpenCV hue is 0-180
+        "orange": float(((hue >= 5) & (hue <= 22) & (sat > 90) & (val > 120)).mean()),
+        "green": float(((hue >= 40) & (hue <= 85) & (sat > 70) & (val > 60)).mean()),
+        "pale_blue": float(((hue >= 85) & (hue <= 110) & (sat > 25) & (val > 150)).mean()),
+        "faces": float(len(get_detector().detect(_probe(rgb, 640), rgb=True))),
+        **{f"template_{k}": float(v) for k, v in template_scores(gray).items()},
+    }
+
+
+def classify_features(f: Dict[str, float]) -> str:
+    """
+    Rules over page_features. Deliberately conservative about dropping: a page
+    is only "non_id" when it looks like a plain text page (portrait, mostly
+    white, no colour, no face); anything ambiguous is "unknown" and kept.
+    """
+    if f["gray_std"] < 6 or f["ink"] < 0.002:
+        return BLANK
+    if f.get("template_dl", 0) >= DOC_TEMPLATE_MIN_MATCHES:
+        return DL
+    if f["pale_blue"] > 0.25:
+        return PAN
+    if f["orange"] > 0.01 and f["green"] > 0.005:
+        # Tricolour header: Aadhar. The front carries the photo, the back a QR code.
+        return AADHAR_FRONT if f["faces"] else AADHAR_BACK
+    if not f["faces"] and f["white"] > 0.8 and f["saturated"] < 0.02 and f["aspect"] < 1.0:
+        return NON_ID
+    return UNKNOWN
+
+
+def classify_page(page: Page) -> Classification:
+    """Labels one page. CPU-bound; runs in a pool worker."""
+    start = time.perf_counter()
+    features = page_features(page)
+    return Classification(classify_features(features), features, time.perf_counter() - start)
+
+
+def label_pages(pages: List[Page]) -> List[Optional[Classification]]:
+    """
+    Labels every page of a request (one pool task, like dedupe_pages). A page
+    that fails to classify gets None.
+    """
+    results: List[Optional[Classification]] = []
+    for page in pages:
+        try:
+            results.append(classify_page(page))
+        except Exception as e:
+            print(f"Classification failed: {e!r}")
+            results.append(None)
+    return results
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Pool sizes and queue depths are configurable through the environment.
+# CPU-bound stages (PDF rendering, image encoding, face detection) go to a
+# process pool so they don't hold the GIL; blocking I/O (file writes, SDK
+# calls) goes to a thread pool.
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 16))
+# "process" (default) or "thread". Callers that are already one process per
+# worker (e.g. bulk.py) use a thread so they don't fork a pool of their own.
+CPU_POOL = os.environ.get("CPU_POOL", "process")
+
+# Maximum number of tasks handed to each pool at once (running + queued in
+# the pool). Further tasks of admitted requests wait their turn; a new request
+# is refused (admit_request) once this many tasks are already waiting, instead
+# of building an unbounded backlog.
+CPU_QUEUE_DEPTH = int(os.environ.get("CPU_QUEUE_DEPTH", CPU_WORKERS * 4))
+IO_QUEUE_DEPTH = int(os.environ.get("IO_QUEUE_DEPTH", IO_WORKERS * 4))
+
+
+class QueueFullError(Exception):
+    """Raised by admit_request when an executor's backlog is full."""
+
+
+class BoundedExecutor:
+    """
+    Wraps a concurrent.futures executor with a cap on in-flight tasks so the
+    event loop can await blocking work without the backlog growing forever.
+    Tasks past the cap wait (FIFO) for a slot rather than failing: a request's
+    own fan-out never rejects it. Overload is refused per request, see admit().
+    """
+
+    def __init__(self, name: str, factory, max_workers: int, queue_depth: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._factory = factory
+        self._executor = None
+        self._in_flight = 0
+        self._waiters: deque = deque()  # (loop, future) of tasks waiting for a slot
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Created lazily so importing this module never spawns processes
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._factory(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def admit(self):
+        """Raises QueueFullError if queue_depth tasks are already waiting for a slot."""
+        if len(self._waiters) >= self.queue_depth:
+            raise QueueFullError(f"{self.name} executor is at capacity ({self._in_flight} tasks in flight, "
+                                 f"{len(self._waiters)} waiting)")
+
+    async def _acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.queue_depth and not self._waiters:
+                self._in_flight += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+            if future.done() and not future.cancelled():
+                # Granted, but cancelled before it could run: hand the slot on
+                self._release()
+            raise
+
+    def _release(self):
+        # The slot passes straight to the first waiter, so in_flight only drops when nobody waits
+        with self._lock:
+            if not self._waiters:
+                self._in_flight -= 1
+                return
+            loop, future = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._grant, future)
+        except RuntimeError:
+            # The waiter's loop is closed; nobody will take the slot there
+            self._release()
+
+    def _grant(self, future):
+        # On the waiter's loop. A waiter cancelled in the meantime passes the slot on.
+        if future.cancelled():
+            self._release()
+        else:
+            future.set_result(None)
+
+    async def run(self, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) on the pool and awaits the result, waiting for a slot first."""
+        await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self._release()
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+cpu_executor = BoundedExecutor("cpu", ThreadPoolExecutor if CPU_POOL == "thread" else ProcessPoolExecutor, CPU_WORKERS, CPU_QUEUE_DEPTH)
+io_executor = BoundedExecutor("io", ThreadPoolExecutor, IO_WORKERS, IO_QUEUE_DEPTH)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Runs a CPU-bound, picklable function on the process pool."""
+    return await cpu_executor.run(func, *args, **kwargs)
+
+
+async def run_io(func, *args, **kwargs):
+    """Runs a blocking I/O function on the thread pool."""
+    return await io_executor.run(func, *args, **kwargs)
+
+
+def admit_request():
+    """
+    Request-level backpressure: raises QueueFullError (-> 503) while either
+    pool already has a full backlog. Tasks of admitted requests always wait.
+    """
+    cpu_executor.admit()
+    io_executor.admit()
+
+
+def shutdown_executors(wait: bool = True):
+    cpu_executor.shutdown(wait=wait)
+    io_executor.shutdown(wait=wait)
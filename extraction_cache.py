@@ -0,0 +1,205 @@
+import os
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from page import Page
+
+# Bump when the shape of cached values changes so old entries are ignored
+CACHE_SCHEMA_VERSION = "3"
+
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "1") == "1"
+EXTRACTION_CACHE_PATH = os.environ.get("EXTRACTION_CACHE_PATH", "cache/extraction_cache.sqlite3")
+EXTRACTION_CACHE_TTL = float(os.environ.get("EXTRACTION_CACHE_TTL", 7 * 24 * 3600))
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.environ.get("EXTRACTION_CACHE_MEMORY_ENTRIES", 2048))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def page_cache_key(page: Page, model: str, prompt: str, variant: str = "") -> str:
+    """
+    Content address for one page's extraction result: the page digest (its
+    pixels, or the original JPEG stream for passthrough pages, see
+    Page.digest) plus the prompt and model that produced the result.
+    `variant` carries anything else that changes what the model sees
+    (e.g. payload settings).
+    """
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_SCHEMA_VERSION}|{model}|{variant}|".encode())
+    h.update(hashlib.sha256(prompt.encode()).digest())
+    h.update(f"|{page.digest}".encode())
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of per-page extraction results.
+    Memory tier: bounded LRU. Disk tier: SQLite with TTL and total-size eviction.
+    Values are the list of document records attributed to the page, citing
+    pages by digest ("Source Pages") rather than by filename. Both
+    tiers hand out and keep their own copies, so callers may edit records.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = EXTRACTION_CACHE_PATH,
+        ttl: float = EXTRACTION_CACHE_TTL,
+        memory_entries: int = EXTRACTION_CACHE_MEMORY_ENTRIES,
+        max_bytes: int = EXTRACTION_CACHE_MAX_BYTES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+
+        self._memory: "OrderedDict[str, tuple[float, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        self._writes_since_sweep = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_accessed ON extraction_cache(accessed)")
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key: str, now: float) -> Optional[list]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: list, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # --- Public API ---
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the cached documents for a page, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                self.stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM extraction_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] + self.ttl >= now:
+                    value = json.loads(row[0])
+                    self._db.execute("UPDATE extraction_cache SET accessed = ? WHERE key = ?", (now, key))
+                    self._memory_put(key, value, row[1] + self.ttl)
+                    self.stats["disk_hits"] += 1
+                    return copy.deepcopy(value)
+                if row is not None:
+                    self._delete(key)
+                    self.stats["evictions"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        return [self.get(k) for k in keys]
+
+    def put(self, key: str, documents: List[Dict[str, Any]]):
+        now = time.time()
+        documents = copy.deepcopy(documents)
+        with self._lock:
+            self._memory_put(key, documents, now + self.ttl)
+            self.stats["writes"] += 1
+            if self._db is None:
+                return
+            payload = json.dumps(documents)
+            self._delete(key)
+            self._db.execute(
+                "INSERT INTO extraction_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._disk_bytes += len(payload)
+            self._writes_since_sweep += 1
+            sweep = self._disk_bytes > self.max_bytes or self._writes_since_sweep >= 100
+        if sweep:
+            self._evict_disk()
+
+    def put_many(self, entries: Dict[str, List[Dict[str, Any]]]):
+        for key, documents in entries.items():
+            self.put(key, documents)
+
+    def _delete(self, key: str):
+        # Caller holds the lock
+        row = self._db.execute("SELECT size FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            self._disk_bytes -= row[0]
+
+    def _evict_disk(self):
+        """Drops expired rows, then least-recently-used rows until under max_bytes."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._writes_since_sweep = 0
+            cutoff = time.time() - self.ttl
+            for key, size in self._db.execute(
+                "SELECT key, size FROM extraction_cache WHERE created < ?", (cutoff,)
+            ).fetchall():
+                self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+
+            if self._disk_bytes <= self.max_bytes:
+                return
+            # Remove least-recently-accessed rows until we are back under budget
+            for key, size in self._db.execute(
+                "SELECT key, size FROM extraction_cache ORDER BY accessed ASC"
+            ).fetchall():
+                if self._disk_bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM extraction_cache")
+                self._disk_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+if EXTRACTION_CACHE_ENABLED:
+    extraction_cache = ExtractionCache()
+else:
+    extraction_cache = None
@@ -1,111 +1,353 @@
 import cv2
 import os
-import uuid
+import threading
 import numpy as np
 
-def extract_face(image_path, output_dir="temp_uploads"):
+from face_store import get_face_store
+from payload_optimizer import find_content_bbox
+
+# Detection runs on a downscaled grayscale copy; boxes are mapped back to the
+# full-resolution image for cropping. Tunable through the environment.
+FACE_DETECT_MAX_EDGE = int(os.environ.get("FACE_DETECT_MAX_EDGE", 800))
+FACE_SCALE_FACTOR = float(os.environ.get("FACE_SCALE_FACTOR", 1.1))
+FACE_MIN_NEIGHBORS = int(os.environ.get("FACE_MIN_NEIGHBORS", 5))
+FACE_MIN_SIZE = int(os.environ.get("FACE_MIN_SIZE", 24))  # pixels, in the downscaled image
+
+# 35mm x 45mm @ 300 DPI => ~413 x 531 pixels
+FACE_OUTPUT_SIZE = (413, 531)
+
+DEFAULT_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Layout-aware cropping: search the card's known photo region first, and the
+# full frame only when that finds nothing (FACE_LAYOUT_FALLBACK)
+FACE_LAYOUT_ENABLED = os.environ.get("FACE_LAYOUT_ENABLED", "1") == "1"
+FACE_LAYOUT_FALLBACK = os.environ.get("FACE_LAYOUT_FALLBACK", "1") == "1"
+
+# Portrait position per card (keys are document_classifier labels), as
+# (x0, y0, x1, y1) fractions of the card's content box, landscape. Generous
+# on purpose: the box includes scan margins and a little skew.
+PHOTO_REGIONS = {
+    "aadhar_front": [(0.0, 0.1, 0.42, 0.95)],
+    "pan": [(0.0, 0.25, 0.42, 1.0)],
+    "dl": [(0.0, 0.1, 0.4, 0.9)],
+}
+# Cards without a portrait: never searched
+NO_PHOTO_LABELS = ("aadhar_back",)
+
+
+def photo_regions(doc: dict, page_label: str = None):
     """
-    Detects and extracts the largest face from an image.
-    Enforces a 35mm x 45mm aspect ratio (7:9).
-    Returns the path to the cropped face image, or None if no face is found.
+    Photo regions to search on one source page of `doc`: from the page
+    classifier's label when it names a card, else from the extracted
+    Document Type (and Aadhar side). Returns a list of regions, [] when the
+    page can't hold a photo, or None when the layout is unknown (full frame).
     """
-    try:
-        # Load the cascade
-        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        face_cascade = cv2.CascadeClassifier(face_cascade_path)
-        
-        if face_cascade.empty():
-            print("Error: Face cascade classifier not loaded.")
-            return None
+    if not FACE_LAYOUT_ENABLED:
+        return None
+    if page_label in PHOTO_REGIONS:
+        return PHOTO_REGIONS[page_label]
+    if page_label in NO_PHOTO_LABELS:
+        return []
+    doc_type = doc.get("Document Type", "")
+    if "Aadhar" in doc_type:
+        if [s.lower() for s in doc.get("Sides Detected", [])] == ["back"]:
+            return []
+        return PHOTO_REGIONS["aadhar_front"]
+    if "PAN" in doc_type:
+        return PHOTO_REGIONS["pan"]
+    if "Driving Licence" in doc_type:
+        return PHOTO_REGIONS["dl"]
+    return None
 
-        # Read the image
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"Error: Could not read image {image_path}")
-            return None
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+def crop_passport_photo(img, face):
+    """
+    Crops a face box out of a BGR image with a 35mm x 45mm aspect ratio (7:9),
+    padding with white where the crop runs past the image edges.
+    """
+    x, y, w, h = face
 
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 5)
+    # Calculate target dimensions (35mm x 45mm aspect ratio)
+    # Ratio = 35 / 45 = 0.777...
+    target_ratio = 35.0 / 45.0
+
+    # The detected face box (w, h) is usually just the face detected.
+    # We need to include some hair and neck context.
+    # Strategy:
+    # 1. Base the crop width on the face width plus padding.
+    #    Padding: 20% on each side -> 1.4x factor.
+
+    crop_width = int(w * 1.4)
+    crop_height = int(crop_width / target_ratio)
+
+    # Determine center of the face
+    face_cx = x + w // 2
+    face_cy = y + h // 2
+
+    # Determine crop coordinates (centered on face, maybe slightly shifted up to include hair?)
+    # Face detection is usually centered on the face.
+    # Passport photo: Eyes are above center. So we should shift the crop box UP relative to the face.
+    # But 'face_cy' is detecting the 'face'.
+    # Let's try centering first.
+
+    crop_x1 = face_cx - crop_width // 2
+    crop_y1 = face_cy - crop_height // 2
+
+    # Adjustment: Shift up slightly (10% of height) to ensure chin isn't cut if we expanded height a lot
+    # Actually, let's keep it centered to be safe against varying detection boxes.
+
+    crop_x2 = crop_x1 + crop_width
+    crop_y2 = crop_y1 + crop_height
+
+    # Handle boundary conditions (if crop goes outside image)
+    # Clamping destroys aspect ratio, and strict 35x45 is requested, so we Pad.
+    # Only the crop region is padded, not the whole page.
+    img_h, img_w = img.shape[:2]
+
+    pad_top = max(0, -crop_y1)
+    pad_bottom = max(0, crop_y2 - img_h)
+    pad_left = max(0, -crop_x1)
+    pad_right = max(0, crop_x2 - img_w)
+
+    cropped_face = img[max(0, crop_y1):min(img_h, crop_y2), max(0, crop_x1):min(img_w, crop_x2)]
+    if any([pad_top, pad_bottom, pad_left, pad_right]):
+         cropped_face = cv2.copyMakeBorder(cropped_face, pad_top, pad_bottom, pad_left, pad_right, cv2.BORDER_CONSTANT, value=[255, 255, 255])
+
+    # Resize to standard size
+    return cv2.resize(cropped_face, FACE_OUTPUT_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class FaceDetector:
+    """
+    Reusable Haar-cascade face detector.
+    The cascade is loaded once per process, so a copy preloaded before a fork
+    is inherited by the workers. CascadeClassifier is not safe to use from
+    several threads at once, so detection holds a lock; CPU pool workers are
+    single-threaded processes, where it is never contended. Detection runs on
+    a downscaled grayscale copy.
+    """
 
+    def __init__(
+        self,
+        cascade_path: str = DEFAULT_CASCADE_PATH,
+        max_edge: int = FACE_DETECT_MAX_EDGE,
+        scale_factor: float = FACE_SCALE_FACTOR,
+        min_neighbors: int = FACE_MIN_NEIGHBORS,
+        min_size: int = FACE_MIN_SIZE,
+    ):
+        self.cascade_path = cascade_path
+        self.max_edge = max_edge
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._cascade = None
+        self._lock = threading.Lock()
+        # A lock copied by fork() while another thread held it would never be released
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    @property
+    def cascade(self):
+        if self._cascade is None:
+            with self._lock:
+                if self._cascade is None:
+                    cascade = cv2.CascadeClassifier(self.cascade_path)
+                    if cascade.empty():
+                        raise RuntimeError(f"Face cascade classifier not loaded from {self.cascade_path}")
+                    self._cascade = cascade
+        return self._cascade
+
+    def detect(self, img, rgb: bool = False, max_edge: int = None) -> list:
+        """
+        Detects faces in a BGR (or RGB with rgb=True, or grayscale) array,
+        downscaled to `max_edge` (default: the detector's).
+        Returns (x, y, w, h) boxes in full-resolution coordinates.
+        """
+        max_edge = self.max_edge if max_edge is None else max_edge
+        if img.ndim == 2:
+            gray = img
+        else:
+            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY if rgb else cv2.COLOR_BGR2GRAY)
+
+        img_h, img_w = gray.shape[:2]
+        scale = 1.0
+        if max_edge and max(img_h, img_w) > max_edge:
+            scale = max_edge / float(max(img_h, img_w))
+            gray = cv2.resize(gray, (int(img_w * scale), int(img_h * scale)), interpolation=cv2.INTER_AREA)
+
+        cascade = self.cascade
+        with self._lock:
+            faces = cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=(self.min_size, self.min_size),
+            )
         if len(faces) == 0:
+            return []
+
+        # Map boxes back to the original resolution
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+    def largest_face(self, img, rgb: bool = False):
+        faces = self.detect(img, rgb=rgb)
+        if not faces:
             return None
+        return max(faces, key=lambda rect: rect[2] * rect[3])
 
-        # Find the largest face
-        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-        x, y, w, h = largest_face
-        
-        # Calculate target dimensions (35mm x 45mm aspect ratio)
-        # Ratio = 35 / 45 = 0.777...
-        target_ratio = 35.0 / 45.0
-        
-        # The detected face box (w, h) is usually just the face detected.
-        # We need to include some hair and neck context.
-        # Strategy:
-        # 1. Base the crop width on the face width plus padding.
-        #    Padding: 20% on each side -> 1.4x factor.
-        
-        crop_width = int(w * 1.4)
-        crop_height = int(crop_width / target_ratio)
-        
-        # Determine center of the face
-        face_cx = x + w // 2
-        face_cy = y + h // 2
-        
-        # Determine crop coordinates (centered on face, maybe slightly shifted up to include hair?)
-        # Face detection is usually centered on the face.
-        # Passport photo: Eyes are above center. So we should shift the crop box UP relative to the face.
-        # But 'face_cy' is detecting the 'face'.
-        # Let's try centering first.
-        
-        crop_x1 = face_cx - crop_width // 2
-        crop_y1 = face_cy - crop_height // 2
-        
-        # Adjustment: Shift up slightly (10% of height) to ensure chin isn't cut if we expanded height a lot
-        # Actually, let's keep it centered to be safe against varying detection boxes.
-        
-        crop_x2 = crop_x1 + crop_width
-        crop_y2 = crop_y1 + crop_height
-        
-        # Handle boundary conditions (if crop goes outside image)
-        # We pad with black/white or just clamp?
-        # Clamping destroys aspect ratio.
-        # Better to pad the source image if needed, or just clamp and resize (might distort).
-        # Let's simple clamp for now, but if we clamp, we must respect aspect ratio?
-        # If strict 35x45 requested, we should Pad.
-        
+    def largest_face_in(self, img, regions: list, bounds=None, rgb: bool = False):
+        """
+        Largest face inside any of `regions` (fractions of `bounds`, the card's
+        (x0, y0, x1, y1) box; default the whole image), in image coordinates.
+        Only the regions are searched. None for a portrait-oriented card: the
+        layouts are for upright landscape cards.
+        """
         img_h, img_w = img.shape[:2]
-        
-        # Pad image to handle out-of-bounds without cropping the crop
-        pad_top = max(0, -crop_y1)
-        pad_bottom = max(0, crop_y2 - img_h)
-        pad_left = max(0, -crop_x1)
-        pad_right = max(0, crop_x2 - img_w)
-        
-        if any([pad_top, pad_bottom, pad_left, pad_right]):
-             img = cv2.copyMakeBorder(img, pad_top, pad_bottom, pad_left, pad_right, cv2.BORDER_CONSTANT, value=[255, 255, 255])
-             # Adjust coordinates
-             crop_y1 += pad_top
-             crop_y2 += pad_top
-             crop_x1 += pad_left
-             crop_x2 += pad_left
-
-        cropped_face = img[crop_y1:crop_y2, crop_x1:crop_x2]
-        
-        # Resize to standard size?
-        # 35mm x 45mm @ 300 DPI => ~413 x 531 pixels
-        target_size = (413, 531)
-        resized_face = cv2.resize(cropped_face, target_size, interpolation=cv2.INTER_AREA)
-
-        # Save cropped image
-        face_filename = f"face_{uuid.uuid4()}.jpg"
-        face_path = os.path.join(output_dir, face_filename)
-        
-        os.makedirs(output_dir, exist_ok=True)
-        cv2.imwrite(face_path, resized_face)
-        return face_path
+        bx0, by0, bx1, by1 = bounds or (0, 0, img_w, img_h)
+        bw, bh = bx1 - bx0, by1 - by0
+        if bw < bh:
+            return None
+        # Same detection scale as a full-frame search, over fewer pixels
+        scale = min(1.0, self.max_edge / float(max(img_h, img_w))) if self.max_edge else 1.0
+        best = None
+        for fx0, fy0, fx1, fy1 in regions:
+            x0, y0 = bx0 + int(fx0 * bw), by0 + int(fy0 * bh)
+            x1, y1 = bx0 + int(fx1 * bw), by0 + int(fy1 * bh)
+            roi = img[y0:y1, x0:x1]
+            if roi.size == 0:
+                continue
+            for x, y, w, h in self.detect(roi, rgb=rgb, max_edge=int(max(roi.shape[:2]) * scale)):
+                if best is None or w * h > best[2] * best[3]:
+                    best = (x + x0, y + y0, w, h)
+        return best
+
+    def locate(self, img, rgb: bool = False, regions: list = None, bounds=None,
+               fallback: bool = FACE_LAYOUT_FALLBACK):
+        """
+        Finds the face to crop. With `regions` (see photo_regions) the photo
+        region is searched first and the full frame only if that fails (and
+        `fallback`); an empty list skips the page. Returns (box or None, how):
+        how is "roi", "full", "skipped" or None.
+        """
+        if regions is not None:
+            if not regions:
+                return None, "skipped"
+            face = self.largest_face_in(img, regions, bounds, rgb=rgb)
+            if face is not None:
+                return face, "roi"
+            if not fallback:
+                return None, None
+        face = self.largest_face(img, rgb=rgb)
+        return face, ("full" if face is not None else None)
+
+    def extract(self, img, output_dir: str = "temp_uploads", rgb: bool = False, regions: list = None,
+                bounds=None, fallback: bool = FACE_LAYOUT_FALLBACK):
+        """
+        Detects the largest face in a BGR (or RGB) array and saves a passport-style crop.
+        `regions` / `bounds` / `fallback` restrict the search as in locate().
+        Returns the path to the cropped face image, or None if no face is found.
+        """
+        face, _ = self.locate(img, rgb, regions, bounds, fallback)
+        if face is None:
+            return None
+
+        resized_face = crop_passport_photo(img, face)
+        if rgb:
+            # Only the small crop is converted for cv2.imwrite, never the whole page
+            resized_face = cv2.cvtColor(resized_face, cv2.COLOR_RGB2BGR)
+
+        # Save into the content-addressed store: an identical crop is stored once
+        ok, encoded = cv2.imencode(".jpg", resized_face)
+        if not ok:
+            return None
+        return get_face_store(output_dir).put(encoded.tobytes())
+
+    def extract_batch(self, images: list, output_dir: str = "temp_uploads", first_only: bool = False,
+                      regions: list = None) -> list:
+        """
+        Runs extract() over many pages (Page objects, BGR arrays or paths) in one call, so a worker
+        pool gets one task per batch instead of one per page.
+        `regions`, if given, holds each page's photo regions (see photo_regions); on Pages they
+        are placed relative to the card's content box.
+        With first_only, stops at the first page that yields a face, and every page's photo
+        region is searched before any page falls back to the full frame.
+        Returns a list of face paths (or None) aligned with the input.
+        """
+        results = [None] * len(images)
+        regions = regions if regions is not None else [None] * len(images)
+        deferred = []
+        for i, (img, page_regions) in enumerate(zip(images, regions)):
+            try:
+                if hasattr(img, "array"):
+                    # Page: zero-copy view of the decoded buffer
+                    bounds = find_content_bbox(img) if page_regions else None
+                    results[i] = self.extract(img.array, output_dir, rgb=(img.mode == "RGB"), regions=page_regions,
+                                              bounds=bounds, fallback=not first_only and FACE_LAYOUT_FALLBACK)
+                else:
+                    if isinstance(img, str):
+                        img = cv2.imread(img)
+                    if img is not None:
+                        results[i] = self.extract(img, output_dir, regions=page_regions,
+                                                  fallback=not first_only and FACE_LAYOUT_FALLBACK)
+                if first_only and not results[i] and page_regions:
+                    deferred.append(i)
+            except Exception as e:
+                print(f"Error extracting face: {e}")
+            if first_only and results[i]:
+                return results
+
+        # first_only: no photo region had a face; try those pages full frame
+        for i in deferred if FACE_LAYOUT_FALLBACK else []:
+            try:
+                img = images[i]
+                if hasattr(img, "array"):
+                    results[i] = self.extract(img.array, output_dir, rgb=(img.mode == "RGB"))
+                else:
+                    img = cv2.imread(img) if isinstance(img, str) else img
+                    results[i] = self.extract(img, output_dir) if img is not None else None
+            except Exception as e:
+                print(f"Error extracting face: {e}")
+            if results[i]:
+                break
+        return results
+
+
+_default_detector = None
+
+def get_detector() -> FaceDetector:
+    """Returns the process-wide detector (created on first use in each worker)."""
+    global _default_detector
+    if _default_detector is None:
+        _default_detector = FaceDetector()
+    return _default_detector
+
+
+def extract_face(image, output_dir="temp_uploads"):
+    """
+    Detects and extracts the largest face from an image.
+    Accepts a file path or a BGR numpy array.
+    Enforces a 35mm x 45mm aspect ratio (7:9).
+    Returns the path to the cropped face image, or None if no face is found.
+    """
+    try:
+        if isinstance(image, np.ndarray):
+            img = image
+        else:
+            # Read the image
+            img = cv2.imread(image)
+            if img is None:
+                print(f"Error: Could not read image {image}")
+                return None
+
+        return get_detector().extract(img, output_dir)
 
     except Exception as e:
         print(f"Error extracting face: {e}")
         return None
+
+
+def extract_faces(images, output_dir="temp_uploads", first_only=False, regions=None):
+    """Batch form of extract_face (optionally layout-aware, see extract_batch). Returns face paths (or None) aligned with the input."""
+    return get_detector().extract_batch(images, output_dir, first_only=first_only, regions=regions)
@@ -0,0 +1,157 @@
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from executors import run_io, QueueFullError
+
+# Face crops older than the TTL (since last write or dedupe hit) are evicted,
+# then the oldest crops until the store fits in FACE_STORE_MAX_BYTES
+FACE_STORE_TTL = float(os.environ.get("FACE_STORE_TTL", 7 * 24 * 3600))
+FACE_STORE_MAX_BYTES = int(os.environ.get("FACE_STORE_MAX_BYTES", 512 * 1024 * 1024))
+# Seconds between background sweeps (0 disables the sweeper)
+FACE_STORE_SWEEP_INTERVAL = float(os.environ.get("FACE_STORE_SWEEP_INTERVAL", 600))
+
+
+class FaceStore:
+    """
+    Content-addressed store of face crops under `root`.
+
+    A crop is named by the SHA-256 of its JPEG bytes and sharded two levels
+    deep (root/ab/cd/abcd....jpg), so identical crops are stored once and no
+    directory grows past a few hundred entries. Files are never rewritten
+    under the same name, which makes their URLs safe to cache forever.
+
+    Writes are atomic (temp file + rename), so concurrent pool workers can
+    share a root. Eviction (sweep) is by file mtime: TTL first, then oldest
+    first down to max_bytes. Files outside the shard layout (legacy flat
+    face_<uuid>.jpg crops) are swept the same way.
+    """
+
+    def __init__(self, root: str, ttl: float = FACE_STORE_TTL, max_bytes: int = FACE_STORE_MAX_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Crops are written by pool workers in other processes, so size is
+        # measured by the sweep's disk walk rather than counted on write
+        self.stats = {"files": 0, "bytes": 0,
+                      "evicted_expired": 0, "evicted_size": 0, "last_sweep": None, "sweep_ms": None}
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def put(self, jpeg: bytes) -> str:
+        """Stores a JPEG crop (once per distinct content) and returns its path."""
+        digest = hashlib.sha256(jpeg).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            # Same crop again: refresh its age instead of writing a copy
+            try:
+                os.utime(path)
+                return path
+            except FileNotFoundError:
+                pass  # evicted in between; write it again
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except FileNotFoundError:
+            # The sweeper removed the (empty) shard in between
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(jpeg)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Evicts expired crops, then the oldest ones while over max_bytes. Returns snapshot()."""
+        start = time.perf_counter()
+        now = now if now is not None else time.time()
+        entries = []
+        expired = 0
+        for directory, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Stale temp files from a crashed writer count as expired after a minute
+                ttl = 60 if name.endswith(".tmp") else self.ttl
+                if st.st_mtime + ttl < now:
+                    if self._remove(path):
+                        expired += 1
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > self.max_bytes:
+            entries.sort()
+            while entries and total > self.max_bytes:
+                _, size, path = entries.pop(0)
+                if self._remove(path):
+                    evicted += 1
+                total -= size
+        self._remove_empty_shards()
+
+        with self._lock:
+            self.stats.update(files=len(entries), bytes=total, last_sweep=now,
+                              sweep_ms=round((time.perf_counter() - start) * 1000, 1))
+            self.stats["evicted_expired"] += expired
+            self.stats["evicted_size"] += evicted
+        if expired or evicted:
+            print(f"Face store sweep: {expired} expired, {evicted} evicted for size, {len(entries)} kept ({total} bytes)")
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, root=self.root, ttl=self.ttl, max_bytes=self.max_bytes)
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _remove_empty_shards(self):
+        for directory, subdirs, filenames in os.walk(self.root, topdown=False):
+            if directory != self.root and not subdirs and not filenames:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass  # a writer just created it
+
+    async def run_sweeper(self, interval: float = FACE_STORE_SWEEP_INTERVAL):
+        """Sweeps every `interval` seconds until cancelled (disk walk runs on the I/O pool)."""
+        while True:
+            try:
+                await run_io(self.sweep)
+            except QueueFullError:
+                pass  # busy; try again next round
+            except Exception as e:
+                print(f"Face store sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+
+_stores: Dict[str, FaceStore] = {}
+
+
+def get_face_store(root: str) -> FaceStore:
+    """Returns the process-wide store for a root directory (created on first use in each worker)."""
+    store = _stores.get(root)
+    if store is None:
+        store = _stores.setdefault(root, FaceStore(root))
+    return store
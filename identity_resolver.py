@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Optional cross-request index: links the same person across requests/bulk folders
+IDENTITY_INDEX_ENABLED = os.environ.get("IDENTITY_INDEX_ENABLED", "0") == "1"
+IDENTITY_INDEX_PATH = os.environ.get("IDENTITY_INDEX_PATH", "cache/identity_index.sqlite3")
+
+# Names shorter than this ("Ram", "Raj") are too common to merge on
+MIN_NAME_LENGTH = 4
+
+# Keys merged separately instead of copied field by field
+_SPECIAL_KEYS = ("Document Type", "Sides Detected", "Source Files", "Photo Path", "Field Sources")
+
+_NON_DIGITS = re.compile(r"\D+")
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def normalize_aadhar(value) -> str:
+    """Digits only: "1234 5678 9012" and "1234-5678-9012" are the same number."""
+    return _NON_DIGITS.sub("", str(value)) if value else ""
+
+
+def normalize_id(value) -> str:
+    """Uppercase alphanumerics only, for PAN and DL numbers."""
+    return _NON_ALNUM.sub("", str(value).upper()) if value else ""
+
+
+def normalize_name(value) -> str:
+    """Lowercase with collapsed whitespace."""
+    return " ".join(str(value).lower().split()) if value else ""
+
+
+def identity_keys(doc: Dict[str, Any]) -> Dict[str, str]:
+    """The normalized keys a record can be matched on (empty ones omitted)."""
+    keys = {
+        "aadhar": normalize_aadhar(doc.get("Aadhar Number")),
+        "pan": normalize_id(doc.get("PAN Number")),
+        "name": normalize_name(doc.get("Name")),
+    }
+    if len(keys["name"]) < MIN_NAME_LENGTH:
+        keys["name"] = ""
+    return {kind: value for kind, value in keys.items() if value}
+
+
+class IdentityResolver:
+    """
+    Merges extracted records into identities using hash indexes on the
+    normalized Aadhar number, PAN and name, so each record is matched in O(1).
+
+    Matching is the same as the original pairwise loop: a record joins the
+    earliest identity that shares any of its keys; an identity is matched on
+    its current field values (fields are only filled in, never overwritten).
+    """
+
+    def __init__(self):
+        self.identities: List[Dict[str, Any]] = []
+        self._types: List[set] = []
+        self._sources: List[set] = []
+        self._sides: List[set] = []
+        self._index: Dict[str, Dict[str, int]] = {"aadhar": {}, "pan": {}, "name": {}}
+
+    def _register(self, i: int):
+        # Keep the smallest identity index per key: "earliest identity wins"
+        for kind, value in identity_keys(self.identities[i]).items():
+            current = self._index[kind].get(value)
+            if current is None or i < current:
+                self._index[kind][value] = i
+
+    def match(self, doc: Dict[str, Any]) -> Optional[int]:
+        """Index of the identity the record belongs to, or None."""
+        candidates = [self._index[kind].get(value) for kind, value in identity_keys(doc).items()]
+        candidates = [i for i in candidates if i is not None]
+        return min(candidates) if candidates else None
+
+    def add(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Merges one record and returns the identity it ended up in (a live dict)."""
+        i = self.match(doc)
+        if i is None:
+            identity = doc.copy()
+            if "Field Sources" in doc:
+                identity["Field Sources"] = dict(doc["Field Sources"])
+            i = len(self.identities)
+            self.identities.append(identity)
+            self._types.append(set())
+            self._sources.append(set())
+            self._sides.append(set())
+        else:
+            identity = self.identities[i]
+            # Fill fields the identity doesn't have yet; never overwrite
+            for k, v in doc.items():
+                if k in _SPECIAL_KEYS:
+                    continue
+                if v and not identity.get(k):
+                    identity[k] = v
+                    # Keep the tier that produced the value we kept
+                    if k in doc.get("Field Sources", {}):
+                        identity.setdefault("Field Sources", {})[k] = doc["Field Sources"][k]
+
+        self._types[i].update(t for t in identity.get("Document Type", "").split(" + ") if t)
+        self._types[i].add(doc.get("Document Type") or "Unknown")
+        self._sources[i].update(identity.get("Source Files") or [], doc.get("Source Files") or [])
+        self._sides[i].update(identity.get("Sides Detected") or [], doc.get("Sides Detected") or [])
+        identity["Document Type"] = " + ".join(sorted(self._types[i]))
+        identity["Source Files"] = sorted(self._sources[i])
+        if self._sides[i] or "Sides Detected" in identity:
+            identity["Sides Detected"] = sorted(self._sides[i])
+        self._register(i)
+        return identity
+
+    def add_all(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for doc in documents:
+            self.add(doc)
+        return self.identities
+
+
+class IdentityIndex:
+    """
+    Persistent SQLite index from normalized Aadhar/PAN/DL numbers to a stable
+    identity id, so the same person is linked across requests and bulk
+    folders without rescanning earlier results. Names are not indexed here:
+    across unrelated submissions they are too ambiguous to link on.
+    """
+
+    def __init__(self, path: str = IDENTITY_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS identity_keys ("
+            " kind TEXT NOT NULL, value TEXT NOT NULL, identity_id TEXT NOT NULL, updated REAL NOT NULL,"
+            " PRIMARY KEY (kind, value))"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(identity: Dict[str, Any]) -> List[tuple]:
+        keys = [
+            ("aadhar", normalize_aadhar(identity.get("Aadhar Number"))),
+            ("pan", normalize_id(identity.get("PAN Number"))),
+            ("dl", normalize_id(identity.get("DL Number"))),
+        ]
+        return [(kind, value) for kind, value in keys if value]
+
+    def link(self, identities: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Sets "Identity ID" on each identity that has an ID number, reusing the
+        id already stored for any of its numbers. Returns the ids in order.
+        """
+        ids = []
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for identity in identities:
+                    keys = self._keys(identity)
+                    if not keys:
+                        ids.append(None)
+                        continue
+                    identity_id = None
+                    for kind, value in keys:
+                        row = self._db.execute(
+                            "SELECT identity_id FROM identity_keys WHERE kind = ? AND value = ?", (kind, value)
+                        ).fetchone()
+                        if row is not None:
+                            identity_id = row[0]
+                            break
+                    identity_id = identity_id or str(uuid.uuid4())
+                    self._db.executemany(
+                        "INSERT INTO identity_keys (kind, value, identity_id, updated) VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT(kind, value) DO UPDATE SET updated = excluded.updated",
+                        [(kind, value, identity_id, now) for kind, value in keys],
+                    )
+                    identity["Identity ID"] = identity_id
+                    ids.append(identity_id)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+
+identity_index = IdentityIndex() if IDENTITY_INDEX_ENABLED else None
@@ -0,0 +1,180 @@
+import os
+import uuid
+import hashlib
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from executors import run_io
+from metrics import TEMP_BYTES_WRITTEN
+
+# Upload limits (bytes)
+UPLOAD_MAX_FILE_BYTES = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", 60 * 1024 * 1024))
+# Files up to this size stay in memory; larger ones spill to a temp file
+UPLOAD_SPOOL_BYTES = int(os.environ.get("UPLOAD_SPOOL_BYTES", 8 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+# Whole request body, checked before multipart parsing: the file budget plus
+# room for part headers and boundaries
+UPLOAD_MAX_BODY_BYTES = int(os.environ.get("UPLOAD_MAX_BODY_BYTES", UPLOAD_MAX_REQUEST_BYTES + 1024 * 1024))
+
+# Magic bytes -> kind. The filename extension is not trusted.
+_SIGNATURES = (
+    (b"%PDF-", "pdf"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+)
+
+
+class UploadRejected(Exception):
+    """Raised for uploads that must fail the whole request (e.g. too large)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Rejects request bodies over max_body_bytes with 413 before the multipart
+    parser spools them: at once when Content-Length is too large, otherwise
+    (chunked uploads) as soon as the received bytes pass the limit.
+    """
+
+    def __init__(self, app, max_body_bytes: int = UPLOAD_MAX_BODY_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        detail = f"Request body is too large (limit {self.max_body_bytes} bytes)."
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_body_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail}, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside body parsing; FastAPI passes HTTPException through as-is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Identifies pdf/jpeg/png from the first bytes of a file, or None."""
+    # Some PDF writers put junk before the header; the spec allows it in the first 1KB
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    for signature, kind in _SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+@dataclass
+class IngestedFile:
+    filename: str
+    kind: str
+    sha256: str
+    size: int
+    data: Optional[bytes] = None   # set when the file stayed in memory
+    path: Optional[str] = None     # set when it spilled to disk
+    temp_paths: list = field(default_factory=list)
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """Bytes or a path; both are accepted by pdf_processor and PIL loaders."""
+        return self.data if self.data is not None else self.path
+
+    def cleanup(self):
+        for p in self.temp_paths:
+            if os.path.exists(p):
+                try: os.remove(p)
+                except OSError: pass
+        self.temp_paths.clear()
+
+
+def ingest_bytes(filename: str, data: bytes, max_file_bytes: int = UPLOAD_MAX_FILE_BYTES) -> Optional[IngestedFile]:
+    """Same checks as ingest_upload for content already in memory (e.g. files read by bulk.py)."""
+    if len(data) > max_file_bytes:
+        raise UploadRejected(413, f"File '{filename}' is too large ({len(data)} bytes; limit {max_file_bytes}).")
+    kind = sniff_kind(data[:UPLOAD_CHUNK_BYTES])
+    if kind is None:
+        return None
+    return IngestedFile(filename, kind, hashlib.sha256(data).hexdigest(), len(data), data=data)
+
+
+def _open_spill(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+
+async def ingest_upload(upload, temp_dir: str, request_budget: int,
+                        max_file_bytes: int = UPLOAD_MAX_FILE_BYTES) -> Optional[IngestedFile]:
+    """
+    Streams an UploadFile in chunks, hashing as it reads. Small files stay in
+    memory; large ones spill to temp_dir past UPLOAD_SPOOL_BYTES.
+    Returns None for unsupported content (sniffed from magic bytes, without
+    reading the rest). Raises UploadRejected (413) when the file exceeds
+    max_file_bytes or the remaining request_budget. The whole body is capped
+    earlier, by RequestSizeLimitMiddleware; spill writes run on the I/O pool.
+    """
+    limit = min(max_file_bytes, request_budget)
+    # Starlette knows the size already when the multipart parser recorded it
+    declared = getattr(upload, "size", None)
+    if declared is not None and declared > limit:
+        raise UploadRejected(413, f"File '{upload.filename}' is too large ({declared} bytes; limit {limit}).")
+
+    first = await upload.read(UPLOAD_CHUNK_BYTES)
+    kind = sniff_kind(first)
+    if kind is None:
+        print(f"Skipping {upload.filename}: not a PDF, JPEG or PNG (content sniffed)")
+        return None
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill = None
+    spill_path = None
+    size = 0
+    chunk = first
+    try:
+        while chunk:
+            size += len(chunk)
+            if size > limit:
+                raise UploadRejected(413, f"File '{upload.filename}' is too large (limit {limit} bytes).")
+            digest.update(chunk)
+            if spill is None and len(buffer) + len(chunk) > UPLOAD_SPOOL_BYTES:
+                # Past the threshold: move what we have to disk and keep streaming there
+                spill_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.{kind}")
+                spill = await run_io(_open_spill, spill_path)
+                await run_io(spill.write, bytes(buffer))
+                buffer = bytearray()
+            if spill is not None:
+                await run_io(spill.write, chunk)
+            else:
+                buffer.extend(chunk)
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(spill_path)
+        raise
+
+    if spill is not None:
+        await run_io(spill.close)
+        TEMP_BYTES_WRITTEN.inc(size, kind="upload_spill")
+        return IngestedFile(upload.filename, kind, digest.hexdigest(), size, path=spill_path, temp_paths=[spill_path])
+    return IngestedFile(upload.filename, kind, digest.hexdigest(), size, data=bytes(buffer))
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Concurrent pipeline runs, and how many accepted jobs may wait for a worker
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", 32))
+# "memory" (default) or "sqlite"; the SQLite store keeps finished jobs across restarts
+JOB_STORE = os.environ.get("JOB_STORE", "memory")
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "cache/jobs.sqlite3")
+# Finished jobs are purged this many seconds after their last update
+JOB_TTL = float(os.environ.get("JOB_TTL", 3600))
+# Suggested client back-off when the queue is full
+JOB_RETRY_AFTER = int(os.environ.get("JOB_RETRY_AFTER", 5))
+# How often an event stream re-reads the store for a job run by another worker
+JOB_EVENTS_POLL_INTERVAL = float(os.environ.get("JOB_EVENTS_POLL_INTERVAL", 1.0))
+
+# Job statuses; the last two are terminal
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+TERMINAL = (SUCCEEDED, FAILED)
+
+# A job runner gets a progress callback: progress(stage, **details)
+Progress = Callable[..., None]
+Runner = Callable[[Progress], Awaitable[Any]]
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_QUEUE_DEPTH jobs are already waiting for a worker."""
+
+
+# Outside server.py each process is a run of its own
+_PROCESS_RUN_ID = uuid.uuid4().hex
+
+
+def worker_id() -> str:
+    """
+    "<run>:<slot>": the server.py run (one per master start) and the worker
+    slot this process fills. A respawned worker keeps its predecessor's id.
+    """
+    run = os.environ.get("SERVER_RUN_ID") or _PROCESS_RUN_ID
+    return f"{run}:{os.environ.get('SERVER_WORKER_INDEX', '0')}"
+
+
+def new_record(job_id: str, owner: Optional[str] = None) -> Dict[str, Any]:
+    now = time.time()
+    return {"job_id": job_id, "status": QUEUED, "stage": None, "events": [],
+            "result": None, "error": None, "created": now, "updated": now, "owner": owner}
+
+
+class MemoryJobStore:
+    """In-process job store. State is lost when the worker exits."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, record: Dict[str, Any]):
+        with self._lock:
+            self._jobs[record["job_id"]] = record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record, events=list(record["events"])) if record else None
+
+    def update(self, job_id: str, event: Optional[Dict[str, Any]] = None, **fields):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return
+            record.update(fields, updated=time.time())
+            if event is not None:
+                record["events"].append(event)
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            expired = [k for k, r in self._jobs.items() if r["status"] in TERMINAL and r["updated"] < older_than]
+            for k in expired:
+                del self._jobs[k]
+            return len(expired)
+
+    def interrupt_unfinished(self, owner: Optional[str] = None) -> int:
+        return 0
+
+
+class SQLiteJobStore:
+    """
+    Job store in a local SQLite file (WAL), shared by all server.py workers.
+    Finished results outlive a worker restart. Each job records the worker
+    that runs it; jobs that were queued or running when that worker died are
+    marked failed when it starts again, since their uploads only lived in its
+    memory.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, events TEXT NOT NULL,"
+            " result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL, owner TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            # Stores created before jobs recorded their worker
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated)")
+        self._lock = threading.Lock()
+
+    _COLUMNS = ("job_id", "status", "stage", "events", "result", "error", "created", "updated", "owner")
+    _JSON_COLUMNS = ("events", "result", "error")
+
+    def create(self, record: Dict[str, Any]):
+        values = [json.dumps(record[c]) if c in self._JSON_COLUMNS else record[c] for c in self._COLUMNS]
+        with self._lock:
+            self._db.execute(f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})", values)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(self._COLUMNS, row))
+        for c in self._JSON_COLUMNS:
+            record[c] = json.loads(record[c]) if record[c] is not None else None
+        return record
+
+    def update(self, job_id: str, event: Optional[Dict[str, Any]] = None, **fields):
+        with self._lock:
+            if event is not None:
+                row = self._db.execute("SELECT events FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is None:
+                    return
+                fields["events"] = json.loads(row[0]) + [event]
+            fields["updated"] = time.time()
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            values = [json.dumps(v) if k in self._JSON_COLUMNS else v for k, v in fields.items()]
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", values + [job_id])
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (SUCCEEDED, FAILED, older_than)
+            )
+            return cur.rowcount
+
+    def interrupt_unfinished(self, owner: Optional[str] = None) -> int:
+        """
+        Fails queued/running jobs whose process is gone, as seen by the worker
+        `owner` (see worker_id): its own earlier jobs, and those of earlier
+        server runs or from before owners were recorded. Jobs of sibling
+        workers in the same run are left alone. owner=None fails them all.
+        """
+        error = json.dumps({"status_code": 503, "detail": "Job was interrupted by a server restart. Please resubmit."})
+        query = "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status IN (?, ?)"
+        params = [FAILED, error, time.time(), QUEUED, RUNNING]
+        if owner is not None:
+            run = owner.split(":")[0] + ":"
+            query += " AND (owner IS NULL OR owner = ? OR substr(owner, 1, ?) != ?)"
+            params += [owner, len(run), run]
+        with self._lock:
+            return self._db.execute(query, params).rowcount
+
+
+def create_job_store(kind: str = JOB_STORE):
+    if kind == "sqlite":
+        return SQLiteJobStore()
+    return MemoryJobStore()
+
+
+class JobManager:
+    """
+    Runs submitted jobs on a fixed number of asyncio workers with a bounded
+    backlog. Progress events go to the store (for polling) and to live
+    subscribers (for SSE).
+    """
+
+    def __init__(self, store, workers: int = JOB_WORKERS, queue_depth: int = JOB_QUEUE_DEPTH, ttl: float = JOB_TTL):
+        self.store = store
+        self.owner: Optional[str] = None
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.ttl = ttl
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self.stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def start(self):
+        """Starts the worker tasks on the running loop. Idempotent."""
+        if self._tasks:
+            return
+        # Read here, not at import: server.py sets the worker's id before the app starts
+        self.owner = worker_id()
+        # Not sibling workers' jobs: they share the store and are still running theirs
+        interrupted = self.store.interrupt_unfinished(self.owner)
+        if interrupted:
+            print(f"Jobs: marked {interrupted} unfinished job(s) from a previous run as failed")
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, runner: Runner, job_id: Optional[str] = None) -> str:
+        """Queues runner(progress) and returns its job id. Raises JobQueueFull at capacity."""
+        self.start()
+        if self.pending >= self.queue_depth:
+            self.stats["rejected"] += 1
+            raise JobQueueFull(f"{self.pending} jobs already queued")
+        job_id = job_id or str(uuid.uuid4())
+        self.store.purge(time.time() - self.ttl)
+        self.store.create(new_record(job_id, self.owner))
+        self._queue.put_nowait((job_id, runner))
+        self.stats["submitted"] += 1
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def _publish(self, job_id: str, stage: str, **details):
+        event = {"stage": stage, "time": time.time(), **details}
+        fields = {"stage": stage} if stage not in TERMINAL else {}
+        self.store.update(job_id, event=event, **fields)
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    async def _worker(self, index: int):
+        while True:
+            job_id, runner = await self._queue.get()
+            try:
+                self.store.update(job_id, status=RUNNING)
+                self._publish(job_id, RUNNING)
+                result = await runner(lambda stage, **details: self._publish(job_id, stage, **details))
+                self.store.update(job_id, status=SUCCEEDED, result=result)
+                self.stats["succeeded"] += 1
+                self._publish(job_id, SUCCEEDED)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # HTTPException-style errors keep their status code for the client
+                error = {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", str(e))}
+                self.store.update(job_id, status=FAILED, error=error)
+                self.stats["failed"] += 1
+                self._publish(job_id, FAILED, **error)
+            finally:
+                self._queue.task_done()
+
+    async def events(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the job's events: everything recorded so far, then live events
+        until the job reaches a terminal status. A job run by another worker
+        (shared store) publishes nothing here, so the store is re-read every
+        JOB_EVENTS_POLL_INTERVAL seconds while no live event arrives.
+        """
+        # Subscribing and reading the store happen without an await in between,
+        # and events are only published from the loop, so nothing is missed or repeated
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            record = self.store.get(job_id)
+            if record is None:
+                return
+            seen = 0
+            while True:
+                for event in record["events"][seen:]:
+                    yield event
+                seen = max(seen, len(record["events"]))
+                if record["status"] in TERMINAL:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), JOB_EVENTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    record = self.store.get(job_id)
+                    if record is None:
+                        return
+                    continue
+                # Published here: already in the store, so counted as seen
+                seen += 1
+                yield event
+                if event["stage"] in TERMINAL:
+                    return
+        finally:
+            self._subscribers[job_id].remove(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+
+job_manager = JobManager(create_job_store())
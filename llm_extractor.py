@@ -2,33 +2,65 @@ import os
 import json
 import base64
 import io
-from typing import Dict, Any, List, Optional
-from openai import OpenAI
+import random
+import asyncio
+import copy
+from typing import Dict, Any, AsyncIterator, List, Optional
+import httpx
+from openai import AsyncOpenAI, APIStatusError, APITimeoutError, APIConnectionError
 from PIL import Image
 
-# Initialize client responsibly
-groq_key = os.environ.get("GROQ_API_KEY")
+from executors import run_io
+from extraction_cache import ExtractionCache, page_cache_key
+from payload_optimizer import optimize_page_payload, settings_signature
+from batch_scheduler import plan_batches, run_batches
+from llm_scheduler import AdaptiveLimiter, DeadlineExceeded, current_deadline, LLM_ADAPTIVE_CONCURRENCY
+from metrics import span, LLM_CALLS, LLM_RETRIES, LLM_PAYLOAD_BYTES
 
-if groq_key:
-    client = OpenAI(
-        base_url="https://api.groq.com/openai/v1",
-        api_key=groq_key
-    )
-else:
-    print("Warning: GROQ_API_KEY is missing from environment variables.")
-    client = None
+# Endpoint and model are configurable so the service can be pointed at a
+# local OpenAI-compatible stand-in (see benchmarks/mock_llm_server.py).
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/llama-4-maverick-17b-128e-instruct")
 
-def encode_image(image: Image.Image) -> str:
-    """Encodes a PIL Image to a base64 string."""
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+# Concurrency: global cap on in-flight LLM calls, plus a cap per route (model).
+# With LLM_ADAPTIVE_CONCURRENCY the route cap is the ceiling of an AIMD limit
+# (see llm_scheduler) instead of a fixed semaphore.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+LLM_ROUTE_CONCURRENCY = int(os.environ.get("LLM_ROUTE_CONCURRENCY", 8))
 
-def extract_all_documents(client: OpenAI, images_with_filenames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Analyzes all images together and extracts unique documents, merging Front/Back based on ID.
-    """
-    prompt = """
+# Connection pool (keep-alive connections are reused across requests)
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 32))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", 16))
+
+# Timeouts: per attempt, and an overall deadline covering all retries
+LLM_ATTEMPT_TIMEOUT = float(os.environ.get("LLM_ATTEMPT_TIMEOUT", 60))
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 120))
+
+# Retry with jittered exponential backoff on 429 / 5xx / timeouts
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8))
+
+# Short type-specific prompts for pages the local classifier has labelled
+LLM_TYPE_PROMPTS = os.environ.get("LLM_TYPE_PROMPTS", "1") == "1"
+
+# Stream completions and hand on each record of the "documents" array as soon
+# as its object closes, instead of waiting for the whole reply. Some providers
+# reject JSON mode on streamed calls: LLM_STREAM_JSON_MODE=0 streams without it
+# (the parser tolerates text around the JSON object).
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "1") == "1"
+LLM_STREAM_JSON_MODE = os.environ.get("LLM_STREAM_JSON_MODE", "1") == "1"
+
+
+class LLMExtractionError(Exception):
+    """Raised when the LLM could not produce a usable extraction (as opposed to finding no documents)."""
+
+
+class LLMDeadlineExceeded(LLMExtractionError):
+    """Raised when a call can't finish before its own or its request's deadline (nothing is sent once it's hopeless)."""
+
+
+EXTRACTION_PROMPT = """
     Analyze the provided images of Aadhar, PAN cards, and Driving Licences. Your goal is to extract structured data for each unique document.
 
     **CRITICAL INSTRUCTIONS**:
@@ -84,40 +116,681 @@ def extract_all_documents(client: OpenAI, images_with_filenames: List[Dict[str,
         ]
     }
     """
+
+
+AADHAR_PROMPT = """
+    The images are Aadhar cards (front and/or back). Return one record per person:
+    combine Front and Back of the same card.
+    Fields: Document Type ("Aadhar"), Name, Date of Birth (YYYY-MM-DD), Gender,
+    Aadhar Number (12 digits), Address (from the back),
+    Sides Detected (list: ["Front"], ["Back"] or ["Front", "Back"]), Source Files (list of filenames).
+    Ignore anything that is not an Aadhar card. Do NOT return empty records.
+    Return a JSON object {"documents": [...]}.
+    """
+
+PAN_PROMPT = """
+    The images are PAN cards. Return one record per card.
+    Fields: Document Type ("PAN"), Name, Father Name, Date of Birth (YYYY-MM-DD),
+    PAN Number (10 alphanumeric), Source Files (list of filenames).
+    Ignore anything that is not a PAN card. Do NOT return empty records.
+    Return a JSON object {"documents": [...]}.
+    """
+
+DL_PROMPT = """
+    The images are Driving Licences. Return one record per licence.
+    Fields: Document Type ("Driving Licence"), Name, DL Number,
+    Address (look for "S/W/D", "Add", "Address"), Source Files (list of filenames).
+    Ignore anything that is not a Driving Licence. Do NOT return empty records.
+    Return a JSON object {"documents": [...]}.
+    """
+
+# Classifier label (see document_classifier) -> prompt. Both Aadhar sides share a
+# prompt so front/back pairs can still be batched and combined in one call.
+TYPE_PROMPTS = {
+    "aadhar_front": AADHAR_PROMPT,
+    "aadhar_back": AADHAR_PROMPT,
+    "pan": PAN_PROMPT,
+    "dl": DL_PROMPT,
+}
+
+
+def prompt_for(item: Dict[str, Any]) -> str:
+    """The prompt for a page: type-specific if it was classified, else the generic one."""
+    if LLM_TYPE_PROMPTS:
+        return TYPE_PROMPTS.get(item.get("doc_type"), EXTRACTION_PROMPT)
+    return EXTRACTION_PROMPT
+
+
+class AsyncLLMBackend:
+    """
+    Async chat-completion client with a pooled HTTP connection, global and
+    per-route concurrency limits, per-call deadlines and retry/backoff.
+    Calls made under llm_scheduler.request_deadline also respect the
+    request's deadline, and queue for an adaptive route limit by it.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = LLM_BASE_URL,
+        model: str = LLM_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        route_concurrency: int = LLM_ROUTE_CONCURRENCY,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+        deadline: float = LLM_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        adaptive: bool = LLM_ADAPTIVE_CONCURRENCY,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.route_concurrency = route_concurrency
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.adaptive = adaptive
+
+        self._client: Optional[AsyncOpenAI] = None
+        self._global_semaphore = asyncio.Semaphore(max_concurrency)
+        self._route_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._route_limiters: Dict[str, AdaptiveLimiter] = {}
+        # Optional cross-process cap (e.g. a multiprocessing.BoundedSemaphore
+        # shared by bulk.py workers); polled so a cancelled wait never leaks a slot
+        self.process_limiter = None
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "shed": 0}
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Built on first use so it binds to the running event loop
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                ),
+                timeout=httpx.Timeout(self.attempt_timeout, connect=10.0),
+            )
+            # Retries are handled here, not by the SDK, so they respect our deadline
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return self._client
+
+    def _route_semaphore(self, route: str) -> asyncio.Semaphore:
+        if route not in self._route_semaphores:
+            self._route_semaphores[route] = asyncio.Semaphore(self.route_concurrency)
+        return self._route_semaphores[route]
+
+    def route_limiter(self, route: Optional[str] = None) -> AdaptiveLimiter:
+        route = route or self.model
+        if route not in self._route_limiters:
+            self._route_limiters[route] = AdaptiveLimiter(self.route_concurrency)
+        return self._route_limiters[route]
+
+    def limiter_snapshot(self) -> Dict[str, float]:
+        """Adaptive limits, in-flight and queued calls summed over routes."""
+        totals = {"limit": 0.0, "in_flight": 0, "waiting": 0}
+        for limiter in self._route_limiters.values():
+            snapshot = limiter.snapshot()
+            for key in totals:
+                totals[key] += snapshot[key]
+        return totals
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Honour Retry-After on rate limits when the provider sends it
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        # Full jitter: uniform(0, base * 2^attempt), capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError))
+
+    async def _acquire_process_slot(self):
+        while not self.process_limiter.acquire(False):
+            await asyncio.sleep(0.02)
+
+    async def _stream(self, messages, on_delta, **kwargs) -> str:
+        stream = await self.client.chat.completions.create(messages=messages, model=self.model, stream=True, **kwargs)
+        parts = []
+        async with stream:
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    on_delta(text)
+        return "".join(parts)
+
+    async def _send(self, messages, deadline_at: float, on_delta=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self.process_limiter is not None:
+            await self._acquire_process_slot()
+        try:
+            self.stats["calls"] += 1
+            if on_delta is not None:
+                call = self._stream(messages, on_delta, **kwargs)
+            else:
+                call = self.client.chat.completions.create(messages=messages, model=self.model, **kwargs)
+            # A streamed call must finish (not just start) within the attempt timeout
+            return await asyncio.wait_for(call, timeout=min(self.attempt_timeout, deadline_at - loop.time()))
+        finally:
+            if self.process_limiter is not None:
+                self.process_limiter.release()
+
+    async def _attempt(self, messages, route: str, deadline_at: float, priority: str, **kwargs):
+        if not self.adaptive:
+            async with self._global_semaphore, self._route_semaphore(route):
+                return await self._send(messages, deadline_at, **kwargs)
+
+        # Adaptive: queue for the route's limit by deadline first, so a slot is
+        # never held while waiting behind the global cap
+        loop = asyncio.get_running_loop()
+        limiter = self.route_limiter(route)
+        cost = max(1, count_images(messages))
+        await limiter.acquire(deadline_at, cost, priority)
+        outcome = "ignore"
+        start = loop.time()
+        try:
+            async with self._global_semaphore:
+                start = loop.time()
+                completion = await self._send(messages, deadline_at, **kwargs)
+            outcome = "ok"
+            return completion
+        except Exception as e:
+            # Rate limits, server errors and timeouts mean the provider is overloaded
+            outcome = "overload" if self._is_retryable(e) else "ignore"
+            raise
+        finally:
+            limiter.release(loop.time() - start, outcome, cost)
+
+    async def create_completion(self, messages: List[Dict[str, Any]], route: Optional[str] = None, on_delta=None, **kwargs):
+        """
+        Runs one chat completion under the concurrency limits, retrying
+        transient failures until the call's deadline (or the request's, if
+        sooner) runs out.
+        With `on_delta` the completion is streamed: each piece of content is
+        passed to on_delta(text) as it arrives, and the whole text is returned
+        instead of the completion object. Once any content has been handed on
+        a failure is not retried, since the retry would repeat it.
+        """
+        route = route or self.model
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        priority = "interactive"
+        request = current_deadline()
+        if request is not None:
+            deadline_at = min(deadline_at, request[0])
+            priority = request[1]
+        attempt = 0
+        streamed = False
+
+        def relay(text: str):
+            nonlocal streamed
+            streamed = True
+            on_delta(text)
+
+        if on_delta is not None:
+            kwargs["on_delta"] = relay
+
+        while True:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                self.stats["failures"] += 1
+                LLM_CALLS.inc(outcome="deadline")
+                raise LLMDeadlineExceeded(f"LLM call ran out of time ({priority} deadline)")
+            try:
+                # The deadline also bounds time spent queued on the semaphores
+                completion = await asyncio.wait_for(
+                    self._attempt(messages, route, deadline_at, priority, **kwargs),
+                    timeout=remaining,
+                )
+                LLM_CALLS.inc(outcome="ok")
+                return completion
+            except DeadlineExceeded as e:
+                # Shed by the scheduler before anything was sent
+                self.stats["shed"] += 1
+                LLM_CALLS.inc(outcome="shed")
+                raise LLMDeadlineExceeded(str(e)) from e
+            except Exception as e:
+                if streamed:
+                    self.stats["failures"] += 1
+                    LLM_CALLS.inc(outcome="error")
+                    raise LLMExtractionError(f"LLM stream broke off: {e!r}") from e
+                if not self._is_retryable(e) or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    LLM_CALLS.inc(outcome="error")
+                    raise LLMExtractionError(f"LLM call failed: {e!r}") from e
+                delay = self._backoff(attempt, e)
+                if loop.time() + delay >= deadline_at:
+                    self.stats["failures"] += 1
+                    LLM_CALLS.inc(outcome="deadline")
+                    raise LLMDeadlineExceeded(f"LLM call failed before deadline: {e!r}") from e
+                attempt += 1
+                self.stats["retries"] += 1
+                LLM_RETRIES.inc()
+                print(f"LLM call failed ({e!r}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# Initialize backend responsibly
+groq_key = os.environ.get("GROQ_API_KEY")
+
+if groq_key:
+    backend = AsyncLLMBackend(api_key=groq_key)
+else:
+    print("Warning: GROQ_API_KEY is missing from environment variables.")
+    backend = None
+
+def count_images(messages: List[Dict[str, Any]]) -> int:
+    """Image parts in a chat request (the scheduler's cost of a call)."""
+    return sum(1 for message in messages if isinstance(message.get("content"), list)
+               for part in message["content"] if part.get("type") == "image_url")
+
+
+def encode_image(image: Image.Image) -> str:
+    """Encodes a PIL Image to a base64 string."""
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+
+def build_content_parts(images_with_filenames: List[Dict[str, Any]], prompt: str = EXTRACTION_PROMPT) -> List[Dict[str, Any]]:
+    """Builds the multi-part user message: prompt, then each image followed by its filename."""
+    content_parts = [{"type": "text", "text": prompt}]
+    payload_bytes = 0
+    
+    for item in images_with_filenames: 
+        # Trimmed, downscaled and budgeted JPEG; memoized on the page
+        page = item["page"]
+        payload = optimize_page_payload(page)
+        base64_image = base64.b64encode(payload.jpeg).decode('utf-8')
+        payload_bytes += len(payload.jpeg)
+        filename = item["filename"]
+        print(
+            f"LLM payload {filename}: {page.width}x{page.height} ({len(page.jpeg) if page.is_passthrough else page.nbytes} bytes"
+            f"{' jpeg' if page.is_passthrough else ' raw'}) -> "
+            f"{payload.size[0]}x{payload.size[1]} {len(payload.jpeg)} bytes "
+            f"(quality={payload.quality or 'original'}, cropped={bool(payload.bbox)}, {payload.elapsed * 1000:.0f} ms)"
+        )
+        content_parts.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}",
+            },
+        })
+        content_parts.append({
+            "type": "text", 
+            "text": f"Above image is from file: {filename}"
+        })
+    LLM_PAYLOAD_BYTES.observe(payload_bytes)
+    return content_parts
+
+def attribute_documents(documents: List[Dict[str, Any]], images_with_filenames: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Maps each extracted record back to the page(s) it came from, using the
+    filenames in "Source Files". Records that name no known file are attributed
+    to every page in the call, so nothing is lost when they are replayed.
+    Returns one list of records per page, in input order.
+    """
+    per_page = [[] for _ in images_with_filenames]
+    for doc in documents:
+        sources = set(doc.get("Source Files") or [])
+        matched = [i for i, item in enumerate(images_with_filenames) if item["filename"] in sources]
+        for i in matched or range(len(images_with_filenames)):
+            per_page[i].append(doc)
+    return per_page
+
+def to_page_refs(per_page: List[List[Dict[str, Any]]], images_with_filenames: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Cacheable copies of attribute_documents' output: "Source Files" becomes
+    "Source Pages", the digests of the cited files' pages in the call (every
+    page of the call for records citing none of them, as attribute_documents
+    does). Filenames belong to one upload; digests still match when the same
+    scans come back under other names (see from_page_refs).
+    """
+    digests: Dict[str, List[str]] = {}
+    for item in images_with_filenames:
+        digests.setdefault(item["filename"], []).append(item["page"].digest)
+    call_pages = list(dict.fromkeys(item["page"].digest for item in images_with_filenames))
+    out = []
+    for docs in per_page:
+        refs = []
+        for doc in docs:
+            cited = [d for name in doc.get("Source Files") or [] for d in digests.get(name, ())]
+            entry = {k: copy.deepcopy(v) for k, v in doc.items() if k != "Source Files"}
+            entry["Source Pages"] = list(dict.fromkeys(cited)) or call_pages
+            refs.append(entry)
+        out.append(refs)
+    return out
+
+def covers_page_refs(documents: List[Dict[str, Any]], images_with_filenames: List[Dict[str, Any]]) -> bool:
+    """
+    True if every page the cached records were read from is in the current
+    upload. A record combined from pages the client did not send again (the
+    back of a card re-uploaded alone) must not be served: the hit would skip
+    the checks that depend on which sides are really present.
+    """
+    present = {item["page"].digest for item in images_with_filenames}
+    return all(set(doc.get("Source Pages") or ()) <= present for doc in documents)
+
+def from_page_refs(documents: List[Dict[str, Any]], images_with_filenames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Cached records with "Source Files" rebuilt from the current upload: the
+    files whose pages match "Source Pages" (see covers_page_refs).
+    """
+    names_by_digest: Dict[str, List[str]] = {}
+    for other in images_with_filenames:
+        names = names_by_digest.setdefault(other["page"].digest, [])
+        if other["filename"] not in names:
+            names.append(other["filename"])
+    out = []
+    for doc in documents:
+        doc = dict(doc)
+        refs = doc.pop("Source Pages", None) or []
+        sources = [name for digest in refs for name in names_by_digest.get(digest, ())]
+        doc["Source Files"] = list(dict.fromkeys(sources))
+        out.append(doc)
+    return out
+
+def dedupe_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drops exact duplicate records (a cached record can be attributed to several pages)."""
+    seen = set()
+    unique = []
+    for doc in documents:
+        fingerprint = json.dumps(doc, sort_keys=True)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            unique.append(doc)
+    return unique
+
+class DocumentStreamParser:
+    """
+    Incremental parser for a streamed {"documents": [...]} reply. feed(text)
+    scans only the new text and returns the records whose JSON object has
+    closed since the last call. close() checks that the whole reply parses
+    (raising LLMExtractionError if not) and returns the records if the
+    array was never found by the scan. Text around the object is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key = None              # last string closed at depth 1 (the current key)
+        self._array = "before"        # before / in / after the "documents" array
+        self._object_start = None     # start of the record being read
+        self.count = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self._buffer += text
+        buf = self._buffer
+        documents = []
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._key = buf[self._string_start:i + 1]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{" or ch == "[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._array == "before" and self._key == '"documents"':
+                    self._array = "in"
+                elif ch == "{" and self._depth == 3 and self._array == "in":
+                    self._object_start = i
+            elif ch == "}" or ch == "]":
+                if ch == "}" and self._depth == 3 and self._object_start is not None:
+                    try:
+                        documents.append(json.loads(buf[self._object_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # close() reports the reply as invalid
+                    self._object_start = None
+                elif ch == "]" and self._depth == 2 and self._array == "in":
+                    self._array = "after"
+                self._depth -= 1
+            elif ch == "," and self._depth == 1:
+                self._key = None
+        self._pos = len(buf)
+        self.count += len(documents)
+        return documents
+
+    def close(self) -> List[Dict[str, Any]]:
+        start, end = self._buffer.find("{"), self._buffer.rfind("}")
+        try:
+            data = json.loads(self._buffer[start:end + 1] if start >= 0 else self._buffer)
+        except json.JSONDecodeError as e:
+            raise LLMExtractionError(f"LLM returned invalid JSON: {e}") from e
+        if self._array != "before" or not isinstance(data, dict):
+            return []
+        return [doc for doc in data.get("documents", []) if isinstance(doc, dict)]
+
+
+async def request_documents(backend: AsyncLLMBackend, images_with_filenames: List[Dict[str, Any]],
+                            prompt: str = EXTRACTION_PROMPT) -> List[Dict[str, Any]]:
+    """
+    Sends the images to the LLM in a single call and returns its "documents" list.
+    Raises LLMExtractionError if the model can't be reached or returns unusable output;
+    an empty list means the model genuinely found no documents.
+    """
+    # JPEG encoding is CPU work; keep it off the event loop
+    with span("encode", images=len(images_with_filenames)):
+        content_parts = await run_io(build_content_parts, images_with_filenames, prompt)
     
-    try:
-        content_parts = [{"type": "text", "text": prompt}]
-        
-        # Limit total images to avoid payload issues, but user usually uploads 2-4
-        for item in images_with_filenames[:10]: 
-            img = item["image"]
-            filename = item["filename"]
-            base64_image = encode_image(img)
-            content_parts.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}",
-                },
-            })
-            content_parts.append({
-                "type": "text", 
-                "text": f"Above image is from file: {filename}"
-            })
-            
-        chat_completion = client.chat.completions.create(
+    with span("llm_call", images=len(images_with_filenames)):
+        chat_completion = await backend.create_completion(
             messages=[{"role": "user", "content": content_parts}],
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
             response_format={"type": "json_object"},
             temperature=0.0
         )
-        
-        content = chat_completion.choices[0].message.content
+    
+    content = chat_completion.choices[0].message.content
+    try:
         data = json.loads(content)
-        return data.get("documents", [])
-        
-    except Exception as e:
-        print(f"Error in batch extraction: {e}")
-        return []
+    except (TypeError, json.JSONDecodeError) as e:
+        raise LLMExtractionError(f"LLM returned invalid JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("documents", []), list):
+        raise LLMExtractionError(f"LLM returned JSON without a documents list: {content[:200]!r}")
+    return [doc for doc in data.get("documents", []) if isinstance(doc, dict)]
 
-# Helper / Legacy wrappers if needed, but we will likely call extract_all_documents directly
+async def stream_documents(backend: AsyncLLMBackend, images_with_filenames: List[Dict[str, Any]],
+                           prompt: str = EXTRACTION_PROMPT) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Like request_documents, but yields each record as soon as the streamed
+    reply has closed it. With LLM_STREAMING off, yields the records of the
+    blocking call once it returns.
+    """
+    if not LLM_STREAMING:
+        for doc in await request_documents(backend, images_with_filenames, prompt):
+            yield doc
+        return
+
+    with span("encode", images=len(images_with_filenames)):
+        content_parts = await run_io(build_content_parts, images_with_filenames, prompt)
+
+    parser = DocumentStreamParser()
+    ready: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def on_delta(text: str):
+        for doc in parser.feed(text):
+            ready.put_nowait(doc)
+
+    async def call():
+        with span("llm_call", images=len(images_with_filenames), streamed=True):
+            await backend.create_completion(
+                messages=[{"role": "user", "content": content_parts}],
+                on_delta=on_delta,
+                temperature=0.0,
+                **({"response_format": {"type": "json_object"}} if LLM_STREAM_JSON_MODE else {}),
+            )
+
+    task = asyncio.create_task(call())
+    task.add_done_callback(lambda _: ready.put_nowait(done))
+    try:
+        while (doc := await ready.get()) is not done:
+            yield doc
+        task.result()  # raises the call's error
+        for doc in parser.close():
+            yield doc
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def _plan_extraction(backend: AsyncLLMBackend, images_with_filenames: List[Dict[str, Any]],
+                           cache: Optional[ExtractionCache]):
+    """
+    Cache lookup and batch plan shared by the extractors. Returns
+    (cached records, miss items, batches of (prompt, miss indexes), store),
+    where `await store(batch, fresh)` caches a finished batch's records.
+    """
+    documents = []
+    misses = list(range(len(images_with_filenames)))
+    keys = None
+
+    if cache is not None:
+        def lookup():
+            keys = [page_cache_key(item["page"], backend.model, prompt_for(item), settings_signature()) for item in images_with_filenames]
+            return keys, cache.get_many(keys)
+
+        with span("cache_lookup"):
+            keys, cached = await run_io(lookup)
+        misses = []
+        for i, hit in enumerate(cached):
+            if hit is None or not covers_page_refs(hit, images_with_filenames):
+                misses.append(i)
+            else:
+                documents.extend(from_page_refs(hit, images_with_filenames))
+        print(f"Extraction cache: {len(cached) - len(misses)} hit(s), {len(misses)} miss(es)")
+
+    if not misses:
+        return documents, [], [], None
+
+    miss_items = [images_with_filenames[i] for i in misses]
+    # Payloads are memoized on the pages, so sizing them here is not wasted work
+    with span("payload", pages=len(miss_items)):
+        sizes = await run_io(lambda: [len(optimize_page_payload(item["page"]).jpeg) for item in miss_items])
+
+    # One batch plan per prompt; a batch never mixes prompts
+    by_prompt: Dict[str, List[int]] = {}
+    for j, item in enumerate(miss_items):
+        by_prompt.setdefault(prompt_for(item), []).append(j)
+    batches = []
+    for prompt, members in by_prompt.items():
+        plan = plan_batches([miss_items[j] for j in members], [sizes[j] for j in members])
+        batches.extend((prompt, [members[k] for k in batch]) for batch in plan)
+    print(f"LLM batches: {len(miss_items)} page(s) in {len(batches)} call(s) {[len(b) for _, b in batches]}"
+          f" across {len(by_prompt)} prompt(s)")
 
+    async def store(batch: List[int], fresh: List[Dict[str, Any]]):
+        if cache is not None:
+            batch_items = [miss_items[j] for j in batch]
+            per_page = to_page_refs(attribute_documents(fresh, batch_items), batch_items)
+            await run_io(cache.put_many, {keys[misses[j]]: docs for j, docs in zip(batch, per_page)})
+
+    return documents, miss_items, batches, store
+
+async def extract_all_documents(
+    backend: AsyncLLMBackend,
+    images_with_filenames: List[Dict[str, Any]],
+    cache: Optional[ExtractionCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Analyzes all images and extracts unique documents, merging Front/Back based on ID.
+    With a cache, pages seen before are answered from it and only cache-miss
+    pages are sent to the model. Misses are grouped by prompt (pages labelled
+    by the local classifier get a short type-specific prompt, see prompt_for),
+    then split into size- and byte-bounded batches (see batch_scheduler) that
+    run concurrently; their documents are merged in batch order.
+    """
+    documents, miss_items, batches, store = await _plan_extraction(backend, images_with_filenames, cache)
+    if not batches:
+        return dedupe_documents(documents)
+
+    async def run_batch(planned) -> List[Dict[str, Any]]:
+        prompt, batch = planned
+        fresh = await request_documents(backend, [miss_items[j] for j in batch], prompt)
+        await store(batch, fresh)
+        return fresh
+
+    for fresh in await run_batches(batches, run_batch):
+        documents.extend(fresh)
+
+    return dedupe_documents(documents)
+
+async def iter_all_documents(
+    backend: AsyncLLMBackend,
+    images_with_filenames: List[Dict[str, Any]],
+    cache: Optional[ExtractionCache] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    extract_all_documents as a stream: cached records first, then each
+    record as soon as any batch's reply has closed it (see stream_documents),
+    in arrival order. Exact duplicates are dropped on the way.
+    """
+    documents, miss_items, batches, store = await _plan_extraction(backend, images_with_filenames, cache)
+    seen = set()
+
+    def first_sighting(doc) -> bool:
+        fingerprint = json.dumps(doc, sort_keys=True)
+        if fingerprint in seen:
+            return False
+        seen.add(fingerprint)
+        return True
+
+    for doc in documents:
+        if first_sighting(doc):
+            yield doc
+    if not batches:
+        return
+
+    ready: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def run_batch(planned):
+        prompt, batch = planned
+        fresh = []
+        async for doc in stream_documents(backend, [miss_items[j] for j in batch], prompt):
+            fresh.append(doc)
+            ready.put_nowait(doc)
+        await store(batch, fresh)
+
+    task = asyncio.create_task(run_batches(batches, run_batch))
+    task.add_done_callback(lambda _: ready.put_nowait(done))
+    try:
+        while (doc := await ready.get()) is not done:
+            if first_sighting(doc):
+                yield doc
+        task.result()  # raises the first failed batch's error
+    finally:
+        if not task.done():
+            task.cancel()
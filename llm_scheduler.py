@@ -0,0 +1,190 @@
+import os
+import heapq
+import asyncio
+import itertools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from metrics import LLM_SHED, LLM_QUEUE_SECONDS, LLM_LIMIT_CHANGES
+
+# Adaptive concurrency: the number of in-flight LLM calls per route is
+# steered by AIMD between LLM_MIN_CONCURRENCY and the route cap
+# (LLM_ROUTE_CONCURRENCY). 0 keeps the fixed semaphores.
+LLM_ADAPTIVE_CONCURRENCY = os.environ.get("LLM_ADAPTIVE_CONCURRENCY", "1") == "1"
+LLM_MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", 1))
+LLM_INITIAL_CONCURRENCY = int(os.environ.get("LLM_INITIAL_CONCURRENCY", 4))
+# Additive increase: +this per limit's worth of fast successful calls
+LLM_AIMD_INCREASE = float(os.environ.get("LLM_AIMD_INCREASE", 1.0))
+# Multiplicative decrease on a 429 / 5xx / timeout, or a call slower than
+# LLM_LATENCY_TOLERANCE x the baseline (fastest recent call, per image)
+LLM_AIMD_DECREASE = float(os.environ.get("LLM_AIMD_DECREASE", 0.7))
+LLM_LATENCY_TOLERANCE = float(os.environ.get("LLM_LATENCY_TOLERANCE", 2.5))
+
+# Request deadlines by priority, in seconds from the start of the request.
+# Waiting calls are served earliest deadline first, so interactive requests
+# overtake queued bulk work; a call that can no longer finish in time is shed.
+DEADLINES = {
+    "interactive": float(os.environ.get("LLM_INTERACTIVE_DEADLINE", 60)),
+    "bulk": float(os.environ.get("LLM_BULK_DEADLINE", 900)),
+}
+
+# Latency samples kept for the baseline
+_LATENCY_WINDOW = 200
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of making an LLM call that can't finish before its request's deadline."""
+
+
+# (deadline in event-loop time, priority) of the current request
+_current_deadline: contextvars.ContextVar[Optional[Tuple[float, str]]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(priority: str = "interactive", seconds: Optional[float] = None) -> Iterator[float]:
+    """
+    Sets the deadline LLM calls in the enclosed code (and tasks it creates)
+    are scheduled by: `seconds` from now, or the priority's default.
+    Must be entered on the event loop.
+    """
+    seconds = DEADLINES[priority] if seconds is None else seconds
+    deadline_at = asyncio.get_running_loop().time() + seconds
+    token = _current_deadline.set((deadline_at, priority))
+    try:
+        yield deadline_at
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Tuple[float, str]]:
+    return _current_deadline.get()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with an earliest-deadline-first wait queue.
+    acquire() is admitted while fewer than `limit` calls are in flight;
+    release() reports how the call went and moves the limit:
+
+    - "ok": +increase/limit (about +increase per round trip at full use)
+      while the limit is actually in use and the call was not slow
+    - "overload" (429, 5xx, timeout) or a slow "ok": limit x decrease, at
+      most once per round trip so one burst counts once
+    - "ignore": no signal (client errors, cancellations)
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = LLM_MIN_CONCURRENCY,
+                 initial: int = LLM_INITIAL_CONCURRENCY, increase: float = LLM_AIMD_INCREASE,
+                 decrease: float = LLM_AIMD_DECREASE, tolerance: float = LLM_LATENCY_TOLERANCE):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self._waiters: list = []  # heap of (deadline_at, seq, future, cost, priority)
+        self._seq = itertools.count()
+        self._samples: deque = deque(maxlen=_LATENCY_WINDOW)  # seconds per unit of cost
+        self._last_decrease = float("-inf")
+        self._round_trip = 0.0  # smoothed latency of successful calls
+        self.stats = {"increases": 0, "decreases": 0, "shed": 0}
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for entry in self._waiters if not entry[2].done())
+
+    @property
+    def baseline(self) -> Optional[float]:
+        """Fastest recent call, in seconds per unit of cost."""
+        return min(self._samples) if self._samples else None
+
+    def _hopeless(self, deadline_at: float, cost: float, now: float) -> bool:
+        # Even the fastest recent call wouldn't finish before the deadline
+        return now + (self.baseline or 0.0) * cost >= deadline_at
+
+    def _shed(self, priority: str, where: str) -> DeadlineExceeded:
+        self.stats["shed"] += 1
+        LLM_SHED.inc(priority=priority)
+        return DeadlineExceeded(f"LLM call shed {where}: its {priority} request can't finish before its deadline")
+
+    def _wake(self):
+        loop = asyncio.get_running_loop()
+        while self._waiters and self.in_flight < int(self.limit):
+            deadline_at, _, future, cost, priority = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if self._hopeless(deadline_at, cost, loop.time()):
+                future.set_exception(self._shed(priority, "while queued"))
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, deadline_at: float, cost: float = 1.0, priority: str = "interactive"):
+        """Waits for a slot, earliest deadline first. Raises DeadlineExceeded instead of a late call."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._hopeless(deadline_at, cost, now):
+            raise self._shed(priority, "before queueing")
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            LLM_QUEUE_SECONDS.observe(0.0, priority=priority)
+            return
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (deadline_at, next(self._seq), future, cost, priority))
+        try:
+            await asyncio.wait({future}, timeout=max(0.0, deadline_at - now))
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+                self._wake()
+            elif not future.cancelled() and future.exception() is None:
+                # Granted, but the caller was cancelled before it could resume
+                self.release(0.0, "ignore")
+            raise
+        if not future.done():
+            # Deadline reached in the queue: leave it
+            future.cancel()
+            self._wake()
+        LLM_QUEUE_SECONDS.observe(loop.time() - now, priority=priority)
+        if future.cancelled():
+            raise self._shed(priority, "in the queue")
+        future.result()  # raises DeadlineExceeded if shed while queued
+
+    def release(self, latency: float, outcome: str, cost: float = 1.0):
+        loop = asyncio.get_running_loop()
+        was_full = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        if outcome == "ok":
+            per_unit = latency / max(cost, 1.0)
+            baseline = self.baseline
+            self._samples.append(per_unit)
+            self._round_trip = latency if not self._round_trip else 0.8 * self._round_trip + 0.2 * latency
+            if baseline is not None and per_unit > baseline * self.tolerance:
+                self._back_off(loop.time())
+            elif was_full and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                self.stats["increases"] += 1
+                LLM_LIMIT_CHANGES.inc(direction="up")
+        elif outcome == "overload":
+            self._back_off(loop.time())
+        self._wake()
+
+    def _back_off(self, now: float):
+        # One decrease per round trip: the calls already in flight were sent at the old limit
+        if now - self._last_decrease < self._round_trip:
+            return
+        self._last_decrease = now
+        limit = max(self.min_limit, self.limit * self.decrease)
+        if limit < self.limit:
+            self.limit = limit
+            self.stats["decreases"] += 1
+            LLM_LIMIT_CHANGES.inc(direction="down")
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "waiting": self.waiting,
+                "baseline_ms": round((self.baseline or 0.0) * 1000, 1),
+                "round_trip_ms": round(self._round_trip * 1000, 1), **self.stats}
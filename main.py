@@ -1,20 +1,28 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-import shutil
 import os
+import json
 import uuid
+import asyncio
 from typing import List
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Import our modules
-from pdf_processor import convert_pdf_to_images
-from llm_extractor import extract_all_documents, client
-
-from face_extractor import extract_face
+from ingest import ingest_upload, IngestedFile, UploadRejected, RequestSizeLimitMiddleware, UPLOAD_MAX_REQUEST_BYTES
+from llm_extractor import backend
+from pipeline import process_ingested_files, ProcessingError, FACES_DIR
+from executors import shutdown_executors, cpu_executor, io_executor, QueueFullError
+from jobs import job_manager, JobQueueFull, JOB_RETRY_AFTER
+from face_store import get_face_store, FACE_STORE_SWEEP_INTERVAL
+from metrics import render_metrics, register, Gauge, METRICS_ENABLED
+from warmup import warm_worker, readiness
+from memory_budget import memory_budget
+from response_modes import (format_documents, photo_files, photo_url, multipart_body, new_boundary,
+                            FaceStaticFiles, RESPONSE_MODES, RESPONSE_MODE_DEFAULT)
 
 app = FastAPI(title="Aadhar Pan Extraction")
 
@@ -28,280 +36,272 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Oversized bodies get their 413 before Starlette parses and spools them
+app.add_middleware(RequestSizeLimitMiddleware)
 
 TEMP_DIR = "temp_uploads"
 OUTPUT_DIR = "processed_files"
-FACES_DIR = "static/faces"
 
 os.makedirs(TEMP_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(FACES_DIR, exist_ok=True)
 
+# Faces first: the more specific mount must win over /static
+app.mount("/static/faces", FaceStaticFiles(directory=FACES_DIR), name="faces")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+face_store = get_face_store(FACES_DIR)
+_face_sweeper = None
+_warm_up = None
+
+# Scrape-time gauges for state owned by this process
+register(Gauge("extractor_face_store_bytes", "Face store size as of the last sweep", lambda: face_store.snapshot()["bytes"]))
+register(Gauge("extractor_face_store_files", "Face crops as of the last sweep", lambda: face_store.snapshot()["files"]))
+register(Gauge("extractor_jobs_pending", "Jobs waiting for a worker", lambda: job_manager.pending))
+register(Gauge("extractor_cpu_tasks_in_flight", "Tasks queued or running on the CPU pool", lambda: cpu_executor.in_flight))
+register(Gauge("extractor_cpu_tasks_waiting", "Tasks waiting for a CPU pool slot", lambda: cpu_executor.waiting))
+register(Gauge("extractor_io_tasks_in_flight", "Tasks queued or running on the I/O pool", lambda: io_executor.in_flight))
+register(Gauge("extractor_io_tasks_waiting", "Tasks waiting for an I/O pool slot", lambda: io_executor.waiting))
+register(Gauge("extractor_memory_budget_bytes", "Memory budget for decoded pages (0 = disabled)", lambda: memory_budget.capacity))
+register(Gauge("extractor_memory_budget_in_use_bytes", "Memory budget reserved by running requests", lambda: memory_budget.in_use))
+register(Gauge("extractor_memory_budget_waiting", "Requests queued for memory budget", lambda: memory_budget.waiting))
+register(Gauge("extractor_llm_concurrency_limit", "Adaptive LLM concurrency limit (summed over routes)", lambda: backend.limiter_snapshot()["limit"] if backend else 0))
+register(Gauge("extractor_llm_in_flight", "LLM calls holding a concurrency slot", lambda: backend.limiter_snapshot()["in_flight"] if backend else 0))
+register(Gauge("extractor_llm_waiting", "LLM calls queued for a concurrency slot", lambda: backend.limiter_snapshot()["waiting"] if backend else 0))
+
+@app.on_event("startup")
+async def on_startup():
+    global _face_sweeper, _warm_up
+    # Models and pool processes load in the background; GET /ready says when they're done
+    _warm_up = asyncio.create_task(warm_worker())
+    job_manager.start()
+    if FACE_STORE_SWEEP_INTERVAL > 0:
+        _face_sweeper = asyncio.create_task(face_store.run_sweeper())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _warm_up and not _warm_up.done():
+        _warm_up.cancel()
+    if _face_sweeper:
+        _face_sweeper.cancel()
+    await job_manager.stop()
+    if backend:
+        await backend.aclose()
+    shutdown_executors(wait=False)
+
+@app.exception_handler(ProcessingError)
+async def processing_error_handler(request, exc: ProcessingError):
+    # Same response shape as HTTPException
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+
 @app.get("/")
 def read_root():
     return FileResponse('static/index.html')
 
-async def process_files_logic(files: List[UploadFile]):
+def cleanup_ingested(ingested_files: List[IngestedFile]):
+    for ingested in ingested_files:
+        ingested.cleanup()
+
+async def ingest_files(files: List[UploadFile], request_id: str) -> List[IngestedFile]:
     """
-    Core logic to process uploaded files, extract data, validate, merge, and extract photos.
-    Returns (request_id, final_docs)
+    Streams every upload into memory (or a spill file) before any processing.
+    Raises HTTPException 413 for oversized uploads, 415 when no file is a
+    supported type and 503 when the I/O pool is overloaded. Files that are not
+    a PDF, JPEG or PNG are skipped; any other error fails the request.
     """
-    request_id = str(uuid.uuid4())
-    print(f"Request ID: {request_id} - Processing {len(files)} files.")
-    
-    all_images_with_filenames = []
-    temp_files_to_cleanup = []
-    
+    ingested_files = []
+    unsupported_files = []
+    request_budget = UPLOAD_MAX_REQUEST_BYTES
     try:
-        if not client:
-             raise HTTPException(status_code=500, detail="LLM Client not initialized. Check server logs/API Key.")
-
         for file in files:
-            # Basic validation
-            if not file.filename.lower().endswith((".pdf", ".jpg", ".jpeg", ".png")):
+            # Stream the upload in chunks: type is sniffed from magic bytes,
+            # size limits are enforced while reading, and the SHA-256 is
+            # computed on the way. Files up to UPLOAD_SPOOL_BYTES are kept in
+            # memory, larger ones are written to a spill file.
+            ingested = await ingest_upload(file, TEMP_DIR, request_budget)
+            if ingested is None:
+                unsupported_files.append(file.filename)
                 continue
+            request_budget -= ingested.size
+            ingested_files.append(ingested)
+    except UploadRejected as ur:
+        print(f"Request ID: {request_id} - Upload rejected: {ur.detail}")
+        cleanup_ingested(ingested_files)
+        raise HTTPException(status_code=ur.status_code, detail=ur.detail)
+    except QueueFullError as qe:
+        print(f"Request ID: {request_id} - Upload rejected: {qe}")
+        cleanup_ingested(ingested_files)
+        raise HTTPException(status_code=503, detail="Server is busy. Please retry shortly.", headers={"Retry-After": "5"})
+    except BaseException:
+        # Spill write failures (disk full), client disconnects, cancellation
+        cleanup_ingested(ingested_files)
+        raise
 
-            file_ext = os.path.splitext(file.filename)[1]
-            temp_filename = f"{request_id}_{uuid.uuid4()}{file_ext}"
-            temp_path = os.path.join(TEMP_DIR, temp_filename)
-            temp_files_to_cleanup.append(temp_path)
-            
-            try:
-                # Save uploaded file
-                with open(temp_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                
-                # Convert to Images
-                images = []
-                image_paths = [] 
-                
-                if file.filename.lower().endswith(".pdf"):
-                    pil_images = convert_pdf_to_images(temp_path)
-                    for idx, img in enumerate(pil_images):
-                         page_filename = f"{request_id}_{uuid.uuid4()}_page{idx}.jpg"
-                         page_path = os.path.join(TEMP_DIR, page_filename)
-                         img.save(page_path, "JPEG")
-                         temp_files_to_cleanup.append(page_path)
-                         images.append(img)
-                         image_paths.append(page_path)
-                else:
-                    from PIL import Image
-                    try:
-                         img = Image.open(temp_path).convert('RGB')
-                         images = [img]
-                         image_paths = [temp_path]
-                    except Exception as e:
-                        print(f"Image load failed for {file.filename}: {e}")
-                        continue
-                
-                # Add to collection
-                for img, path in zip(images, image_paths):
-                    all_images_with_filenames.append({
-                        "image": img,
-                        "filename": file.filename,
-                        "path": path 
-                    })
-
-            except Exception as e:
-                print(f"Error processing file {file.filename}: {e}")
-                continue
+    if not ingested_files and unsupported_files and len(unsupported_files) == len(files):
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {', '.join(unsupported_files)}. Upload PDF, JPEG or PNG files.")
+    return ingested_files
+
+async def process_files_logic(files: List[UploadFile], progress=None):
+    """
+    Core logic to process uploaded files, extract data, validate, merge, and extract photos.
+    Returns (request_id, final_docs)
+    """
+    request_id = str(uuid.uuid4())
+    print(f"Request ID: {request_id} - Processing {len(files)} files.")
+    ingested_files = await ingest_files(files, request_id)
+    return await process_ingested_files(request_id, ingested_files, progress)
 
-        if not all_images_with_filenames:
-             raise HTTPException(status_code=400, detail="No valid images found in upload.")
-
-        # Batch Extraction
-        print(f"sending {len(all_images_with_filenames)} images to LLM...")
-        extracted_documents = extract_all_documents(client, all_images_with_filenames)
-        
-        if not extracted_documents:
-             raise HTTPException(status_code=400, detail="No valid documents detected.")
-
-        # Helper to extract face
-        def get_face_photo(doc):
-             source_filenames = doc.get("Source Files", [])
-             
-             candidates = [item for item in all_images_with_filenames if item["filename"] in source_filenames]
-             
-             for item in candidates:
-                  # Use FACES_DIR for persistent storage
-                  face_path = extract_face(item["path"], output_dir=FACES_DIR)
-                  if face_path:
-                       return face_path 
-             return None
-
-        # --- Identity Merging Logic ---
-        merged_results = []
-        
-        # Helper to normalize strings for comparison
-        def normalize(s):
-            return str(s).lower().strip().replace("  ", " ") if s else ""
-
-        for doc in extracted_documents:
-            # Check if this doc belongs to an existing identity in merged_results
-            match_index = -1
-            
-            doc_aadhar = normalize(doc.get("Aadhar Number"))
-            doc_pan = normalize(doc.get("PAN Number"))
-            doc_name = normalize(doc.get("Name"))
-            
-            for i, existing in enumerate(merged_results):
-                ext_aadhar = normalize(existing.get("Aadhar Number"))
-                ext_pan = normalize(existing.get("PAN Number"))
-                ext_name = normalize(existing.get("Name"))
-                
-                # Match Logic:
-                # 1. ID Match (Strongest)
-                if doc_aadhar and ext_aadhar and doc_aadhar == ext_aadhar:
-                    match_index = i
-                    break
-                if doc_pan and ext_pan and doc_pan == ext_pan:
-                    match_index = i
-                    break
-                
-                # 2. Name Match (Medium - only if significantly long to avoid "Kumar" matches)
-                if doc_name and ext_name and len(doc_name) > 3 and doc_name == ext_name:
-                    match_index = i
-                    break
-            
-            if match_index >= 0:
-                # MERGE into existing
-                existing = merged_results[match_index]
-                
-                # Update Type
-                types = set(existing.get("Document Type", "").split(" + "))
-                types.add(doc.get("Document Type", "Unknown"))
-                existing["Document Type"] = " + ".join(sorted(list(types)))
-                
-                # Merge Fields (Overwrite if new doc has value and existing doesn't, or blindly overwrite?)
-                # Better to overwrite specific fields or aggregate.
-                for k, v in doc.items():
-                    if k in ["Document Type", "Sides Detected", "Source Files", "Photo Path"]: continue # Handle separately
-                    
-                    if v and (k not in existing or not existing[k]):
-                         existing[k] = v
-                
-                # Merge Source Files
-                existing["Source Files"] = list(set(existing.get("Source Files", []) + doc.get("Source Files", [])))
-                
-                # Merge Sides (for Aadhar)
-                sides = set(existing.get("Sides Detected", []) + doc.get("Sides Detected", []))
-                existing["Sides Detected"] = list(sides)
-                
-                # Handle Photo (Prioritize existing if present, else take new)
-                new_photo = get_face_photo(doc)
-                if new_photo and "Photo Path" not in existing:
-                     existing["Photo Path"] = new_photo
-                     
-            else:
-                # CREATE NEW Identity
-                new_doc = doc.copy()
-                
-                # Initial Photo Extraction
-                photo_path = get_face_photo(new_doc)
-                if photo_path: new_doc["Photo Path"] = photo_path
-                
-                merged_results.append(new_doc)
-
-        # --- Final Validation on Merged Identities ---
-        final_valid_docs = []
-        
-        # Validation State Helpers
-        has_pan = False
-        has_dl = False
-        pan_name = ""
-        dl_name = ""
-
-        for doc in merged_results:
-             doc_type = doc.get("Document Type", "")
-             
-             # 1. Aadhar Completeness Check
-             if "Aadhar" in doc_type:
-                 sides = [s.lower() for s in doc.get("Sides Detected", [])]
-                 has_front = "front" in sides
-                 has_back = "back" in sides
-                 
-                 if not (has_front and has_back):
-                      raise HTTPException(status_code=400, detail="Incomplete Aadhar Card. Please upload both Front and Back sides.")
-             
-             # Track PAN/DL for Pairing Check
-             if "PAN" in doc_type:
-                 has_pan = True
-                 pan_name = normalize(doc.get("Name", ""))
-             
-             if "Driving Licence" in doc_type:
-                 has_dl = True
-                 dl_name = normalize(doc.get("Name", ""))
-
-             # Cleanup internal keys
-             if "Sides Detected" in doc: del doc["Sides Detected"]
-             
-             final_valid_docs.append(doc)
-
-        # 2. PAN & DL Pairing Check
-        if (has_pan and not has_dl) or (has_dl and not has_pan):
-             raise HTTPException(status_code=400, detail="Incomplete Submission. Please upload BOTH PAN Card and Driving Licence.")
-
-        # 3. Name Mismatch Check
-        if has_pan and has_dl:
-             if pan_name != dl_name:
-                  raise HTTPException(status_code=400, detail=f"Name Mismatch. PAN Name ('{pan_name}') does not match Driving Licence Name ('{dl_name}'). Please ensure documents belong to the same person.")
-
-        if not final_valid_docs:
-             raise HTTPException(status_code=400, detail="No valid documents processed.")
-        
-        return request_id, final_valid_docs
-
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        print(f"Error processing files: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Cleanup input files
-        for p in temp_files_to_cleanup:
-            if os.path.exists(p):
-                try: os.remove(p)
-                except: pass
-
-import base64
+def check_response_mode(response_mode: str, allowed=RESPONSE_MODES) -> str:
+    if response_mode not in allowed:
+        raise HTTPException(status_code=400, detail=f"Unknown response_mode '{response_mode}'. Use one of: {', '.join(allowed)}.")
+    return response_mode
 
 @app.post("/extract/")
-async def extract_data(files: List[UploadFile] = File(...)):
+async def extract_data(files: List[UploadFile] = File(...),
+                       response_mode: str = Query(RESPONSE_MODE_DEFAULT, description=f"One of: {', '.join(RESPONSE_MODES)}")):
     """
-    Returns JSON Data with extracted information, photo URLs, and Base64 encoded images.
+    Returns JSON Data with extracted information and photo URLs. The photo is
+    also inlined as Base64 ("full"), as a small thumbnail ("thumbnail"), or not
+    at all ("url"). "multipart" returns multipart/mixed: the "url" JSON, then
+    each face as an image/jpeg part.
     """
+    check_response_mode(response_mode)
     request_id, final_docs = await process_files_logic(files)
-    
-    # Post-process for JSON friendly URLs and Base64
-    json_docs = []
-    for doc in final_docs:
-        d = doc.copy()
-        if "Photo Path" in d:
-            # 1. Base64 Encoding
-            try:
-                # Photo Path is relative to cwd (e.g. static/faces/...)
-                if os.path.exists(d["Photo Path"]):
-                    with open(d["Photo Path"], "rb") as image_file:
-                         encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                         d["Photo Base64"] = f"data:image/jpeg;base64,{encoded_string}"
-            except Exception as e:
-                print(f"Error encoding base64 for {d['Photo Path']}: {e}")
-
-            # 2. Convert OS path to URL path
-            # static/faces/abcd.jpg -> /static/faces/abcd.jpg
-            # Ensure forward slashes
-            rel_path = d["Photo Path"].replace("\\", "/")
-            if not rel_path.startswith("/"):
-                rel_path = "/" + rel_path
-            d["Photo Path"] = rel_path
-            d["Photo URL"] = rel_path # Duplicate for clarity
-            
-        json_docs.append(d)
-    
-    return JSONResponse(content={
+    content = {
         "status": "success",
         "request_id": request_id,
-        "data": json_docs
+        "data": format_documents(final_docs, response_mode)
+    }
+
+    if response_mode == "multipart":
+        boundary = new_boundary()
+        payload = json.dumps(content).encode("utf-8")
+        return StreamingResponse(multipart_body(payload, photo_files(final_docs), boundary),
+                                 media_type=f"multipart/mixed; boundary={boundary}")
+    return JSONResponse(content=content)
+
+@app.post("/extract/stream")
+async def extract_stream(files: List[UploadFile] = File(...),
+                         response_mode: str = Query("url", description="Shape of the final result: full, url or thumbnail")):
+    """
+    Streams NDJSON while the request is processed, one object per line:
+    {"type": "document", "identity": i, "data": {...}} for each extracted
+    record as soon as the LLM has produced it (i is the index of the identity
+    it was merged into), {"type": "photo", "identity": i, "Photo URL": ...}
+    when that identity's face is found, then {"type": "result", ...} with the
+    same body as /extract/, or {"type": "error", "status_code": ..., "detail": ...}.
+    Records are unvalidated until the result line.
+    """
+    check_response_mode(response_mode, RESPONSE_MODES[:-1])
+    request_id = str(uuid.uuid4())
+    print(f"Request ID: {request_id} - Streaming {len(files)} files.")
+    # Upload errors (413/415) are still plain HTTP errors: nothing has been sent yet
+    ingested_files = await ingest_files(files, request_id)
+
+    events = asyncio.Queue()
+    task = asyncio.create_task(process_ingested_files(request_id, ingested_files, on_document=events.put_nowait))
+    task.add_done_callback(lambda _: events.put_nowait(None))
+
+    def line(content: dict) -> bytes:
+        return (json.dumps(content) + "\n").encode("utf-8")
+
+    async def stream():
+        try:
+            while (event := await events.get()) is not None:
+                if event["type"] == "document":
+                    yield line({"type": "document", "identity": event["identity"], "data": event["document"]})
+                else:
+                    yield line({"type": "photo", "identity": event["identity"], "Photo URL": photo_url(event["path"])})
+            try:
+                _, final_docs = task.result()
+            except ProcessingError as pe:
+                yield line({"type": "error", "status_code": pe.status_code, "detail": pe.detail})
+                return
+            yield line({"type": "result", "status": "success", "request_id": request_id,
+                        "data": format_documents(final_docs, response_mode)})
+        finally:
+            # Client went away: stop the pipeline (its cleanup still runs)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Request-ID": request_id})
+
+@app.get("/faces/stats")
+async def face_store_stats():
+    """Face store size (files, bytes, as of the last sweep) and eviction counters."""
+    return face_store.snapshot()
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once this worker has loaded its models and started its CPU pool, 503 before."""
+    state = readiness()
+    return JSONResponse(status_code=200 if state["status"] == "ready" else 503, content=state)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: stage latency, pages, LLM payload/errors/retries, faces, temp bytes."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# --- Job API: same pipeline, without holding the connection open ---
+
+@app.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile] = File(...),
+                     response_mode: str = Query(RESPONSE_MODE_DEFAULT, description="One of: full, url, thumbnail")):
+    """
+    Accepts the upload and queues it. Returns the job id immediately;
+    poll GET /jobs/{id} or stream GET /jobs/{id}/events for progress.
+    `response_mode` shapes the stored result like /extract/ (no multipart).
+    """
+    check_response_mode(response_mode, RESPONSE_MODES[:-1])
+    request_id = str(uuid.uuid4())
+    print(f"Request ID: {request_id} - Queuing job for {len(files)} files.")
+    # Uploads must be read before responding: the UploadFiles close with the request
+    ingested_files = await ingest_files(files, request_id)
+
+    async def runner(progress):
+        _, final_docs = await process_ingested_files(request_id, ingested_files, progress, priority="bulk")
+        return format_documents(final_docs, response_mode)
+
+    try:
+        job_manager.submit(runner, job_id=request_id)
+    except JobQueueFull as qe:
+        print(f"Request ID: {request_id} - Job rejected, queue full: {qe}")
+        for ingested in ingested_files:
+            ingested.cleanup()
+        raise HTTPException(status_code=429, detail="Too many queued jobs. Please retry shortly.", headers={"Retry-After": str(JOB_RETRY_AFTER)})
+
+    return JSONResponse(status_code=202, headers={"Location": f"/jobs/{request_id}"}, content={
+        "status": "queued",
+        "job_id": request_id,
+        "status_url": f"/jobs/{request_id}",
+        "events_url": f"/jobs/{request_id}/events",
     })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Returns job status, the last completed stage, and the result or error once finished."""
+    record = job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired).")
+    return {
+        "job_id": job_id,
+        "status": record["status"],
+        "stage": record["stage"],
+        "events": record["events"],
+        "data": record["result"],
+        "error": record["error"],
+    }
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: one event per stage (rendered, extracted, faces, validated), then succeeded/failed."""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired).")
+
+    async def stream():
+        async for event in job_manager.events(job_id):
+            yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
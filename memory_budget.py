@@ -0,0 +1,153 @@
+import os
+import asyncio
+from collections import deque
+from typing import List, Optional
+
+from ingest import IngestedFile
+from pdf_processor import pdf_page_sizes, image_size, PDF_MAX_PAGES
+from metrics import MEMORY_ADMISSIONS
+
+# Per-process budget for decoded pages, in bytes. A request reserves its
+# estimated cost before rendering and waits (FIFO) while it doesn't fit.
+# 0 disables admission control.
+MEMORY_BUDGET_BYTES = int(os.environ.get("MEMORY_BUDGET_BYTES", 1024 * 1024 * 1024))
+# Seconds a request may wait for budget before it is rejected with 503
+MEMORY_BUDGET_WAIT = float(os.environ.get("MEMORY_BUDGET_WAIT", 30))
+# Decoded pixels are multiplied by this to cover the JPEG/payload copies and
+# the buffers pickled to pool processes while a page is in use
+MEMORY_PAGE_OVERHEAD = float(os.environ.get("MEMORY_PAGE_OVERHEAD", 2.0))
+# Fixed cost per request (documents, responses, bookkeeping)
+MEMORY_REQUEST_BASE_BYTES = int(os.environ.get("MEMORY_REQUEST_BASE_BYTES", 4 * 1024 * 1024))
+
+
+class MemoryBudgetRejected(Exception):
+    """Raised when a request can't be admitted: larger than the whole budget (413) or waited too long (503)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def page_cost(width: int, height: int, channels: int = 3) -> int:
+    """Estimated bytes a decoded page costs while it is alive."""
+    return int(width * height * channels * MEMORY_PAGE_OVERHEAD)
+
+
+def estimate_request_bytes(ingested_files: List[IngestedFile], max_pages: int = PDF_MAX_PAGES) -> int:
+    """
+    Estimated peak bytes of a request, from page counts and pixel dimensions
+    read from the PDF page geometry / image headers. Nothing is decoded.
+    Blocking (opens PDFs): run it on the I/O pool.
+    """
+    total = MEMORY_REQUEST_BASE_BYTES
+    for ingested in ingested_files:
+        try:
+            if ingested.kind == "pdf":
+                sizes = pdf_page_sizes(ingested.source, max_pages)
+            else:
+                sizes = [image_size(ingested.source)]
+        except Exception as e:
+            print(f"Size estimate failed for {ingested.filename}: {e}")
+            sizes = []
+        total += sum(page_cost(*size) for size in sizes if size)
+        if ingested.data is not None:
+            total += ingested.size
+    return total
+
+
+class Reservation:
+    """Bytes a request holds in the budget. Shrinks as pages are released; release() returns the rest."""
+
+    def __init__(self, budget: "MemoryBudget", nbytes: int):
+        self.budget = budget
+        self.nbytes = nbytes
+
+    def shrink(self, nbytes: int):
+        nbytes = min(nbytes, self.nbytes)
+        if nbytes > 0:
+            self.nbytes -= nbytes
+            self.budget._give_back(nbytes)
+
+    def release(self):
+        self.shrink(self.nbytes)
+
+
+class MemoryBudget:
+    """
+    Byte-counting admission gate for the event loop. Requests are admitted
+    in arrival order: while one waits, later (even smaller) requests queue
+    behind it, so large requests are not starved.
+    """
+
+    def __init__(self, capacity: int = MEMORY_BUDGET_BYTES, wait: float = MEMORY_BUDGET_WAIT):
+        self.capacity = capacity
+        self.wait = wait
+        self.in_use = 0
+        self.peak = 0
+        self._waiters: deque = deque()  # (nbytes, future)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _grant(self, nbytes: int) -> Reservation:
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+        return Reservation(self, nbytes)
+
+    def _give_back(self, nbytes: int):
+        self.in_use -= nbytes
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + nbytes > self.capacity:
+                return
+            self._waiters.popleft()
+            future.set_result(self._grant(nbytes))
+
+    async def acquire(self, nbytes: int, wait: Optional[float] = None) -> Reservation:
+        """Reserves nbytes, waiting up to `wait` seconds. Raises MemoryBudgetRejected."""
+        if not self.enabled:
+            return Reservation(self, 0)
+        if nbytes > self.capacity:
+            MEMORY_ADMISSIONS.inc(outcome="too_large")
+            raise MemoryBudgetRejected(413, f"Upload is too large to process (estimated {nbytes // (1024 * 1024)} MB "
+                                            f"decoded; limit {self.capacity // (1024 * 1024)} MB). Send fewer or smaller pages.")
+        if not self._waiters and self.in_use + nbytes <= self.capacity:
+            MEMORY_ADMISSIONS.inc(outcome="admitted")
+            return self._grant(nbytes)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, future))
+        try:
+            await asyncio.wait({future}, timeout=self.wait if wait is None else wait)
+        except asyncio.CancelledError:
+            if future.done():
+                # Granted, but the caller was cancelled before it could resume
+                future.result().release()
+            else:
+                future.cancel()
+                self._wake()
+            raise
+        if not future.done():
+            # Timed out while queued: leave the queue and let the next one in
+            future.cancel()
+            self._wake()
+        if future.cancelled():
+            MEMORY_ADMISSIONS.inc(outcome="timeout")
+            raise MemoryBudgetRejected(503, "Server is busy. Please retry shortly.")
+        MEMORY_ADMISSIONS.inc(outcome="queued")
+        return future.result()
+
+
+memory_budget = MemoryBudget()
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus metrics at /metrics and per-request stage traces
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Log one JSON line per request with its stage spans
+TRACE_LOG = os.environ.get("TRACE_LOG", "1") == "1"
+
+# Bucket sets (upper bounds); +Inf is implicit
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 4, 6, 8, 12, 16, 24, 32, 64)
+BYTES_BUCKETS = (16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels. Thread-safe; one dict update per inc."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels. Thread-safe; one bisect per observe."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = SECONDS_BUCKETS,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # key -> [per-bucket counts (non-cumulative, last = +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Gauge {self.name} failed: {e}")
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics ---
+
+STAGE_SECONDS = register(Histogram("extractor_stage_seconds", "Pipeline stage latency", labelnames=("stage",)))
+REQUEST_SECONDS = register(Histogram("extractor_request_seconds", "End-to-end pipeline latency", labelnames=("outcome",)))
+PAGES_PER_REQUEST = register(Histogram("extractor_pages_per_request", "Pages decoded per request", buckets=COUNT_BUCKETS))
+LLM_PAYLOAD_BYTES = register(Histogram("extractor_llm_payload_bytes", "Image bytes per LLM call", buckets=BYTES_BUCKETS))
+LLM_CALLS = register(Counter("extractor_llm_calls_total", "LLM completions by outcome", ("outcome",)))
+LLM_RETRIES = register(Counter("extractor_llm_retries_total", "LLM attempts retried after a transient error"))
+FACE_DETECTIONS = register(Counter("extractor_face_detections_total", "Face searches by result", ("result",)))
+TEMP_BYTES_WRITTEN = register(Counter("extractor_temp_bytes_written_total", "Bytes written to temp files", ("kind",)))
+MEMORY_ADMISSIONS = register(Counter("extractor_memory_admissions_total", "Memory budget decisions by outcome", ("outcome",)))
+LLM_SHED = register(Counter("extractor_llm_shed_total", "LLM calls shed because their request's deadline could not be met", ("priority",)))
+LLM_QUEUE_SECONDS = register(Histogram("extractor_llm_queue_seconds", "Wait for an LLM concurrency slot", labelnames=("priority",)))
+LLM_LIMIT_CHANGES = register(Counter("extractor_llm_limit_changes_total", "Adaptive LLM concurrency limit moves", ("direction",)))
+DEDUP_PAGES = register(Counter("extractor_dedup_pages_total", "Near-duplicate pages collapsed before extraction"))
+DEDUP_BYTES_SAVED = register(Counter("extractor_dedup_llm_bytes_saved_total", "LLM image bytes not sent for collapsed pages"))
+PDF_PAGE_LIMIT_REJECTIONS = register(Counter("extractor_pdf_page_limit_rejections_total", "Requests rejected for a PDF over PDF_MAX_PAGES"))
+
+
+# --- Tracing ---
+
+class RequestTrace:
+    """Spans recorded for one request: (stage, start offset, duration, tags)."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+
+    def add(self, stage: str, start: float, elapsed: float, tags: dict):
+        span = {"stage": stage, "start_ms": round((start - self.started) * 1000, 1), "ms": round(elapsed * 1000, 1)}
+        if tags:
+            span.update(tags)
+        self.spans.append(span)
+
+    def summary(self) -> Dict[str, float]:
+        """Total ms per stage (concurrent spans of one stage add up)."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["stage"]] = round(totals.get(span["stage"], 0) + span["ms"], 1)
+        return totals
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def trace_request(request_id: str) -> Iterator[RequestTrace]:
+    """
+    Makes a RequestTrace current for the enclosed code (and tasks it
+    creates), observes the request latency, and logs the trace as one
+    JSON line when the block exits.
+    """
+    trace = RequestTrace(request_id)
+    token = _current_trace.set(trace)
+    outcome = "error"
+    try:
+        yield trace
+        outcome = "ok"
+    finally:
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - trace.started
+        REQUEST_SECONDS.observe(elapsed, outcome=outcome)
+        if TRACE_LOG:
+            print(json.dumps({"trace": request_id, "outcome": outcome, "ms": round(elapsed * 1000, 1),
+                              "stages": trace.summary(), "spans": trace.spans}))
+
+
+@contextmanager
+def span(stage: str, **tags):
+    """
+    Times the enclosed block as `stage`: observed in the stage histogram and
+    recorded on the current request's trace, if any. Works around awaits;
+    code running in pool threads/processes has no current trace, so time
+    stages from the event loop side.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, start, elapsed, tags)
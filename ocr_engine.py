@@ -1,9 +1,21 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
 import pytesseract
 from PIL import Image
 
+from page import Page
+from payload_optimizer import find_content_bbox
+
 # Set Tesseract path if it's not in PATH
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_CONFIG = os.environ.get("OCR_CONFIG", "--psm 6")
+# Card crops smaller than this (long edge) are upscaled; Tesseract wants ~300 DPI text
+OCR_MIN_LONG_EDGE = int(os.environ.get("OCR_MIN_LONG_EDGE", 1200))
+
 def perform_ocr(image: Image, lang: str = "eng") -> str:
     """
     Perform OCR on a single PIL Image using Tesseract.
@@ -30,3 +42,71 @@ def extract_text_from_images(images: list[Image]) -> str:
         text = perform_ocr(img)
         full_text += text + "\n"
     return full_text
+
+
+@dataclass
+class OcrLine:
+    """One recognized line: its words with Tesseract confidences (0-100)."""
+    words: List[Tuple[str, float]]
+
+    @property
+    def text(self) -> str:
+        return " ".join(w for w, _ in self.words)
+
+    def confidence(self, start: int = 0, end: int = None) -> float:
+        """Lowest word confidence among the words overlapping text[start:end]."""
+        end = len(self.text) if end is None else end
+        confs = []
+        pos = 0
+        for word, conf in self.words:
+            if pos < end and pos + len(word) > start:
+                confs.append(conf)
+            pos += len(word) + 1
+        return min(confs) if confs else 0.0
+
+
+@dataclass
+class OcrResult:
+    lines: List[OcrLine] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(line.text for line in self.lines)
+
+
+def ocr_lines(image: Image.Image, lang: str = OCR_LANG, config: str = OCR_CONFIG) -> List[OcrLine]:
+    """Runs Tesseract and groups recognized words into lines, keeping word confidences."""
+    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    lines = {}
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        # conf == -1 marks layout rows (blocks, paragraphs) rather than words
+        if conf < 0 or not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append((word.strip(), conf))
+    return [OcrLine(words) for _, words in sorted(lines.items())]
+
+
+def ocr_page(page: Page) -> OcrResult:
+    """
+    OCRs the card region of a page (see payload_optimizer.find_content_bbox),
+    in grayscale, upscaled if small. Runs in a pool worker.
+    """
+    start = time.perf_counter()
+    image = page.pil
+    bbox = find_content_bbox(page)
+    if bbox:
+        image = image.crop(bbox)
+    image = image.convert("L")
+    long_edge = max(image.size)
+    if long_edge < OCR_MIN_LONG_EDGE:
+        scale = OCR_MIN_LONG_EDGE / float(long_edge)
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+    try:
+        lines = ocr_lines(image)
+    except Exception as e:
+        print(f"Error performing OCR: {e}")
+        lines = []
+    return OcrResult(lines, time.perf_counter() - start)
@@ -0,0 +1,199 @@
+import os
+import io
+import uuid
+import base64
+import hashlib
+from typing import Optional
+import numpy as np
+from PIL import Image
+
+from metrics import TEMP_BYTES_WRITTEN
+
+# JPEG quality used for the LLM payload and any temp files
+PAGE_JPEG_QUALITY = int(os.environ.get("PAGE_JPEG_QUALITY", 85))
+
+
+# Channels per supported pixel mode
+_CHANNELS = {"RGB": 3, "L": 1}
+
+
+class Page:
+    """
+    One decoded page, held once as a raw RGB (or grayscale "L") pixel buffer.
+
+    Consumers get views instead of re-encoded copies:
+    - `array`: read-only NumPy (H, W, 3) RGB or (H, W) gray view for OpenCV
+    - `pil`:   PIL image sharing the same buffer (Image.frombuffer)
+    - `jpeg` / `base64`: encoded lazily, once, and memoized
+    - `write_temp()`: only touches disk if something really needs a path
+
+    A page can also start from an original JPEG stream (see from_jpeg): the
+    bytes are passed through untouched as the payload, and pixels are only
+    decoded if a consumer asks for them.
+    """
+
+    def __init__(self, data: Optional[bytes], width: int, height: int, mode: str = "RGB",
+                 jpeg: Optional[bytes] = None, source: str = "rendered", digest: Optional[str] = None):
+        if data is None and jpeg is None:
+            raise ValueError("Page needs either pixel data or a JPEG stream")
+        expected = width * height * _CHANNELS[mode]
+        if data is not None and len(data) != expected:
+            raise ValueError(f"Expected {expected} bytes for a {width}x{height} {mode} page, got {len(data)}")
+        self._data = data
+        self.width = width
+        self.height = height
+        self.mode = mode
+        # Where the page came from: "rendered", "embedded" (PDF fast path) or "upload"
+        self.source = source
+        self._jpeg: Optional[bytes] = jpeg
+        self._base64: Optional[str] = None
+        # Hashed once, from what the page was built from, so it stays the same
+        # after decoding, re-encoding, pickling or release
+        self._digest: str = digest or self._content_digest(data, jpeg, width, height, mode)
+        self._temp_path: Optional[str] = None
+        # Memoized artifacts computed by later stages (payloads, regions); never pickled
+        self.derived: dict = {}
+
+    @classmethod
+    def from_pixmap(cls, pix) -> "Page":
+        """Wraps a PyMuPDF RGB or gray pixmap (no alpha) without any PNG round trip."""
+        if pix.alpha or pix.n not in (1, 3):
+            raise ValueError("Page.from_pixmap expects an RGB or gray pixmap without alpha")
+        mode = "RGB" if pix.n == 3 else "L"
+        if pix.stride != pix.width * pix.n:
+            # Rows are padded; repack them into a tight buffer
+            rows = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+            return cls(rows[:, :pix.width * pix.n].tobytes(), pix.width, pix.height, mode)
+        return cls(pix.samples, pix.width, pix.height, mode)
+
+    @classmethod
+    def from_pil(cls, image: Image.Image, source: str = "upload") -> "Page":
+        if image.mode not in _CHANNELS:
+            image = image.convert("RGB")
+        return cls(image.tobytes(), image.width, image.height, image.mode, source=source)
+
+    @classmethod
+    def from_jpeg(cls, jpeg: bytes, width: int, height: int, mode: str = "RGB", source: str = "embedded") -> "Page":
+        """Wraps an original JPEG stream; pixels are decoded on first use."""
+        return cls(None, width, height, mode, jpeg=jpeg, source=source)
+
+    @property
+    def is_passthrough(self) -> bool:
+        """True while the page is still backed only by its original JPEG stream."""
+        return self._data is None
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            if self._jpeg is None:
+                raise ValueError("Page was released")
+            with Image.open(io.BytesIO(self._jpeg)) as img:
+                if img.mode != self.mode:
+                    img = img.convert(self.mode)
+                self.width, self.height = img.size
+                self._data = img.tobytes()
+        return self._data
+
+    @property
+    def size(self) -> tuple:
+        return (self.width, self.height)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes currently held by the page (decoded pixels and/or JPEG)."""
+        return len(self._data or b"") + len(self._jpeg or b"")
+
+    @property
+    def array(self) -> np.ndarray:
+        """Zero-copy (H, W, 3) RGB or (H, W) gray view. Read-only: copy before drawing on it."""
+        flat = np.frombuffer(self.data, dtype=np.uint8)
+        if self.mode == "L":
+            return flat.reshape(self.height, self.width)
+        return flat.reshape(self.height, self.width, 3)
+
+    @property
+    def pil(self) -> Image.Image:
+        """PIL image backed by the page buffer (no copy)."""
+        data = self.data  # decodes passthrough pages first, which settles width/height
+        return Image.frombuffer(self.mode, (self.width, self.height), data, "raw", self.mode, 0, 1)
+
+    @staticmethod
+    def _content_digest(data: Optional[bytes], jpeg: Optional[bytes], width: int, height: int, mode: str) -> str:
+        if data is None:
+            return hashlib.sha256(jpeg).hexdigest()
+        h = hashlib.sha256(f"{mode}|{width}x{height}|".encode())
+        h.update(data)
+        return h.hexdigest()
+
+    @property
+    def digest(self) -> str:
+        """
+        SHA-256 of the page content, fixed at construction: the raw pixels
+        (with mode and size), or the original JPEG stream for pages built
+        from one (see from_jpeg), so those are never decoded just to be hashed.
+        """
+        return self._digest
+
+    @property
+    def jpeg(self) -> bytes:
+        """JPEG encoding of the page, computed on first use."""
+        if self._jpeg is None:
+            buffered = io.BytesIO()
+            self.pil.save(buffered, format="JPEG", quality=PAGE_JPEG_QUALITY)
+            self._jpeg = buffered.getvalue()
+        return self._jpeg
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.jpeg).decode("utf-8")
+        return self._base64
+
+    def write_temp(self, temp_dir: str) -> str:
+        """Writes the JPEG to temp_dir once and returns its path."""
+        if self._temp_path is None or not os.path.exists(self._temp_path):
+            os.makedirs(temp_dir, exist_ok=True)
+            path = os.path.join(temp_dir, f"page_{uuid.uuid4()}.jpg")
+            with open(path, "wb") as f:
+                f.write(self.jpeg)
+            TEMP_BYTES_WRITTEN.inc(len(self.jpeg), kind="page")
+            self._temp_path = path
+        return self._temp_path
+
+    def release(self):
+        """
+        Drops the pixel buffer, encodings, derived artifacts and the temp file
+        from write_temp once the last consumer is done. Size and digest stay
+        readable; pixel access raises.
+        """
+        if self._temp_path is not None:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+            self._temp_path = None
+        self._data = None
+        self._jpeg = None
+        self._base64 = None
+        self.derived = {}
+
+    def __getstate__(self):
+        # Ship pixels to worker processes, not memoized encodings or derived
+        # artifacts. Passthrough pages ship their (much smaller) JPEG stream
+        # instead. The temp path travels both ways, so a file written by
+        # write_temp in a worker is still removed by release() in the caller.
+        state = {"width": self.width, "height": self.height, "mode": self.mode, "source": self.source,
+                 "digest": self._digest, "temp_path": self._temp_path}
+        if self._data is None:
+            state["jpeg"] = self._jpeg
+        else:
+            state["data"] = self._data
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state.get("data"), state["width"], state["height"], state["mode"],
+                      jpeg=state.get("jpeg"), source=state.get("source", "rendered"), digest=state.get("digest"))
+        self._temp_path = state.get("temp_path")
+
+    def __repr__(self):
+        return f"Page({self.width}x{self.height} {self.mode})"
@@ -0,0 +1,252 @@
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from page import Page
+
+# Collapse near-duplicate pages in a request (the same scan uploaded as a JPG
+# and inside a PDF, the same file twice) before classification and extraction
+PAGE_DEDUP_ENABLED = os.environ.get("PAGE_DEDUP_ENABLED", "1") == "1"
+# Maximum Hamming distance (of 64 bits) for both the dHash and the pHash of a
+# candidate pair. Cards of different people share a template and often hash
+# this close, so every candidate is also compared pixel by pixel.
+PAGE_DEDUP_MAX_DISTANCE = int(os.environ.get("PAGE_DEDUP_MAX_DISTANCE", 8))
+# Verification: a candidate is a duplicate when no block of the aligned pages
+# has more than this fraction of pixels that differ (different names, numbers
+# or photos light up whole blocks; rescans and re-encodes stay at ~0)
+PAGE_DEDUP_MAX_DIFF = float(os.environ.get("PAGE_DEDUP_MAX_DIFF", 0.01))
+
+_THUMB_EDGE = 512       # grayscale thumbnail the hashes are computed from
+_TRIM_THRESHOLD = 25    # grey levels from the border colour that count as content
+_VERIFY_WIDTH = 400     # content width the verification compares at
+_VERIFY_ALIGN_WIDTH = 128
+_VERIFY_GRID = 16       # blocks per side
+_VERIFY_LEVEL = 1.0     # std devs outside the other page's 3x3 neighbourhood that count as "differs"
+_VERIFY_CANDIDATES = 4  # closest hash matches verified per page (bounds the cost of same-template batches)
+_HASH_CHUNK = 256       # pages per vectorised distance pass
+
+
+@dataclass
+class PageHash:
+    dhash: int
+    phash: int
+    aspect: float       # of the trimmed content, so a card and a card-on-A4 compare
+    box: Tuple[float, float, float, float]  # trimmed content, fractions of the page
+    elapsed: float
+
+
+@dataclass
+class DedupResult:
+    duplicate_of: List[Optional[int]]  # per page, the index of the kept page it duplicates
+    candidates: int                    # hash-close pairs that were verified
+    hash_ms: float
+    verify_ms: float
+
+
+def _thumbnail(page: Page, edge: int = _THUMB_EDGE) -> np.ndarray:
+    """Grayscale copy with a long edge of at most `edge`. Passthrough JPEGs are decoded at reduced scale (libjpeg DCT scaling)."""
+    if page.is_passthrough:
+        with Image.open(io.BytesIO(page.jpeg)) as img:
+            img.draft("L", (edge, edge))
+            gray = np.asarray(img.convert("L"))
+    else:
+        gray = page.array if page.mode == "L" else cv2.cvtColor(page.array, cv2.COLOR_RGB2GRAY)
+    h, w = gray.shape
+    scale = edge / float(max(h, w))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def _trim_box(gray: np.ndarray) -> Tuple[int, int, int, int]:
+    """(x0, y0, x1, y1) of the content inside the page margins (scan background)."""
+    h, w = gray.shape
+    border = np.concatenate([gray[0, :], gray[-1, :], gray[:, 0], gray[:, -1]]).astype(np.int16)
+    mask = np.abs(gray.astype(np.int16) - int(np.median(border))) > _TRIM_THRESHOLD
+    rows = np.where(mask.any(axis=1))[0]
+    cols = np.where(mask.any(axis=0))[0]
+    if len(rows) < 8 or len(cols) < 8:
+        return 0, 0, w, h
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def _bits(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask.flatten()).tobytes(), "big")
+
+
+def hash_page(page: Page) -> PageHash:
+    """dHash (9x8 gradients) and pHash (8x8 low DCT frequencies) of the page's trimmed content."""
+    start = time.perf_counter()
+    gray = _thumbnail(page)
+    h, w = gray.shape
+    x0, y0, x1, y1 = _trim_box(gray)
+    content = gray[y0:y1, x0:x1]
+    small = cv2.resize(content, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dhash = _bits(small[:, 1:] > small[:, :-1])
+    dct = cv2.dct(cv2.resize(content, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32))[:8, :8]
+    phash = _bits(dct > np.median(dct.flatten()[1:]))
+    return PageHash(dhash, phash, (x1 - x0) / float(y1 - y0), (x0 / w, y0 / h, x1 / w, y1 / h),
+                    time.perf_counter() - start)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits per uint64 (np.bitwise_count on NumPy 2, SWAR otherwise)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def find_duplicates(hashes: List[Optional[PageHash]], max_distance: int = PAGE_DEDUP_MAX_DISTANCE,
+                    verify: Optional[Callable[[int, int], bool]] = None) -> List[Optional[int]]:
+    """
+    For each page, the index of the earlier page it duplicates, or None.
+    Candidates of a page are the earlier pages within max_distance on both
+    hashes and within 10% on content aspect, found for _HASH_CHUNK pages at
+    a time in one vectorised pass. Then, greedy in input order, up to
+    _VERIFY_CANDIDATES candidates that were kept (not duplicates themselves)
+    are tried closest first through verify(kept_index, index) when given.
+    """
+    result: List[Optional[int]] = [None] * len(hashes)
+    valid = [i for i, h in enumerate(hashes) if h is not None]
+    if len(valid) < 2:
+        return result
+    dhash = np.array([hashes[i].dhash for i in valid], dtype=np.uint64)
+    phash = np.array([hashes[i].phash for i in valid], dtype=np.uint64)
+    aspect = np.array([hashes[i].aspect for i in valid], dtype=np.float64)
+    kept = np.zeros(len(valid), dtype=bool)
+    for first in range(0, len(valid), _HASH_CHUNK):
+        last = min(first + _HASH_CHUNK, len(valid))
+        d = _popcount(dhash[first:last, None] ^ dhash[None, :last]).astype(np.int32)
+        p = _popcount(phash[first:last, None] ^ phash[None, :last]).astype(np.int32)
+        close = (d <= max_distance) & (p <= max_distance) & (np.abs(aspect[None, :last] / aspect[first:last, None] - 1) < 0.1)
+        close &= np.arange(last)[None, :] < np.arange(first, last)[:, None]  # earlier pages only
+        has_candidates = close.any(axis=1)
+        kept[first:last] = ~has_candidates
+        for row in np.flatnonzero(has_candidates):
+            j = first + row
+            candidates = np.flatnonzero(close[row, :j] & kept[:j])
+            order = np.argsort(d[row, candidates] + p[row, candidates], kind="stable")
+            for k in candidates[order][:_VERIFY_CANDIDATES]:
+                if verify is None or verify(valid[k], valid[j]):
+                    result[valid[j]] = valid[k]
+                    break
+            else:
+                kept[j] = True
+    return result
+
+
+def _content(page: Page, box: Tuple[float, float, float, float]) -> np.ndarray:
+    """The trimmed content at _VERIFY_WIDTH (or its own width if smaller), float32 grayscale."""
+    x0, y0, x1, y1 = box
+    edge = int(_VERIFY_WIDTH / max(x1 - x0, 1e-3) * max(page.width, page.height) / float(page.width)) + 1
+    gray = _thumbnail(page, edge)
+    h, w = gray.shape
+    crop = gray[int(y0 * h):max(int(y0 * h) + 1, int(round(y1 * h))), int(x0 * w):max(int(x0 * w) + 1, int(round(x1 * w)))]
+    width = min(_VERIFY_WIDTH, crop.shape[1])
+    height = max(1, round(width * crop.shape[0] / crop.shape[1]))
+    return cv2.resize(crop, (width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def page_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Largest fraction of differing pixels in any block of two content images
+    (see _content), after aligning b onto a. A pixel differs when it lies
+    _VERIFY_LEVEL std devs outside the other image's 3x3 neighbourhood range,
+    which absorbs resampling, JPEG noise and sub-pixel misalignment.
+    """
+    if b.shape[1] < a.shape[1]:
+        a, b = b, a
+    b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_AREA)
+    a = cv2.GaussianBlur(a, (0, 0), 1.0)
+    b = cv2.GaussianBlur(b, (0, 0), 1.0)
+
+    # Affine alignment (scan rotation, trim offsets) estimated on small copies
+    scale = min(1.0, _VERIFY_ALIGN_WIDTH / float(a.shape[1]))
+    small_a = cv2.resize(a, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small_b = cv2.resize(b, (small_a.shape[1], small_a.shape[0]), interpolation=cv2.INTER_AREA)
+    warp = np.eye(2, 3, dtype=np.float32)
+    try:
+        _, warp = cv2.findTransformECC(small_a, small_b, warp, cv2.MOTION_AFFINE,
+                                       (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 100, 1e-5), None, 3)
+    except cv2.error:
+        return 1.0  # didn't converge: not the same page
+    warp[:, 2] /= scale
+    b = cv2.warpAffine(b, warp, (a.shape[1], a.shape[0]), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                       borderMode=cv2.BORDER_REPLICATE)
+
+    a = (a - a.mean()) / (a.std() + 1e-6)
+    b = (b - b.mean()) / (b.std() + 1e-6)
+    kernel = np.ones((3, 3), np.uint8)
+    outside = np.maximum(
+        np.maximum(a - cv2.dilate(b, kernel), cv2.erode(b, kernel) - a),
+        np.maximum(b - cv2.dilate(a, kernel), cv2.erode(a, kernel) - b),
+    ) > _VERIFY_LEVEL
+    h, w = outside.shape
+    g = min(_VERIFY_GRID, h, w)
+    blocks = outside[:h // g * g, :w // g * g].reshape(g, h // g, g, w // g).mean(axis=(1, 3))
+    return float(blocks.max())
+
+
+def dedupe_pages(pages: List[Page], max_distance: int = PAGE_DEDUP_MAX_DISTANCE,
+                 max_diff: float = PAGE_DEDUP_MAX_DIFF) -> DedupResult:
+    """
+    Finds the near-duplicate pages of a request (one pool task): hashes every
+    page, then verifies hash-close pairs with page_difference. Pages that
+    fail to hash are always kept.
+    """
+    hashes: List[Optional[PageHash]] = []
+    for page in pages:
+        try:
+            hashes.append(hash_page(page))
+        except Exception as e:
+            print(f"Page hash failed: {e}")
+            hashes.append(None)
+    hash_ms = sum(h.elapsed for h in hashes if h) * 1000
+
+    start = time.perf_counter()
+    contents: Dict[int, np.ndarray] = {}
+    candidates = 0
+
+    def verify(kept: int, index: int) -> bool:
+        nonlocal candidates
+        candidates += 1
+        for i in (kept, index):
+            if i not in contents:
+                contents[i] = _content(pages[i], hashes[i].box)
+        return page_difference(contents[kept], contents[index]) <= max_diff
+
+    duplicate_of = find_duplicates(hashes, max_distance, verify)
+    return DedupResult(duplicate_of, candidates, round(hash_ms, 1), round((time.perf_counter() - start) * 1000, 1))
+
+
+def expand_sources(documents: List[Dict[str, Any]], items: List[dict]):
+    """
+    Adds the filenames of collapsed duplicates (item["aliases"]) to every
+    document that cites the kept page's file, so each original upload still
+    appears in "Source Files".
+    """
+    aliases: Dict[str, List[str]] = {}
+    for item in items:
+        for alias in item.get("aliases", ()):
+            names = aliases.setdefault(item["filename"], [])
+            if alias not in names:
+                names.append(alias)
+    if not aliases:
+        return
+    for doc in documents:
+        sources = doc.get("Source Files")
+        if not isinstance(sources, list):
+            continue
+        for name in list(sources):
+            for alias in aliases.get(name, ()):
+                if alias not in sources:
+                    sources.append(alias)
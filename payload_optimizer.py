@@ -0,0 +1,118 @@
+import os
+import io
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from page import Page
+
+# Long edge cap for images sent to the LLM (pixels)
+LLM_MAX_LONG_EDGE = int(os.environ.get("LLM_MAX_LONG_EDGE", 1600))
+# Per-image JPEG byte budget; quality steps down until the image fits
+LLM_IMAGE_BYTE_BUDGET = int(os.environ.get("LLM_IMAGE_BYTE_BUDGET", 350_000))
+LLM_JPEG_QUALITIES = tuple(int(q) for q in os.environ.get("LLM_JPEG_QUALITIES", "90,82,74,66,58,50,40").split(","))
+
+# Background trimming: crop to the region that isn't near-white page margin
+LLM_TRIM_BACKGROUND = os.environ.get("LLM_TRIM_BACKGROUND", "1") == "1"
+LLM_TRIM_THRESHOLD = int(os.environ.get("LLM_TRIM_THRESHOLD", 40))   # gray-level distance from the background
+LLM_TRIM_MARGIN = float(os.environ.get("LLM_TRIM_MARGIN", 0.03))     # margin kept around content, fraction of page
+LLM_TRIM_MIN_GAIN = float(os.environ.get("LLM_TRIM_MIN_GAIN", 0.15)) # skip crops that remove less than this area
+
+# Trimming is decided on a thumbnail this size (long edge)
+_TRIM_PROBE_EDGE = 256
+
+
+@dataclass
+class Payload:
+    jpeg: bytes
+    size: Tuple[int, int]
+    quality: Optional[int]      # None when the original stream was passed through
+    bbox: Optional[Tuple[int, int, int, int]]  # crop applied, in page pixel coordinates
+    elapsed: float
+
+
+def settings_signature() -> str:
+    """Identifies the payload settings; part of the extraction cache key."""
+    return f"edge={LLM_MAX_LONG_EDGE};budget={LLM_IMAGE_BYTE_BUDGET};q={LLM_JPEG_QUALITIES};trim={LLM_TRIM_BACKGROUND}"
+
+
+def find_content_bbox(page: Page) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Finds the bounding box of the non-background region (the card on a mostly
+    white scan). Returns (x0, y0, x1, y1) in page pixels, or None if trimming
+    would not remove a meaningful part of the page.
+    """
+    if "content_bbox" in page.derived:
+        return page.derived["content_bbox"]
+
+    img = page.pil
+    scale = min(1.0, _TRIM_PROBE_EDGE / float(max(img.size)))
+    probe = img.convert("L")
+    if scale < 1.0:
+        probe = probe.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.BILINEAR)
+    gray = np.asarray(probe, dtype=np.int16)
+
+    # Background level from the border pixels (scans are not always pure white)
+    border = np.concatenate([gray[0, :], gray[-1, :], gray[:, 0], gray[:, -1]])
+    background = int(np.median(border))
+    mask = np.abs(gray - background) > LLM_TRIM_THRESHOLD
+
+    # Ignore rows/columns with only a few stray pixels (dust, scan noise)
+    rows = np.where(mask.sum(axis=1) > max(1, int(0.01 * mask.shape[1])))[0]
+    cols = np.where(mask.sum(axis=0) > max(1, int(0.01 * mask.shape[0])))[0]
+    bbox = None
+    if len(rows) and len(cols):
+        h, w = gray.shape
+        margin_y = int(LLM_TRIM_MARGIN * h)
+        margin_x = int(LLM_TRIM_MARGIN * w)
+        y0, y1 = max(0, rows[0] - margin_y), min(h, rows[-1] + 1 + margin_y)
+        x0, x1 = max(0, cols[0] - margin_x), min(w, cols[-1] + 1 + margin_x)
+        if (y1 - y0) * (x1 - x0) < (1.0 - LLM_TRIM_MIN_GAIN) * h * w:
+            # Map back to full-resolution coordinates
+            bbox = (
+                int(x0 / scale), int(y0 / scale),
+                min(img.width, int(round(x1 / scale))), min(img.height, int(round(y1 / scale))),
+            )
+
+    page.derived["content_bbox"] = bbox
+    return bbox
+
+
+def optimize_page_payload(page: Page) -> Payload:
+    """
+    Builds the JPEG sent to the LLM for a page: trimmed to the card region,
+    capped at LLM_MAX_LONG_EDGE, and encoded at the highest quality that fits
+    LLM_IMAGE_BYTE_BUDGET. Memoized on the page.
+    """
+    cached = page.derived.get("llm_payload")
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    # Passthrough pages (original JPEG from a scanned PDF) that already fit are sent untouched
+    if page.is_passthrough and len(page.jpeg) <= LLM_IMAGE_BYTE_BUDGET and max(page.size) <= LLM_MAX_LONG_EDGE:
+        payload = Payload(page.jpeg, page.size, None, None, time.perf_counter() - start)
+        page.derived["llm_payload"] = payload
+        return payload
+
+    img = page.pil
+    bbox = find_content_bbox(page) if LLM_TRIM_BACKGROUND else None
+    if bbox:
+        img = img.crop(bbox)
+    if max(img.size) > LLM_MAX_LONG_EDGE:
+        ratio = LLM_MAX_LONG_EDGE / float(max(img.size))
+        img = img.resize((max(1, round(img.width * ratio)), max(1, round(img.height * ratio))), Image.LANCZOS)
+
+    data, quality = b"", None
+    for quality in LLM_JPEG_QUALITIES:
+        buffered = io.BytesIO()
+        img.save(buffered, format="JPEG", quality=quality, optimize=True)
+        data = buffered.getvalue()
+        if len(data) <= LLM_IMAGE_BYTE_BUDGET:
+            break
+
+    payload = Payload(data, img.size, quality, bbox, time.perf_counter() - start)
+    page.derived["llm_payload"] = payload
+    return payload
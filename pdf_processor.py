@@ -1,24 +1,212 @@
+import io
 import os
-import fitz  # PyMuPDF
+import asyncio
+from typing import Iterator, Optional, Union
 from PIL import Image
-import io
+
+from page import Page
+from executors import run_cpu, run_io, cpu_executor
+
+# Resolution is picked per page from its physical size: the render targets a
+# long edge in pixels, clamped to a DPI range. A card-size page (3.4in) hits
+# the DPI ceiling at ~1000px; an A4 page (11.7in) lands near the old 2x zoom.
+PDF_TARGET_LONG_EDGE = int(os.environ.get("PDF_TARGET_LONG_EDGE", 1700))
+PDF_MIN_DPI = float(os.environ.get("PDF_MIN_DPI", 100))
+PDF_MAX_DPI = float(os.environ.get("PDF_MAX_DPI", 300))
+
+# Preview mode: grayscale, low resolution, for cheap downstream stages
+PDF_PREVIEW_LONG_EDGE = int(os.environ.get("PDF_PREVIEW_LONG_EDGE", 600))
+
+# Pages beyond the cap are never rendered
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", 20))
+
+# Fast path: pages that are just one embedded JPEG are passed through as-is
+PDF_EMBEDDED_FAST_PATH = os.environ.get("PDF_EMBEDDED_FAST_PATH", "1") == "1"
+PDF_EMBEDDED_MIN_COVERAGE = float(os.environ.get("PDF_EMBEDDED_MIN_COVERAGE", 0.9))
+
+# PDFs with at least this many pages are rendered across the process pool
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 4))
+PDF_MIN_PAGES_PER_TASK = int(os.environ.get("PDF_MIN_PAGES_PER_TASK", 2))
+
+PdfSource = Union[str, bytes]
+
+def open_pdf(source: PdfSource):
+    """Opens a PDF from a path or from in-memory bytes."""
+    import fitz  # PyMuPDF; imported on first use, so image-only workers never load it
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+def choose_dpi(rect, preview: bool = False) -> float:
+    """Picks a render DPI from the page's physical size (PDF units are 1/72 inch)."""
+    long_edge_inches = max(rect.width, rect.height) / 72.0
+    if long_edge_inches <= 0:
+        return PDF_MIN_DPI
+    target = PDF_PREVIEW_LONG_EDGE if preview else PDF_TARGET_LONG_EDGE
+    dpi = target / long_edge_inches
+    if preview:
+        return min(dpi, PDF_MAX_DPI)
+    return max(PDF_MIN_DPI, min(PDF_MAX_DPI, dpi))
+
+def _has_visible_text(pdf_page) -> bool:
+    # Scanner apps often add an invisible OCR text layer (render mode 3);
+    # that doesn't change what the page looks like, so it doesn't count.
+    try:
+        return any(span.get("type") != 3 for span in pdf_page.get_texttrace())
+    except Exception:
+        return bool(pdf_page.get_text("text").strip())
+
+def extract_embedded_page(pdf_page) -> Optional[Page]:
+    """
+    Fast path for scanned pages: if the page is nothing but one JPEG covering
+    (almost) the whole page, upright and without vector or visible text content,
+    return the original compressed stream as a Page. Otherwise None.
+    """
+    if pdf_page.rotation:
+        return None
+    images = pdf_page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    xref = images[0][0]
+
+    placements = pdf_page.get_image_rects(xref, transform=True)
+    if len(placements) != 1:
+        return None
+    rect, matrix = placements[0]
+    # Upright and not mirrored: no rotation/shear terms, positive scale
+    if matrix.b != 0 or matrix.c != 0 or matrix.a <= 0 or matrix.d <= 0:
+        return None
+    if rect.get_area() < PDF_EMBEDDED_MIN_COVERAGE * pdf_page.rect.get_area():
+        return None
+    if _has_visible_text(pdf_page) or pdf_page.get_drawings():
+        return None
+
+    info = pdf_page.parent.extract_image(xref)
+    if not info or info.get("ext") not in ("jpeg", "jpg") or info.get("smask"):
+        return None
+    mode = {1: "L", 3: "RGB"}.get(info.get("colorspace"))
+    if mode is None:
+        # CMYK and other colourspaces need a conversion anyway
+        return None
+    return Page.from_jpeg(info["image"], info["width"], info["height"], mode)
+
+def render_page(pdf_page, preview: bool = False) -> Page:
+    """
+    Turns one fitz page into a Page: the embedded-JPEG fast path when it applies,
+    otherwise a render (RGB, or grayscale in preview mode).
+    """
+    if PDF_EMBEDDED_FAST_PATH and not preview:
+        try:
+            page = extract_embedded_page(pdf_page)
+            if page is not None:
+                return page
+        except Exception as e:
+            print(f"Embedded image fast path failed, rendering instead: {e}")
+
+    import fitz
+    zoom = choose_dpi(pdf_page.rect, preview) / 72.0
+    colorspace = fitz.csGRAY if preview else fitz.csRGB
+    pix = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    return Page.from_pixmap(pix)
+
+def iter_pdf_pages(source: PdfSource, max_pages: int = PDF_MAX_PAGES, preview: bool = False) -> Iterator[Page]:
+    """
+    Lazily renders pages one at a time, stopping at max_pages.
+    Only the page being consumed is held in memory.
+    """
+    doc = open_pdf(source)
+    try:
+        if len(doc) > max_pages:
+            print(f"PDF has {len(doc)} pages; only the first {max_pages} will be rendered.")
+        for page_num in range(min(len(doc), max_pages)):
+            yield render_page(doc.load_page(page_num), preview)
+    finally:
+        doc.close()
+
+def render_page_range(source: PdfSource, start: int, stop: int, preview: bool = False) -> list[Page]:
+    """Renders pages [start, stop). Picklable unit of work for the process pool."""
+    doc = open_pdf(source)
+    try:
+        return [render_page(doc.load_page(n), preview) for n in range(start, min(stop, len(doc)))]
+    finally:
+        doc.close()
+
+def pdf_page_count(source: PdfSource) -> int:
+    doc = open_pdf(source)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+def pdf_page_sizes(source: PdfSource, max_pages: int = PDF_MAX_PAGES, preview: bool = False) -> list[tuple]:
+    """
+    (width, height, channels) each page will be decoded to, from the page
+    geometry alone: nothing is rendered. Pages that take the embedded-JPEG
+    fast path may decode to a different size; this is an estimate.
+    """
+    doc = open_pdf(source)
+    try:
+        sizes = []
+        for page_num in range(min(len(doc), max_pages)):
+            rect = doc.load_page(page_num).rect
+            zoom = choose_dpi(rect, preview) / 72.0
+            sizes.append((int(rect.width * zoom), int(rect.height * zoom), 1 if preview else 3))
+        return sizes
+    finally:
+        doc.close()
+
+def render_pdf_pages(source: PdfSource, max_pages: int = PDF_MAX_PAGES, preview: bool = False) -> list[Page]:
+    """
+    Render the pages of a PDF straight from the pixmap buffer into Pages.
+    No PNG encode/decode and nothing written to disk.
+    """
+    try:
+        return list(iter_pdf_pages(source, max_pages, preview))
+    except Exception as e:
+        print(f"Error converting PDF to images: {e}")
+        return []
+
+async def render_pdf_pages_parallel(source: PdfSource, max_pages: int = PDF_MAX_PAGES, preview: bool = False) -> list[Page]:
+    """
+    Renders a PDF on the CPU process pool. Small PDFs are one task; larger
+    ones are split into page ranges rendered concurrently, returned in order.
+    """
+    try:
+        page_count = min(await run_io(pdf_page_count, source), max_pages)
+    except Exception as e:
+        print(f"Error converting PDF to images: {e}")
+        return []
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        return await run_cpu(render_pdf_pages, source, max_pages, preview)
+
+    # One contiguous range per pool worker (at most), so a single PDF never
+    # floods the pool's queue
+    tasks = max(1, min(cpu_executor.max_workers, page_count // PDF_MIN_PAGES_PER_TASK))
+    per_task = -(-page_count // tasks)
+    ranges = [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+    chunks = await asyncio.gather(*(run_cpu(render_page_range, source, start, stop, preview) for start, stop in ranges))
+    return [page for chunk in chunks for page in chunk]
 
 def convert_pdf_to_images(pdf_path: str) -> list[Image.Image]:
     """
     Convert a PDF file to a list of PIL Images using PyMuPDF (fitz).
     This removes the dependency on Poppler.
     """
-    images = []
+    return [page.pil for page in render_pdf_pages(pdf_path)]
+
+def image_size(source: Union[str, bytes]) -> Optional[tuple]:
+    """(width, height, channels) of an uploaded image from its header, without decoding the pixels."""
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as img:
+            return (img.width, img.height, 1 if img.mode == "L" else 3)
+    except Exception:
+        return None
+
+def load_image_page(source: Union[str, bytes]) -> Optional[Page]:
+    """Decodes an uploaded image (path or in-memory bytes) into a Page. Returns None if it can't be read."""
     try:
-        doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # Zoom=2 for better resolution
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            images.append(img)
-        return images
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as img:
+            return Page.from_pil(img)
     except Exception as e:
-        print(f"Error converting PDF to images: {e}")
-        return []
-        
\ No newline at end of file
+        print(f"Image load failed: {e}")
+        return None
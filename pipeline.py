@@ -0,0 +1,412 @@
+import time
+import asyncio
+from typing import List
+
+from pdf_processor import render_pdf_pages_parallel, load_image_page, pdf_page_count, PDF_MAX_PAGES
+from ingest import IngestedFile
+from llm_extractor import backend, LLMExtractionError, LLMDeadlineExceeded
+from llm_scheduler import request_deadline
+from tiered_extractor import iter_documents_tiered
+from extraction_cache import extraction_cache
+from face_extractor import extract_faces, photo_regions
+from executors import run_cpu, run_io, admit_request, QueueFullError
+from identity_resolver import IdentityResolver, identity_index, normalize_name
+from document_classifier import label_pages, DOC_CLASSIFIER_ENABLED, DOC_CLASSIFIER_DROP, DROP_LABELS
+from memory_budget import memory_budget, estimate_request_bytes, page_cost, MemoryBudgetRejected
+from page_dedup import dedupe_pages, expand_sources, PAGE_DEDUP_ENABLED
+from metrics import span, trace_request, PAGES_PER_REQUEST, FACE_DETECTIONS, DEDUP_PAGES, DEDUP_BYTES_SAVED, PDF_PAGE_LIMIT_REJECTIONS
+
+FACES_DIR = "static/faces"
+
+
+class ProcessingError(Exception):
+    """
+    A request-level failure with the HTTP status it maps to. Raised by the
+    pipeline instead of HTTPException so it can also run outside FastAPI.
+    """
+
+    def __init__(self, status_code: int, detail: str, headers: dict = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+async def classify_pages(items: List[dict], request_metrics: dict) -> List[dict]:
+    """
+    Sets "doc_type" on each page item; returns the items that should be extracted.
+    All pages are labelled in one pool task, so a large request takes one CPU slot.
+    """
+    try:
+        results = await run_cpu(label_pages, [item["page"] for item in items])
+    except QueueFullError:
+        raise
+    except Exception as e:
+        print(f"Classification failed: {e!r}")
+        results = [None] * len(items)
+    kept = []
+    labels = {}
+    for item, result in zip(items, results):
+        if result is None:
+            # A classifier failure never loses a page: extract it with the generic prompt
+            print(f"Page of {item['filename']} was not classified; using the generic prompt")
+            kept.append(item)
+            continue
+        item["doc_type"] = result.label
+        labels[result.label] = labels.get(result.label, 0) + 1
+        if DOC_CLASSIFIER_DROP and result.label in DROP_LABELS:
+            print(f"Dropping page of {item['filename']}: classified {result.label}")
+            continue
+        kept.append(item)
+    request_metrics["page_labels"] = labels
+    request_metrics["pages_dropped"] = len(items) - len(kept)
+    request_metrics["classify_ms"] = round(sum(r.elapsed for r in results if r is not None) * 1000, 1)
+    return kept
+
+
+async def collapse_duplicates(items: List[dict], request_metrics: dict) -> List[dict]:
+    """
+    Drops near-duplicate pages (see page_dedup). The kept page counts how many
+    it stands in for ("duplicates") and lists their filenames ("aliases").
+    Returns the kept items; on a dedup failure every page is kept.
+    """
+    try:
+        result = await run_cpu(dedupe_pages, [item["page"] for item in items])
+    except QueueFullError:
+        raise
+    except Exception as e:
+        print(f"Page dedup failed: {e!r}")
+        return items
+    kept = []
+    for item, original in zip(items, result.duplicate_of):
+        if original is None:
+            kept.append(item)
+            continue
+        rep = items[original]
+        print(f"Page of {item['filename']} duplicates a page of {rep['filename']}")
+        rep["duplicates"] = rep.get("duplicates", 0) + 1
+        aliases = rep.setdefault("aliases", [])
+        if item["filename"] != rep["filename"] and item["filename"] not in aliases:
+            aliases.append(item["filename"])
+    request_metrics["pages_deduped"] = len(items) - len(kept)
+    request_metrics["dedup_candidates"] = result.candidates
+    request_metrics["dedup_ms"] = round(result.hash_ms + result.verify_ms, 1)
+    DEDUP_PAGES.inc(len(items) - len(kept))
+    return kept
+
+
+async def process_ingested_files(request_id: str, ingested_files: List[IngestedFile], progress=None,
+                                 priority: str = "interactive", on_document=None):
+    """
+    Runs the pipeline (render, dedup, classify, extract, merge + faces, validate) on already-ingested uploads.
+    `progress(stage, **details)`, if given, is called after each stage.
+    `on_document(event)`, if given, is called as each extracted record is
+    merged ({"type": "document", "identity": i, "document": record}) and as
+    each identity's photo is found ({"type": "photo", "identity": i, "path": path}).
+    Rendering waits until the request's estimated decoded size fits the memory budget.
+    Stages are timed as spans on a trace tagged with request_id (see metrics).
+    `priority` ("interactive" or "bulk") sets the request's deadline, which
+    orders and sheds its LLM calls (see llm_scheduler).
+    Spilled upload files are removed when done. Returns (request_id, final_docs)
+    """
+    with trace_request(request_id), request_deadline(priority):
+        return await _run_pipeline(request_id, ingested_files, progress, on_document)
+
+
+async def _run_pipeline(request_id: str, ingested_files: List[IngestedFile], progress=None, on_document=None):
+    def report(stage, **details):
+        if progress:
+            progress(stage, **details)
+
+    def notify(event):
+        if on_document:
+            on_document(event)
+
+    all_images_with_filenames = []
+    request_metrics = {"files": len(ingested_files), "upload_bytes": sum(f.size for f in ingested_files),
+                       "pages": 0, "pdf_pages": 0, "pdf_fast_path_pages": 0}
+    reservation = None
+
+    def release_pages(items):
+        # Frees page buffers whose last consumer is done and returns their share of the budget
+        for item in items:
+            if item.get("released"):
+                continue
+            page = item["page"]
+            if reservation:
+                reservation.shrink(page_cost(page.width, page.height, 1 if page.mode == "L" else 3))
+            page.release()
+            item["released"] = True
+    
+    try:
+        if not backend:
+             raise ProcessingError(status_code=500, detail="LLM Client not initialized. Check server logs/API Key.")
+        # Backpressure is per request: once admitted, the request's pool tasks wait for slots
+        admit_request()
+
+        # A PDF over the page cap is refused outright, not cut short: dropped
+        # pages could hold the card side the merge needs
+        for ingested in ingested_files:
+            if ingested.kind != "pdf":
+                continue
+            try:
+                page_count = await run_io(pdf_page_count, ingested.source)
+            except Exception:
+                continue  # unreadable; the render step reports and skips it
+            if page_count > PDF_MAX_PAGES:
+                PDF_PAGE_LIMIT_REJECTIONS.inc()
+                raise ProcessingError(status_code=413, detail=f"PDF '{ingested.filename}' has {page_count} pages; the limit is {PDF_MAX_PAGES}.")
+
+        # Admission: reserve the estimated decoded size before anything is rendered
+        if memory_budget.enabled:
+            with span("admit"):
+                estimate = await run_io(estimate_request_bytes, ingested_files)
+                reservation = await memory_budget.acquire(estimate)
+            request_metrics["memory_estimate_mb"] = round(estimate / (1024 * 1024), 1)
+
+        for ingested in ingested_files:
+            try:
+                # Decode to Pages (CPU-bound -> process pool). Pages stay in memory;
+                # nothing is re-encoded to disk.
+                if ingested.kind == "pdf":
+                    with span("render", kind="pdf"):
+                        pages = await render_pdf_pages_parallel(ingested.source)
+                    request_metrics["pdf_pages"] += len(pages)
+                    request_metrics["pdf_fast_path_pages"] += sum(1 for p in pages if p.source == "embedded")
+                else:
+                    with span("render", kind=ingested.kind):
+                        page = await run_cpu(load_image_page, ingested.source)
+                    if page is None:
+                        print(f"Image load failed for {ingested.filename}")
+                        continue
+                    pages = [page]
+
+                # Add to collection
+                for page in pages:
+                    all_images_with_filenames.append({
+                        "page": page,
+                        "filename": ingested.filename,
+                        "upload_sha256": ingested.sha256,
+                    })
+
+            except QueueFullError:
+                raise
+            except Exception as e:
+                print(f"Error processing file {ingested.filename}: {e}")
+                continue
+
+        if not all_images_with_filenames:
+             raise ProcessingError(status_code=400, detail="No valid images found in upload.")
+
+        request_metrics["pages"] = len(all_images_with_filenames)
+        PAGES_PER_REQUEST.observe(request_metrics["pages"])
+        if request_metrics["pdf_pages"]:
+             request_metrics["pdf_fast_path_ratio"] = round(request_metrics["pdf_fast_path_pages"] / request_metrics["pdf_pages"], 3)
+        report("rendered", pages=request_metrics["pages"])
+
+        # Near-duplicate pages (the same scan as a JPG and inside a PDF, a file sent
+        # twice) are collapsed before they cost a classification and an LLM image
+        if PAGE_DEDUP_ENABLED and len(all_images_with_filenames) > 1:
+            with span("dedup", pages=len(all_images_with_filenames)):
+                kept = await collapse_duplicates(all_images_with_filenames, request_metrics)
+            kept_ids = {id(item) for item in kept}
+            release_pages([item for item in all_images_with_filenames if id(item) not in kept_ids])
+            all_images_with_filenames = kept
+            report("deduplicated", pages=len(kept), duplicates=request_metrics.get("pages_deduped", 0))
+
+        # Local classification: label each page for type-specific prompts and
+        # drop blank / non-ID pages before they cost LLM tokens
+        if DOC_CLASSIFIER_ENABLED:
+            with span("classify"):
+                kept = await classify_pages(all_images_with_filenames, request_metrics)
+            kept_ids = {id(item) for item in kept}
+            release_pages([item for item in all_images_with_filenames if id(item) not in kept_ids])
+            all_images_with_filenames = kept
+            if not all_images_with_filenames:
+                raise ProcessingError(status_code=400, detail="No identity documents found in upload.")
+            report("classified", pages=len(all_images_with_filenames), dropped=request_metrics["pages_dropped"])
+
+        # Face crops per page (keyed by item id): a page is scanned at most once
+        # per request, however many documents list it as a source
+        face_by_page = {}
+
+        async def get_face_photo(doc):
+             source_filenames = doc.get("Source Files", [])
+             
+             candidates = [item for item in all_images_with_filenames if item["filename"] in source_filenames]
+             for item in candidates:
+                  if face_by_page.get(id(item)):
+                       return face_by_page[id(item)]
+
+             pending = [item for item in candidates if id(item) not in face_by_page]
+             if not pending:
+                  return None
+
+             # One pool task for the unscanned candidates; stops at the first page with a face.
+             # Each page is searched in its card's photo region first (by classifier label or
+             # document type); pages that can't hold a photo are skipped.
+             # Crops go to the content-addressed store in FACES_DIR
+             regions = [photo_regions(doc, item.get("doc_type")) for item in pending]
+             with span("faces", pages=len(pending)):
+                  face_paths = await run_cpu(extract_faces, [item["page"] for item in pending], FACES_DIR,
+                                             first_only=True, regions=regions)
+             for item, path in zip(pending, face_paths):
+                  face_by_page[id(item)] = path
+                  if path:
+                       # Pages after the first hit were not scanned
+                       FACE_DETECTIONS.inc(result="hit")
+                       return path
+             FACE_DETECTIONS.inc(result="miss")
+             return None
+
+        # --- Identity Merging Logic ---
+        # Hash-indexed on normalized Aadhar / PAN / name: one lookup per record.
+        # Records are merged as they stream out of the extractor, and each
+        # identity's photo search starts on its first record while the LLM is
+        # still producing the rest. Per identity, records are searched in
+        # arrival order until one has a face (the first photo is kept).
+        resolver = IdentityResolver()
+        extracted_documents = []
+        face_queues = {}   # identity index -> records still to search
+        face_tasks = {}    # identity index -> running photo search
+
+        async def find_photo(index, identity):
+             queue = face_queues[index]
+             while queue and "Photo Path" not in identity:
+                  photo_path = await get_face_photo(queue.pop(0))
+                  if photo_path:
+                       identity["Photo Path"] = photo_path
+                       notify({"type": "photo", "identity": index, "path": photo_path})
+
+        try:
+             # Tiered Extraction: local OCR + validators first (if enabled), LLM for the rest
+             print(f"extracting documents from {len(all_images_with_filenames)} images...")
+             started = time.perf_counter()
+             with span("extract"):
+                  async for doc in iter_documents_tiered(backend, all_images_with_filenames, cache=extraction_cache, metrics=request_metrics):
+                       if not extracted_documents:
+                            request_metrics["first_document_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                       # A collapsed page still counts under every filename it was uploaded as
+                       if request_metrics.get("pages_deduped"):
+                            expand_sources([doc], all_images_with_filenames)
+                       extracted_documents.append(doc)
+
+                       index = resolver.match(doc)
+                       index = len(resolver.identities) if index is None else index
+                       identity = resolver.add(doc)
+                       notify({"type": "document", "identity": index, "document": doc})
+                       # An identity that already has a photo needs no new crop
+                       if "Photo Path" not in identity:
+                            face_queues.setdefault(index, []).append(doc)
+                            if index not in face_tasks or face_tasks[index].done():
+                                 face_tasks[index] = asyncio.create_task(find_photo(index, identity))
+
+             if not extracted_documents:
+                  raise ProcessingError(status_code=400, detail="No valid documents detected.")
+             report("extracted", documents=len(extracted_documents))
+
+             if request_metrics.get("pages_deduped"):
+                  # Each duplicate would have cost another copy of its kept page's payload
+                  saved = sum(len(item["page"].derived["llm_payload"].jpeg) * item.get("duplicates", 0)
+                              for item in all_images_with_filenames if "llm_payload" in item["page"].derived)
+                  request_metrics["llm_images_saved"] = sum(item.get("duplicates", 0) for item in all_images_with_filenames)
+                  request_metrics["llm_bytes_saved"] = saved
+                  DEDUP_BYTES_SAVED.inc(saved)
+
+             # From here pages are only needed for face crops, and only those a document names as a source
+             face_sources = {name for doc in extracted_documents for name in doc.get("Source Files", [])}
+             release_pages([item for item in all_images_with_filenames if item["filename"] not in face_sources])
+
+             # Spans: "merge" covers the photo searches still running and the index link
+             with span("merge", documents=len(extracted_documents)):
+                  await asyncio.gather(*face_tasks.values())
+                  merged_results = resolver.identities
+                  request_metrics["face_pages_scanned"] = len(face_by_page)
+                  release_pages(all_images_with_filenames)
+
+                  # Link to identities from earlier requests (optional persistent index)
+                  if identity_index is not None:
+                       await run_io(identity_index.link, merged_results)
+        finally:
+             # Settle photo searches before the pages they read are released
+             for task in face_tasks.values():
+                  task.cancel()
+             await asyncio.gather(*face_tasks.values(), return_exceptions=True)
+
+        report("faces", identities=len(merged_results), photos=sum(1 for d in merged_results if d.get("Photo Path")))
+
+        # --- Final Validation on Merged Identities ---
+        final_valid_docs = []
+        
+        # Validation State Helpers
+        has_pan = False
+        has_dl = False
+        pan_name = ""
+        dl_name = ""
+
+        for doc in merged_results:
+             doc_type = doc.get("Document Type", "")
+             
+             # 1. Aadhar Completeness Check
+             if "Aadhar" in doc_type:
+                 sides = [s.lower() for s in doc.get("Sides Detected", [])]
+                 has_front = "front" in sides
+                 has_back = "back" in sides
+                 
+                 if not (has_front and has_back):
+                      raise ProcessingError(status_code=400, detail="Incomplete Aadhar Card. Please upload both Front and Back sides.")
+             
+             # Track PAN/DL for Pairing Check
+             if "PAN" in doc_type:
+                 has_pan = True
+                 pan_name = normalize_name(doc.get("Name", ""))
+             
+             if "Driving Licence" in doc_type:
+                 has_dl = True
+                 dl_name = normalize_name(doc.get("Name", ""))
+
+             # Cleanup internal keys
+             if "Sides Detected" in doc: del doc["Sides Detected"]
+             
+             final_valid_docs.append(doc)
+
+        # 2. PAN & DL Pairing Check
+        if (has_pan and not has_dl) or (has_dl and not has_pan):
+             raise ProcessingError(status_code=400, detail="Incomplete Submission. Please upload BOTH PAN Card and Driving Licence.")
+
+        # 3. Name Mismatch Check
+        if has_pan and has_dl:
+             if pan_name != dl_name:
+                  raise ProcessingError(status_code=400, detail=f"Name Mismatch. PAN Name ('{pan_name}') does not match Driving Licence Name ('{dl_name}'). Please ensure documents belong to the same person.")
+
+        if not final_valid_docs:
+             raise ProcessingError(status_code=400, detail="No valid documents processed.")
+        report("validated", documents=len(final_valid_docs))
+
+        return request_id, final_valid_docs
+
+    except ProcessingError:
+        raise
+    except LLMDeadlineExceeded as de:
+        print(f"Request ID: {request_id} - LLM calls shed or timed out: {de}")
+        raise ProcessingError(status_code=503, detail="Document extraction is overloaded. Please retry shortly.", headers={"Retry-After": "10"})
+    except LLMExtractionError as le:
+        print(f"Request ID: {request_id} - LLM extraction failed: {le}")
+        raise ProcessingError(status_code=502, detail="Document extraction service is unavailable. Please retry shortly.", headers={"Retry-After": "10"})
+    except MemoryBudgetRejected as mb:
+        print(f"Request ID: {request_id} - Rejected by memory budget: {mb.detail}")
+        raise ProcessingError(status_code=mb.status_code, detail=mb.detail,
+                              headers={"Retry-After": "5"} if mb.status_code == 503 else None)
+    except QueueFullError as qe:
+        print(f"Request ID: {request_id} - Rejected, server busy: {qe}")
+        raise ProcessingError(status_code=503, detail="Server is busy. Please retry shortly.", headers={"Retry-After": "5"})
+    except Exception as e:
+        print(f"Error processing files: {e}")
+        raise ProcessingError(status_code=500, detail=str(e))
+    finally:
+        if reservation:
+            reservation.release()
+        print(f"Request ID: {request_id} - metrics: {request_metrics}")
+        # Cleanup spilled uploads (the job API hands over ownership, so this runs here)
+        for ingested in ingested_files:
+            ingested.cleanup()
@@ -0,0 +1,184 @@
+import io
+import os
+import uuid
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+from face_store import FACE_STORE_TTL
+
+# Response modes for /extract/ (and job results):
+#   full      - Photo Path + Photo URL + full-size Photo Base64 (the original shape)
+#   url       - Photo URL only; clients fetch (and cache) the face separately
+#   thumbnail - Photo URL + a small inline Photo Thumbnail Base64
+#   multipart - multipart/mixed: the url-mode JSON, then each face as a binary part
+RESPONSE_MODES = ("full", "url", "thumbnail", "multipart")
+RESPONSE_MODE_DEFAULT = os.environ.get("RESPONSE_MODE_DEFAULT", "full")
+
+# Thumbnail long edge (pixels) and JPEG quality
+FACE_THUMBNAIL_EDGE = int(os.environ.get("FACE_THUMBNAIL_EDGE", 128))
+FACE_THUMBNAIL_QUALITY = int(os.environ.get("FACE_THUMBNAIL_QUALITY", 70))
+# Faces are never rewritten under the same name, so they are immutable; but they
+# are KYC photos, so only the client may keep them (never a shared proxy/CDN),
+# and no longer than the face store does
+FACE_CACHE_CONTROL = os.environ.get("FACE_CACHE_CONTROL", f"private, max-age={int(FACE_STORE_TTL)}, immutable")
+
+_MEMO_ENTRIES = 1024
+
+
+class _Memo:
+    """Small thread-safe LRU keyed on (path, mtime, size), so a rewritten file is never served stale."""
+
+    def __init__(self, max_entries: int = _MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_etags = _Memo()
+_thumbnails = _Memo()
+
+
+def _stat_key(path: str, stat_result: Optional[os.stat_result] = None) -> Tuple[str, int, int]:
+    st = stat_result or os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+def face_etag(path: str, stat_result: Optional[os.stat_result] = None) -> str:
+    """Strong ETag: a hash of the file content (memoized per file version)."""
+    key = _stat_key(path, stat_result)
+    etag = _etags.get(key)
+    if etag is None:
+        with open(path, "rb") as f:
+            etag = f'"{hashlib.sha256(f.read()).hexdigest()[:32]}"'
+        _etags.put(key, etag)
+    return etag
+
+
+def face_thumbnail(path: str) -> bytes:
+    """Downscaled JPEG of a face crop (memoized per file version)."""
+    key = _stat_key(path)
+    thumb = _thumbnails.get(key)
+    if thumb is None:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+            img.thumbnail((FACE_THUMBNAIL_EDGE, FACE_THUMBNAIL_EDGE), Image.LANCZOS)
+            buffered = io.BytesIO()
+            img.save(buffered, format="JPEG", quality=FACE_THUMBNAIL_QUALITY, optimize=True)
+            thumb = buffered.getvalue()
+        _thumbnails.put(key, thumb)
+    return thumb
+
+
+class FaceStaticFiles(StaticFiles):
+    """
+    StaticFiles for extracted faces: content-hash ETags (instead of
+    mtime/size) and long-lived Cache-Control, so a client that already has
+    a face gets a 304 or never asks again.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        headers = {"ETag": face_etag(str(full_path), stat_result), "Cache-Control": FACE_CACHE_CONTROL}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def photo_url(path: str) -> str:
+    """static/faces/abcd.jpg -> /static/faces/abcd.jpg (forward slashes)."""
+    rel_path = path.replace("\\", "/")
+    if not rel_path.startswith("/"):
+        rel_path = "/" + rel_path
+    return rel_path
+
+
+def format_documents(final_docs: List[dict], mode: str = "full") -> List[dict]:
+    """
+    Converts Photo Paths to URLs for the JSON response. In "full" mode the
+    photo is also inlined as Base64; in "thumbnail" mode a small thumbnail is.
+    "url" and "multipart" only carry the URL.
+    """
+    json_docs = []
+    for doc in final_docs:
+        d = doc.copy()
+        path = d.get("Photo Path")
+        if path:
+            if mode == "full":
+                # Original shape: path, URL and the full crop inline
+                try:
+                    # Photo Path is relative to cwd (e.g. static/faces/...)
+                    if os.path.exists(path):
+                        with open(path, "rb") as image_file:
+                            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+                            d["Photo Base64"] = f"data:image/jpeg;base64,{encoded_string}"
+                except Exception as e:
+                    print(f"Error encoding base64 for {path}: {e}")
+                d["Photo Path"] = photo_url(path)
+            else:
+                # The URL is enough for the client to fetch (and cache) the face
+                del d["Photo Path"]
+            if mode == "thumbnail":
+                try:
+                    encoded_string = base64.b64encode(face_thumbnail(path)).decode('utf-8')
+                    d["Photo Thumbnail Base64"] = f"data:image/jpeg;base64,{encoded_string}"
+                except Exception as e:
+                    print(f"Error building thumbnail for {path}: {e}")
+            d["Photo URL"] = photo_url(path)
+        json_docs.append(d)
+    return json_docs
+
+
+def photo_files(final_docs: List[dict]) -> Dict[str, str]:
+    """Photo URL -> file path for every existing face in the results."""
+    return {photo_url(d["Photo Path"]): d["Photo Path"] for d in final_docs
+            if d.get("Photo Path") and os.path.exists(d["Photo Path"])}
+
+
+def multipart_body(payload: bytes, photos: Dict[str, str], boundary: str,
+                   chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Yields a multipart/mixed body: the JSON payload first, then each face
+    as image/jpeg with its Photo URL in Content-Location. Face files are
+    streamed in chunks, so the body is never assembled in memory.
+    """
+    yield (f"--{boundary}\r\nContent-Type: application/json\r\n"
+           f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload + b"\r\n"
+    for url, path in photos.items():
+        try:
+            size = os.path.getsize(path)
+            f = open(path, "rb")
+        except OSError as e:
+            print(f"Error reading face {path}: {e}")
+            continue
+        with f:
+            yield (f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {size}\r\n"
+                   f"Content-Location: {url}\r\nETag: {face_etag(path)}\r\n\r\n").encode()
+            while chunk := f.read(chunk_size):
+                yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def new_boundary() -> str:
+    return f"faces-{uuid.uuid4().hex}"
@@ -0,0 +1,152 @@
+"""
+Production server: one master process, N preforked uvicorn workers.
+
+The master binds the listening socket, imports the heavy modules and
+loads the models once (warmup.preload), freezes the GC so those objects'
+pages stay shared, then forks the workers. Each worker imports the app
+itself (LLM client, SQLite stores and pools are per process), starts its
+CPU pool and reports ready on GET /ready. Workers that die are restarted;
+SIGTERM / SIGINT stop them gracefully, then by SIGKILL after
+SERVER_GRACEFUL_TIMEOUT.
+
+Each worker has its own CPU pool, so by default the cores are split
+between workers (CPU_WORKERS = cores // workers). Per-process limits
+(LLM_MAX_CONCURRENCY, CPU_QUEUE_DEPTH, JOB_WORKERS, caches) apply per worker.
+
+The default is one worker. More than one needs JOB_STORE=sqlite, so a job
+can be polled from whichever worker answers. A starting worker fails the
+unfinished jobs of earlier server runs and of its own previous process, never
+a running sibling's. GET /metrics describes the worker that answers the scrape, not the
+server as a whole.
+
+Usage:
+    python server.py --workers 4 --port 8000
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import uuid
+import argparse
+from typing import Dict
+
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 1))
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", 8000))
+SERVER_BACKLOG = int(os.environ.get("SERVER_BACKLOG", 2048))
+# Seconds workers get to finish in-flight requests on shutdown
+SERVER_GRACEFUL_TIMEOUT = float(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+# Pause before restarting a worker that exited, so a crash loop doesn't spin
+SERVER_RESPAWN_DELAY = float(os.environ.get("SERVER_RESPAWN_DELAY", 1))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(SERVER_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, index: int, log_level: str):
+    """Worker process body: serves main:app on the inherited socket until signalled."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    os.environ["SERVER_WORKER_INDEX"] = str(index)
+    import uvicorn
+    config = uvicorn.Config("main:app", log_level=log_level, timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, index: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, index, log_level)
+        except BaseException as e:
+            print(f"Worker {index} crashed: {e!r}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    print(f"Started worker {index} (pid {pid})")
+    return pid
+
+
+def serve(workers: int, host: str, port: int, log_level: str = "info"):
+    from dotenv import load_dotenv
+    load_dotenv()
+    if workers > 1 and os.environ.get("JOB_STORE", "memory") != "sqlite":
+        # Each worker would hold its own in-memory jobs: GET /jobs/{id} 404s on the others
+        sys.exit(f"--workers {workers} needs a job store shared by the workers: set JOB_STORE=sqlite, or run one worker.")
+    # Tags this run's jobs (jobs.worker_id) so workers can tell stale ones from their siblings'
+    os.environ["SERVER_RUN_ID"] = uuid.uuid4().hex
+
+    # Split the cores between the workers' CPU pools unless configured
+    os.environ.setdefault("CPU_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    sock = bind_socket(host, port)
+    start = time.perf_counter()
+    import warmup
+    timings = warmup.preload()
+    print(f"Preloaded in {(time.perf_counter() - start) * 1000:.0f} ms: {timings}")
+
+    # Preloaded objects never become garbage; keeping them out of the
+    # collector's generations stops GC passes from writing to (and so
+    # un-sharing) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}  # pid -> worker index
+    stopping = {"deadline": None}
+
+    def stop(signum, frame):
+        if stopping["deadline"] is None:
+            print(f"Received signal {signum}, stopping {len(children)} workers")
+            stopping["deadline"] = time.monotonic() + SERVER_GRACEFUL_TIMEOUT + 5
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        children[spawn(sock, index, log_level)] = index
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            deadline = stopping["deadline"]
+            if deadline is not None and time.monotonic() > deadline:
+                for pid in children:
+                    print(f"Worker {children[pid]} (pid {pid}) did not stop in time, killing")
+                    os.kill(pid, signal.SIGKILL)
+                stopping["deadline"] = float("inf")
+            time.sleep(0.2)
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping["deadline"] is not None:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        time.sleep(SERVER_RESPAWN_DELAY)
+        children[spawn(sock, index, log_level)] = index
+
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(max(1, args.workers), args.host, args.port, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
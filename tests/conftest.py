@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app modules live at the repository root (no package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No SQLite cache or trace log written by module imports during tests
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "0")
+os.environ.setdefault("TRACE_LOG", "0")
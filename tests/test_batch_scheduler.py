@@ -0,0 +1,39 @@
+from batch_scheduler import pairing_key, plan_batches
+
+
+def items(*filenames):
+    return [{"filename": name} for name in filenames]
+
+
+def test_pairing_key_ignores_side_words():
+    assert pairing_key("Aadhar_Front.jpg") == pairing_key("aadhar back.png") == "aadhar"
+    assert pairing_key("pan.jpg") != pairing_key("aadhar.jpg")
+
+
+def test_batches_respect_image_and_byte_limits():
+    pages = items(*(f"doc{i}_{name}.jpg" for i in range(4) for name in ("x", "y")))
+    sizes = [100] * len(pages)
+    batches = plan_batches(pages, sizes, max_images=3, max_bytes=250)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(pages)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert sum(sizes[i] for i in batch) <= 250
+        assert batch == sorted(batch)
+
+
+def test_front_and_back_share_a_batch():
+    pages = items("pan.jpg", "aadhar_front.jpg", "dl.jpg", "aadhar_back.jpg")
+    batches = plan_batches(pages, [100] * 4, max_images=2, max_bytes=10_000)
+    assert [1, 3] in batches
+
+
+def test_oversized_group_is_cut_after_an_even_number_of_pages():
+    pages = items(*["scan.pdf"] * 5)
+    batches = plan_batches(pages, [100] * 5, max_images=3, max_bytes=10_000)
+    assert batches == [[0, 1], [2, 3, 4]]
+
+
+def test_plan_is_deterministic():
+    pages = items("a_front.jpg", "b.jpg", "a_back.jpg", "c.pdf", "c.pdf")
+    sizes = [300, 200, 300, 100, 100]
+    assert plan_batches(pages, sizes, 2, 600) == plan_batches(pages, sizes, 2, 600)
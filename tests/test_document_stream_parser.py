@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from llm_extractor import DocumentStreamParser, LLMExtractionError
+
+REPLY = json.dumps({
+    "note": "a {brace} and \"documents\": [{\"fake\": 1}] inside a string",
+    "documents": [
+        {"Document Type": "Aadhar Card", "Name": "Asha \"A\" Verma", "Address": "Flat 2}, [Block] B\\C"},
+        {"Document Type": "PAN Card", "Nested": {"documents": [{"x": 1}]}, "Source Files": ["pan.jpg"]},
+    ],
+    "extra": [{"not": "a record"}],
+})
+EXPECTED = json.loads(REPLY)["documents"]
+
+
+def feed_in_chunks(text: str, size: int):
+    parser = DocumentStreamParser()
+    seen = []
+    for start in range(0, len(text), size):
+        seen.extend(parser.feed(text[start:start + size]))
+    return parser, seen
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(REPLY)])
+def test_records_survive_any_chunk_split(size):
+    parser, seen = feed_in_chunks(REPLY, size)
+    assert seen == EXPECTED
+    assert parser.count == 2
+    assert parser.close() == []  # everything was already yielded
+
+
+def test_each_record_is_yielded_as_soon_as_it_closes():
+    first_end = REPLY.index("}", REPLY.index("Block")) + 1
+    parser = DocumentStreamParser()
+    assert parser.feed(REPLY[:first_end - 1]) == []
+    assert parser.feed(REPLY[first_end - 1:first_end]) == [EXPECTED[0]]
+
+
+def test_text_around_the_object_is_ignored():
+    parser, seen = feed_in_chunks("Here you go:\n```json\n" + REPLY + "\n```", 5)
+    assert seen == EXPECTED
+    parser.close()
+
+
+def test_reply_without_the_array_is_parsed_on_close():
+    parser, seen = feed_in_chunks('{"result": {"documents": []}}', 4)
+    assert seen == [] and parser.close() == []
+
+    parser, seen = feed_in_chunks('{"documents": "none"}', 4)
+    assert seen == [] and parser.close() == []
+
+
+def test_truncated_reply_raises_on_close():
+    parser, seen = feed_in_chunks(REPLY[:REPLY.index("PAN Card")], 3)
+    assert seen == EXPECTED[:1]
+    with pytest.raises(LLMExtractionError):
+        parser.close()
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from executors import BoundedExecutor, QueueFullError
+
+
+def make_executor(queue_depth: int = 2, max_workers: int = 4) -> BoundedExecutor:
+    return BoundedExecutor("test", ThreadPoolExecutor, max_workers, queue_depth)
+
+
+def test_runs_on_the_pool_and_returns_results():
+    executor = make_executor()
+
+    async def scenario():
+        return await executor.run(lambda a, b=0: (a + b, threading.current_thread().name), 1, b=2)
+
+    total, thread = asyncio.run(scenario())
+    executor.shutdown()
+    assert total == 3
+    assert thread != threading.current_thread().name
+
+
+def test_tasks_past_the_cap_wait_instead_of_failing():
+    executor = make_executor(queue_depth=2)
+    running = []
+    peak = []
+
+    def work(i):
+        running.append(i)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.remove(i)
+        return i
+
+    async def scenario():
+        results = await asyncio.gather(*(executor.run(work, i) for i in range(7)))
+        assert executor.in_flight == 0 and executor.waiting == 0
+        return results
+
+    assert asyncio.run(scenario()) == list(range(7))
+    executor.shutdown()
+    assert max(peak) <= 2
+
+
+def test_admit_refuses_new_requests_once_the_backlog_is_full():
+    executor = make_executor(queue_depth=1)
+    gate = threading.Event()
+
+    async def scenario():
+        tasks = [asyncio.create_task(executor.run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert executor.in_flight == 1 and executor.waiting == 1
+        with pytest.raises(QueueFullError):
+            executor.admit()
+        gate.set()
+        await asyncio.gather(*tasks)
+        executor.admit()
+
+    asyncio.run(scenario())
+    executor.shutdown()
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    executor = make_executor(queue_depth=1)
+    gate = threading.Event()
+
+    async def scenario():
+        first = asyncio.create_task(executor.run(gate.wait))
+        second = asyncio.create_task(executor.run(lambda: "second"))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert executor.waiting == 0
+        gate.set()
+        await first
+        assert executor.in_flight == 0
+
+    asyncio.run(scenario())
+    executor.shutdown()
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_passed_on():
+    executor = make_executor(queue_depth=1)
+
+    async def scenario():
+        await executor._acquire()
+        waiter = asyncio.create_task(executor._acquire())
+        after = asyncio.create_task(executor.run(lambda: "after"))
+        await asyncio.sleep(0)
+        executor._release()  # grant to `waiter`, delivered on the next loop pass
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert await after == "after"
+        assert executor.in_flight == 0 and executor.waiting == 0
+
+    asyncio.run(scenario())
+    executor.shutdown()
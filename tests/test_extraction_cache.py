@@ -0,0 +1,125 @@
+import asyncio
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+
+from page import Page
+from extraction_cache import ExtractionCache, page_cache_key
+from llm_extractor import _plan_extraction, attribute_documents, to_page_refs
+
+
+def make_page(seed: int, width: int = 32, height: int = 24) -> Page:
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Page(pixels.tobytes(), width, height)
+
+
+def test_key_depends_on_pixels_model_prompt_and_variant():
+    page = make_page(1)
+    key = page_cache_key(page, "model", "prompt", "v")
+    assert key == page_cache_key(make_page(1), "model", "prompt", "v")
+    assert key != page_cache_key(make_page(2), "model", "prompt", "v")
+    assert key != page_cache_key(page, "other-model", "prompt", "v")
+    assert key != page_cache_key(page, "model", "other prompt", "v")
+    assert key != page_cache_key(page, "model", "prompt", "w")
+
+
+def test_memory_and_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ExtractionCache(path=path)
+    assert cache.get("k") is None
+    cache.put("k", [{"Document Type": "PAN Card"}])
+    assert cache.get("k") == [{"Document Type": "PAN Card"}]
+    assert cache.stats["memory_hits"] == 1
+
+    reopened = ExtractionCache(path=path)
+    assert reopened.get("k") == [{"Document Type": "PAN Card"}]
+    assert reopened.stats["disk_hits"] == 1
+
+
+def test_values_are_copied_on_put_and_get():
+    cache = ExtractionCache(path=None)
+    documents = [{"Source Pages": ["a"]}]
+    cache.put("k", documents)
+    documents[0]["Source Pages"].append("b")
+    hit = cache.get("k")
+    hit[0]["Source Pages"].append("c")
+    assert cache.get("k") == [{"Source Pages": ["a"]}]
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ExtractionCache(path=str(tmp_path / "cache.sqlite3"), ttl=-1)
+    cache.put("k", [{}])
+    assert cache.get("k") is None
+
+
+def test_hit_rewrites_source_files_for_renamed_upload():
+    backend = SimpleNamespace(model="test-model")
+    front, back = make_page(1), make_page(2)
+    first = [{"page": front, "filename": "aadhar_front.jpg"}, {"page": back, "filename": "aadhar_back.jpg"}]
+    record = {"Document Type": "Aadhar Card", "Source Files": ["aadhar_front.jpg", "aadhar_back.jpg"]}
+
+    cache = ExtractionCache(path=None)
+
+    async def fill():
+        _, miss_items, batches, store = await _plan_extraction(backend, first, cache)
+        assert len(miss_items) == 2
+        for _, batch in batches:
+            await store(batch, [dict(record)])
+
+    asyncio.run(fill())
+
+    renamed = [{"page": make_page(1), "filename": "renamed_front.jpg"}, {"page": make_page(2), "filename": "renamed_back.jpg"}]
+    documents, miss_items, batches, _ = asyncio.run(_plan_extraction(backend, renamed, cache))
+    assert miss_items == [] and batches == []
+    assert documents
+    for doc in documents:
+        assert doc["Source Files"] == ["renamed_front.jpg", "renamed_back.jpg"]
+        assert "Source Pages" not in doc
+
+
+def test_partial_reupload_misses():
+    backend = SimpleNamespace(model="test-model")
+    front, back = make_page(1), make_page(2)
+    both = [{"page": front, "filename": "front.jpg"}, {"page": back, "filename": "back.jpg"}]
+    record = {"Document Type": "Aadhar Card", "Sides": ["Front", "Back"], "Source Files": ["front.jpg", "back.jpg"]}
+
+    cache = ExtractionCache(path=None)
+
+    async def fill():
+        _, _, batches, store = await _plan_extraction(backend, both, cache)
+        for _, batch in batches:
+            await store(batch, [dict(record)])
+
+    asyncio.run(fill())
+
+    front_only = [{"page": make_page(1), "filename": "front.jpg"}]
+    documents, miss_items, batches, _ = asyncio.run(_plan_extraction(backend, front_only, cache))
+    assert documents == []
+    assert [item["filename"] for item in miss_items] == ["front.jpg"]
+
+
+def test_page_refs_cite_pages_by_digest():
+    a, b = make_page(1), make_page(2)
+    items = [{"page": a, "filename": "a.jpg"}, {"page": b, "filename": "b.jpg"}]
+    documents = [{"Document Type": "PAN Card", "Source Files": ["b.jpg"]}, {"Document Type": "Unknown"}]
+    per_page = to_page_refs(attribute_documents(documents, items), items)
+    assert per_page[0] == [{"Document Type": "Unknown", "Source Pages": [a.digest, b.digest]}]
+    assert per_page[1] == [{"Document Type": "PAN Card", "Source Pages": [b.digest]},
+                           {"Document Type": "Unknown", "Source Pages": [a.digest, b.digest]}]
+    assert documents[0]["Source Files"] == ["b.jpg"]
+
+
+def test_digest_is_fixed_at_construction():
+    pixels = make_page(1)
+    passthrough = Page.from_jpeg(pixels.jpeg, pixels.width, pixels.height)
+    digest = passthrough.digest
+    passthrough.array  # decoding does not change it, nor does shipping the pixels to a worker
+    assert passthrough.digest == digest
+    assert pickle.loads(pickle.dumps(passthrough)).digest == digest
+    passthrough.release()
+    assert passthrough.digest == digest
+
+    rendered = make_page(1)
+    rendered.jpeg  # nor does encoding
+    assert rendered.digest == make_page(1).digest
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from face_store import FaceStore
+
+
+def crop(n: int, size: int = 100) -> bytes:
+    return b"\xff\xd8\xff" + bytes([n]) * size
+
+
+def test_crops_are_sharded_by_content_hash(tmp_path):
+    store = FaceStore(str(tmp_path))
+    path = store.put(crop(1))
+    digest = hashlib.sha256(crop(1)).hexdigest()
+    assert path == os.path.join(str(tmp_path), digest[:2], digest[2:4], f"{digest}.jpg")
+    with open(path, "rb") as f:
+        assert f.read() == crop(1)
+
+
+def test_identical_crops_are_stored_once(tmp_path):
+    store = FaceStore(str(tmp_path))
+    first = store.put(crop(1))
+    os.utime(first, (1, 1))
+    assert store.put(crop(1)) == first
+    assert os.stat(first).st_mtime > 1  # a repeat refreshes the crop's age
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert len(files) == 1
+
+
+def test_sweep_evicts_expired_then_oldest(tmp_path):
+    store = FaceStore(str(tmp_path), ttl=3600, max_bytes=250)
+    now = time.time()
+    paths = [store.put(crop(n)) for n in range(4)]
+    for age, path in zip((7200, 300, 200, 100), paths):
+        os.utime(path, (now - age, now - age))
+    legacy = tmp_path / "face_old.jpg"
+    legacy.write_bytes(b"x" * 10)
+    os.utime(legacy, (now - 7200, now - 7200))
+
+    snapshot = store.sweep(now)
+    assert not os.path.exists(paths[0]) and not legacy.exists()
+    assert not os.path.exists(paths[1])  # oldest left, evicted for size
+    assert all(os.path.exists(p) for p in paths[2:])
+    assert snapshot["evicted_expired"] == 2 and snapshot["evicted_size"] == 1
+    assert snapshot["files"] == 2 and snapshot["bytes"] == 2 * len(crop(0))
+    # Emptied shards are removed
+    assert not os.path.exists(os.path.dirname(paths[0]))
+
+
+def test_put_survives_its_shard_being_swept(tmp_path):
+    store = FaceStore(str(tmp_path), ttl=-1)
+    path = store.put(crop(1))
+    store.sweep()
+    assert not os.path.exists(os.path.dirname(path))
+    assert store.put(crop(1)) == path and os.path.exists(path)
+
+
+def test_concurrent_puts_of_one_crop(tmp_path):
+    store = FaceStore(str(tmp_path))
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(None, store.put, crop(7, 100_000)) for _ in range(8)))
+
+    paths = asyncio.run(scenario())
+    assert len(set(paths)) == 1
+    names = [name for _, _, files in os.walk(tmp_path) for name in files]
+    assert names == [os.path.basename(paths[0])]  # no temp files left behind
@@ -0,0 +1,102 @@
+import random
+
+from identity_resolver import IdentityResolver, IdentityIndex, identity_keys
+
+
+def pairwise_merge(documents):
+    """The original O(n^2) loop, with the resolver's normalization: first matching identity wins."""
+    merged = []
+    for doc in documents:
+        keys = identity_keys(doc)
+        for existing in merged:
+            theirs = identity_keys(existing)
+            if any(theirs.get(kind) == value for kind, value in keys.items()):
+                for k, v in doc.items():
+                    if k not in ("Document Type", "Source Files", "Sides Detected") and v and not existing.get(k):
+                        existing[k] = v
+                existing["Source Files"] = sorted(set(existing["Source Files"]) | set(doc["Source Files"]))
+                break
+        else:
+            merged.append(dict(doc))
+    return merged
+
+
+def test_record_joins_the_earliest_matching_identity():
+    resolver = IdentityResolver()
+    resolver.add_all([
+        {"Document Type": "PAN Card", "PAN Number": "ABCDE1234F", "Source Files": ["pan.jpg"]},
+        {"Document Type": "Aadhar Card", "Aadhar Number": "1234 5678 9012", "Source Files": ["front.jpg"]},
+        {"Document Type": "Aadhar Card", "Aadhar Number": "123456789012", "PAN Number": "abcde-1234-f",
+         "Source Files": ["back.jpg"]},
+    ])
+    assert len(resolver.identities) == 2
+    first = resolver.identities[0]
+    assert first["Source Files"] == ["back.jpg", "pan.jpg"]
+    assert first["Document Type"] == "Aadhar Card + PAN Card"
+
+
+def test_fields_are_filled_never_overwritten():
+    resolver = IdentityResolver()
+    identity = resolver.add({"Document Type": "PAN Card", "PAN Number": "ABCDE1234F", "Name": "Asha Verma",
+                             "Father's Name": "", "Source Files": ["a.jpg"]})
+    resolver.add({"Document Type": "PAN Card", "PAN Number": "ABCDE1234F", "Name": "ASHA  VERMA K",
+                  "Father's Name": "Ravi Verma", "Source Files": ["b.jpg"]})
+    assert identity["Name"] == "Asha Verma"
+    assert identity["Father's Name"] == "Ravi Verma"
+
+
+def test_identity_matches_on_fields_filled_by_a_later_record():
+    resolver = IdentityResolver()
+    resolver.add({"Document Type": "Aadhar Card", "Name": "Asha Verma", "Source Files": ["a.jpg"]})
+    resolver.add({"Document Type": "PAN Card", "Name": "asha verma", "PAN Number": "ABCDE1234F", "Source Files": ["b.jpg"]})
+    resolver.add({"Document Type": "PAN Card", "PAN Number": "ABCDE1234F", "Source Files": ["c.jpg"]})
+    assert len(resolver.identities) == 1
+    assert resolver.identities[0]["Source Files"] == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_short_names_do_not_merge():
+    resolver = IdentityResolver()
+    resolver.add_all([{"Name": "Ram", "Source Files": ["a.jpg"]}, {"Name": "ram", "Source Files": ["b.jpg"]}])
+    assert len(resolver.identities) == 2
+
+
+def test_sides_are_combined():
+    resolver = IdentityResolver()
+    resolver.add({"Document Type": "Aadhar Card", "Aadhar Number": "123456789012", "Sides Detected": ["Front"], "Source Files": ["f.jpg"]})
+    identity = resolver.add({"Document Type": "Aadhar Card", "Aadhar Number": "123456789012", "Sides Detected": ["Back"], "Source Files": ["b.jpg"]})
+    assert identity["Sides Detected"] == ["Back", "Front"]
+    assert identity["Document Type"] == "Aadhar Card"
+
+
+def test_same_result_as_the_pairwise_loop():
+    rng = random.Random(7)
+    names = ["Asha Verma", "Rahul Singh", "Meena Iyer", "Ram", None]
+    documents = []
+    for n in range(300):
+        doc = {"Document Type": rng.choice(["Aadhar Card", "PAN Card"]), "Source Files": [f"{n}.jpg"]}
+        if rng.random() < 0.6:
+            doc["Aadhar Number"] = f"{rng.randrange(20):012d}"
+        if rng.random() < 0.5:
+            doc["PAN Number"] = f"ABCDE{rng.randrange(20):04d}F"
+        if rng.random() < 0.5:
+            doc["Name"] = rng.choice(names)
+        documents.append(doc)
+
+    expected = pairwise_merge(documents)
+    actual = IdentityResolver().add_all(documents)
+    assert [d["Source Files"] for d in actual] == [d["Source Files"] for d in expected]
+    for got, want in zip(actual, expected):
+        for field in ("Aadhar Number", "PAN Number", "Name"):
+            assert got.get(field) == want.get(field)
+
+
+def test_index_links_the_same_person_across_instances(tmp_path):
+    path = str(tmp_path / "identities.sqlite3")
+    first = IdentityIndex(path)
+    [aadhar_id, none_id] = first.link([{"Aadhar Number": "1234 5678 9012", "PAN Number": "ABCDE1234F"}, {"Name": "Asha"}])
+    assert aadhar_id and none_id is None
+
+    reopened = IdentityIndex(path)
+    [by_pan, other] = reopened.link([{"PAN Number": "abcde1234f"}, {"DL Number": "MH01 2020"}])
+    assert by_pan == aadhar_id
+    assert other not in (None, aadhar_id)
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+
+import ingest
+import main
+from executors import QueueFullError
+from ingest import ingest_upload, UploadRejected
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+
+
+class FakeUpload:
+    def __init__(self, filename: str, content: bytes, size=None):
+        self.filename = filename
+        self.size = size
+        self._content = content
+        self._offset = 0
+
+    async def read(self, n: int) -> bytes:
+        chunk = self._content[self._offset:self._offset + n]
+        self._offset += len(chunk)
+        return chunk
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(ingest, "UPLOAD_CHUNK_BYTES", 1024)
+    monkeypatch.setattr(ingest, "UPLOAD_SPOOL_BYTES", 4096)
+
+
+def test_small_file_stays_in_memory(tmp_path):
+    content = JPEG[:3000]
+    ingested = asyncio.run(ingest_upload(FakeUpload("a.jpg", content), str(tmp_path), 10 ** 6))
+    assert ingested.kind == "jpeg" and ingested.data == content and ingested.path is None
+    assert ingested.sha256 == hashlib.sha256(content).hexdigest()
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_file_spills_to_disk(tmp_path):
+    ingested = asyncio.run(ingest_upload(FakeUpload("a.jpg", JPEG), str(tmp_path), 10 ** 6))
+    assert ingested.data is None and ingested.size == len(JPEG)
+    with open(ingested.path, "rb") as f:
+        assert f.read() == JPEG
+    assert ingested.sha256 == hashlib.sha256(JPEG).hexdigest()
+    ingested.cleanup()
+    assert os.listdir(tmp_path) == []
+
+
+def test_kind_is_sniffed_not_taken_from_the_name(tmp_path):
+    pdf = asyncio.run(ingest_upload(FakeUpload("scan.jpg", b"junk\n%PDF-1.7\n..."), str(tmp_path), 10 ** 6))
+    assert pdf.kind == "pdf"
+    assert asyncio.run(ingest_upload(FakeUpload("notes.pdf", b"plain text"), str(tmp_path), 10 ** 6)) is None
+
+
+def test_oversized_file_is_rejected_and_its_spill_removed(tmp_path):
+    with pytest.raises(UploadRejected) as e:
+        asyncio.run(ingest_upload(FakeUpload("a.jpg", JPEG), str(tmp_path), 8000))
+    assert e.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_declared_size_is_rejected_before_reading(tmp_path):
+    upload = FakeUpload("a.jpg", JPEG, size=10 ** 9)
+    with pytest.raises(UploadRejected):
+        asyncio.run(ingest_upload(upload, str(tmp_path), 10 ** 6))
+    assert upload._offset == 0
+
+
+def test_ingest_files_fails_the_request_on_pool_and_disk_errors(monkeypatch):
+    for error, status in ((QueueFullError("busy"), 503), (OSError("disk full"), None)):
+        async def failing(upload, temp_dir, budget):
+            raise error
+
+        monkeypatch.setattr(main, "ingest_upload", failing)
+        with pytest.raises(HTTPException if status else OSError) as e:
+            asyncio.run(main.ingest_files([FakeUpload("a.jpg", JPEG)], "req"))
+        if status:
+            assert e.value.status_code == status
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+import jobs
+from jobs import JobManager, JobQueueFull, MemoryJobStore, SQLiteJobStore, new_record
+
+
+class Rejected(Exception):
+    status_code = 413
+    detail = "too large"
+
+
+async def wait_done(manager: JobManager, job_id: str):
+    while manager.get(job_id)["status"] not in jobs.TERMINAL:
+        await asyncio.sleep(0.005)
+    return manager.get(job_id)
+
+
+def test_job_runs_and_records_progress():
+    async def runner(progress):
+        progress("render", pages=2)
+        return {"documents": []}
+
+    async def scenario():
+        manager = JobManager(MemoryJobStore(), workers=1)
+        job_id = manager.submit(runner)
+        events = [event["stage"] async for event in manager.events(job_id)]
+        record = manager.get(job_id)
+        await manager.stop()
+        return events, record
+
+    events, record = asyncio.run(scenario())
+    assert events == ["running", "render", "succeeded"]
+    assert record["status"] == "succeeded" and record["result"] == {"documents": []}
+    assert record["stage"] == "render"
+
+
+def test_failed_job_keeps_the_error_status():
+    async def runner(progress):
+        raise Rejected()
+
+    async def scenario():
+        manager = JobManager(MemoryJobStore(), workers=1)
+        record = await wait_done(manager, manager.submit(runner))
+        await manager.stop()
+        return record, manager.stats
+
+    record, stats = asyncio.run(scenario())
+    assert record["status"] == "failed"
+    assert record["error"] == {"status_code": 413, "detail": "too large"}
+    assert stats["failed"] == 1
+
+
+def test_backlog_is_bounded():
+    release = None
+
+    async def runner(progress):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        manager = JobManager(MemoryJobStore(), workers=1, queue_depth=2)
+        first = manager.submit(runner)
+        await asyncio.sleep(0)  # the worker picks up the first job
+        manager.submit(runner)
+        manager.submit(runner)
+        with pytest.raises(JobQueueFull):
+            manager.submit(runner)
+        release.set()
+        await wait_done(manager, first)
+        await manager.stop()
+        return manager.stats
+
+    assert asyncio.run(scenario())["rejected"] == 1
+
+
+def test_expired_jobs_are_purged_on_submit():
+    async def runner(progress):
+        return None
+
+    async def scenario():
+        manager = JobManager(MemoryJobStore(), workers=1, ttl=-1)
+        first = manager.submit(runner)
+        await wait_done(manager, first)
+        manager.submit(runner)
+        await manager.stop()
+        return manager.get(first)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_restart_fails_only_jobs_whose_process_is_gone(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    owners = {"own": "run1:0", "sibling": "run1:1", "old_run": "run0:0", "legacy": None}
+    for job_id, owner in owners.items():
+        store.create(new_record(job_id, owner))
+    store.create(dict(new_record("done", "run0:0"), status="succeeded"))
+
+    assert store.interrupt_unfinished("run1:0") == 3
+    assert store.get("sibling")["status"] == "queued"
+    for job_id in ("own", "old_run", "legacy"):
+        record = store.get(job_id)
+        assert record["status"] == "failed" and record["error"]["status_code"] == 503
+    assert store.get("done")["status"] == "succeeded"
+
+
+def test_manager_start_recovers_with_its_worker_id(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERVER_RUN_ID", "run1")
+    monkeypatch.setenv("SERVER_WORKER_INDEX", "1")
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.create(new_record("mine", "run1:1"))
+    store.create(new_record("theirs", "run1:0"))
+
+    async def scenario():
+        manager = JobManager(store, workers=1)
+        manager.start()
+        await manager.stop()
+        return manager.owner
+
+    assert asyncio.run(scenario()) == "run1:1"
+    assert store.get("mine")["status"] == "failed"
+    assert store.get("theirs")["status"] == "queued"
+
+
+def test_events_follow_a_job_run_by_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_EVENTS_POLL_INTERVAL", 0.01)
+    path = str(tmp_path / "jobs.sqlite3")
+    runner_store, reader_store = SQLiteJobStore(path), SQLiteJobStore(path)
+    runner_store.create(new_record("job", "run1:0"))
+
+    async def scenario():
+        reader = JobManager(reader_store, workers=1)
+        stream = reader.events("job")
+
+        async def other_worker():
+            await asyncio.sleep(0.02)
+            runner_store.update("job", event={"stage": "running", "time": 0}, status="running")
+            await asyncio.sleep(0.02)
+            runner_store.update("job", event={"stage": "succeeded", "time": 0}, status="succeeded")
+
+        writer = asyncio.create_task(other_worker())
+        stages = [event["stage"] async for event in stream]
+        await writer
+        return stages
+
+    assert asyncio.run(scenario()) == ["running", "succeeded"]
@@ -0,0 +1,133 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from llm_extractor import AsyncLLMBackend, LLMExtractionError, LLMDeadlineExceeded, request_documents
+from llm_scheduler import request_deadline
+
+COMPLETION = {
+    "id": "c", "object": "chat.completion", "created": 0, "model": "test-model",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": '{"documents": []}'}, "finish_reason": "stop"}],
+}
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def make_backend(handler, **options) -> AsyncLLMBackend:
+    options = {"backoff_base": 0.001, "backoff_max": 0.01, "deadline": 5, "attempt_timeout": 5, **options}
+    backend = AsyncLLMBackend(api_key="test", base_url="http://llm.test/v1", model="test-model", **options)
+    backend._client = AsyncOpenAI(base_url=backend.base_url, api_key="test", max_retries=0,
+                                  http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return backend
+
+
+def replies(*statuses):
+    """Handler answering the given statuses in turn (200 = a completion); records each call."""
+    calls = []
+
+    async def handler(request):
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(status)
+        if status == 200:
+            return httpx.Response(200, json=COMPLETION)
+        return httpx.Response(status, json={"error": {"message": "nope"}})
+
+    return handler, calls
+
+
+def run(backend, coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await backend.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_transient_errors_are_retried():
+    handler, calls = replies(429, 503, 200)
+    backend = make_backend(handler)
+    completion = run(backend, backend.create_completion(MESSAGES))
+    assert completion.choices[0].message.content == '{"documents": []}'
+    assert calls == [429, 503, 200]
+    assert backend.stats["retries"] == 2 and backend.stats["failures"] == 0
+
+
+def test_client_errors_are_not_retried():
+    handler, calls = replies(400)
+    backend = make_backend(handler)
+    with pytest.raises(LLMExtractionError):
+        run(backend, backend.create_completion(MESSAGES))
+    assert calls == [400]
+
+
+def test_retries_stop_at_max_retries():
+    handler, calls = replies(500)
+    backend = make_backend(handler, max_retries=2)
+    with pytest.raises(LLMExtractionError):
+        run(backend, backend.create_completion(MESSAGES))
+    assert len(calls) == 3
+    assert backend.stats["failures"] == 1
+
+
+def test_request_deadline_bounds_a_slow_call():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json=COMPLETION)
+
+    backend = make_backend(handler)
+
+    async def call():
+        with request_deadline("interactive", seconds=0.1):
+            await backend.create_completion(MESSAGES)
+
+    with pytest.raises(LLMDeadlineExceeded):
+        run(backend, call())
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_route_concurrency_is_capped(adaptive):
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.02)
+        in_flight.pop()
+        return httpx.Response(200, json=COMPLETION)
+
+    backend = make_backend(handler, route_concurrency=2, max_concurrency=8, adaptive=adaptive)
+    async def calls():
+        await asyncio.gather(*(backend.create_completion(MESSAGES) for _ in range(6)))
+
+    run(backend, calls())
+    assert max(peak) <= 2
+    assert backend.stats["calls"] == 6
+    if adaptive:
+        assert backend.limiter_snapshot()["in_flight"] == 0
+
+
+def test_adaptive_limit_backs_off_on_overload():
+    handler, _ = replies(429, 200)
+    backend = make_backend(handler, route_concurrency=8, adaptive=True)
+    limiter = backend.route_limiter()
+    before = limiter.limit
+    run(backend, backend.create_completion(MESSAGES))
+    assert limiter.limit < before
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.parametrize("content", ['["not", "an", "object"]', '{"documents": "none"}', "null"])
+def test_reply_without_a_documents_list_is_an_extraction_error(content):
+    reply = dict(COMPLETION, choices=[{"index": 0, "message": {"role": "assistant", "content": content},
+                                       "finish_reason": "stop"}])
+
+    async def handler(request):
+        return httpx.Response(200, json=reply)
+
+    backend = make_backend(handler)
+    with pytest.raises(LLMExtractionError):
+        run(backend, request_documents(backend, [], "prompt"))
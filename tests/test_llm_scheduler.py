@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import AdaptiveLimiter, DeadlineExceeded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_the_limit_then_queues():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=4, min_limit=1, initial=2)
+        deadline = asyncio.get_running_loop().time() + 10
+        await limiter.acquire(deadline)
+        await limiter.acquire(deadline)
+        third = asyncio.create_task(limiter.acquire(deadline))
+        await asyncio.sleep(0)
+        assert limiter.in_flight == 2 and limiter.waiting == 1 and not third.done()
+        limiter.release(0.1, "ignore")
+        await third
+        assert limiter.in_flight == 2 and limiter.waiting == 0
+
+    run(scenario())
+
+
+def test_limit_grows_only_on_fast_calls_at_full_use():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=4, min_limit=1, initial=1)
+        deadline = asyncio.get_running_loop().time() + 10
+        await limiter.acquire(deadline)
+        limiter.release(0.1, "ok")
+        assert limiter.limit == 2
+
+        # One call in flight under a limit of two: the limit isn't in use, so it stays
+        await limiter.acquire(deadline)
+        limiter.release(0.1, "ok")
+        assert limiter.limit == 2
+
+        await limiter.acquire(deadline)
+        await limiter.acquire(deadline)
+        limiter.release(0.1, "ok")
+        limiter.release(0.1, "ok")
+        assert limiter.limit == 2.5
+        assert limiter.stats["increases"] == 2
+
+    run(scenario())
+
+
+def test_overload_shrinks_once_per_round_trip_down_to_min():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=8, min_limit=2, initial=8, decrease=0.5)
+        deadline = asyncio.get_running_loop().time() + 1000
+        await limiter.acquire(deadline)
+        limiter.release(60.0, "ok")  # long round trip: later overloads in this window count once
+        for _ in range(3):
+            await limiter.acquire(deadline)
+            limiter.release(60.0, "overload")
+        assert limiter.limit == 4
+        assert limiter.stats["decreases"] == 1
+
+        limiter._round_trip = 0.0
+        for _ in range(5):
+            await limiter.acquire(deadline)
+            limiter.release(0.1, "overload")
+        assert limiter.limit == 2
+
+    run(scenario())
+
+
+def test_slow_call_counts_as_overload():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=8, min_limit=1, initial=4, decrease=0.5, tolerance=2.0)
+        deadline = asyncio.get_running_loop().time() + 10
+        await limiter.acquire(deadline)
+        limiter.release(0.1, "ok")
+        limiter._round_trip = 0.0
+        await limiter.acquire(deadline)
+        limiter.release(1.0, "ok")
+        assert limiter.limit == 2
+
+    run(scenario())
+
+
+def test_waiters_are_served_earliest_deadline_first():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=1, min_limit=1, initial=1)
+        now = asyncio.get_running_loop().time()
+        await limiter.acquire(now + 100)
+        order = []
+
+        async def call(name, deadline):
+            await limiter.acquire(deadline)
+            order.append(name)
+            limiter.release(0.0, "ignore")
+
+        bulk = asyncio.create_task(call("bulk", now + 90))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("interactive", now + 10))
+        await asyncio.sleep(0)
+        limiter.release(0.0, "ignore")
+        await asyncio.gather(bulk, interactive)
+        assert order == ["interactive", "bulk"]
+
+    run(scenario())
+
+
+def test_hopeless_calls_are_shed():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=2, min_limit=1, initial=1)
+        loop = asyncio.get_running_loop()
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(loop.time() - 1)
+
+        await limiter.acquire(loop.time() + 10)
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(loop.time() + 0.05)  # times out in the queue
+        assert limiter.stats["shed"] == 2
+        assert limiter.in_flight == 1
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=1, min_limit=1, initial=1)
+        deadline = asyncio.get_running_loop().time() + 10
+        await limiter.acquire(deadline)
+        cancelled = asyncio.create_task(limiter.acquire(deadline))
+        behind = asyncio.create_task(limiter.acquire(deadline))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        limiter.release(0.0, "ignore")
+        await behind
+        assert limiter.in_flight == 1 and limiter.waiting == 0
+
+    run(scenario())
+
+
+def test_slot_granted_to_a_cancelled_caller_is_given_back():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_limit=1, min_limit=1, initial=1)
+        deadline = asyncio.get_running_loop().time() + 10
+        await limiter.acquire(deadline)
+        waiter = asyncio.create_task(limiter.acquire(deadline))
+        await asyncio.sleep(0)
+        # The grant and the cancellation land in the same loop iteration
+        limiter.release(0.0, "ignore")
+        assert limiter.in_flight == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire(deadline), 1)  # the slot is usable again
+
+    run(scenario())
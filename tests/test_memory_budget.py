@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from memory_budget import MemoryBudget, MemoryBudgetRejected, page_cost
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_within_capacity_and_releases():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=1)
+        reservation = await budget.acquire(60)
+        assert budget.in_use == 60
+        reservation.shrink(20)
+        assert budget.in_use == 40
+        reservation.release()
+        reservation.release()
+        assert budget.in_use == 0
+
+    run(scenario())
+
+
+def test_larger_than_capacity_is_rejected_with_413():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=1)
+        with pytest.raises(MemoryBudgetRejected) as err:
+            await budget.acquire(101)
+        assert err.value.status_code == 413
+
+    run(scenario())
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=5)
+        first = await budget.acquire(80)
+        large = asyncio.create_task(budget.acquire(60))
+        await asyncio.sleep(0)
+        # Would fit now, but queues behind the waiting request
+        small = asyncio.create_task(budget.acquire(10))
+        await asyncio.sleep(0)
+        assert budget.waiting == 2 and not small.done()
+
+        first.release()
+        granted = await large
+        assert (await small).nbytes == 10
+        assert budget.in_use == 70
+        granted.release()
+
+    run(scenario())
+
+
+def test_wait_timeout_is_rejected_with_503():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=0.05)
+        held = await budget.acquire(100)
+        with pytest.raises(MemoryBudgetRejected) as err:
+            await budget.acquire(1)
+        assert err.value.status_code == 503
+        assert budget.waiting == 0
+        held.release()
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=5)
+        held = await budget.acquire(100)
+        cancelled = asyncio.create_task(budget.acquire(50))
+        behind = asyncio.create_task(budget.acquire(50))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        held.release()
+        assert (await behind).nbytes == 50
+        assert budget.in_use == 50 and budget.waiting == 0
+
+    run(scenario())
+
+
+def test_grant_to_a_cancelled_caller_is_given_back():
+    async def scenario():
+        budget = MemoryBudget(capacity=100, wait=5)
+        held = await budget.acquire(100)
+        waiter = asyncio.create_task(budget.acquire(60))
+        await asyncio.sleep(0)
+        # The grant and the cancellation land in the same loop iteration
+        held.release()
+        assert budget.in_use == 60
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert budget.in_use == 0
+
+    run(scenario())
+
+
+def test_disabled_budget_admits_everything():
+    async def scenario():
+        budget = MemoryBudget(capacity=0)
+        assert not budget.enabled
+        assert (await budget.acquire(10 ** 12)).nbytes == 0
+
+    run(scenario())
+
+
+def test_page_cost_scales_with_pixels_and_channels():
+    assert page_cost(100, 100, 3) == 3 * page_cost(100, 100, 1)
+    assert page_cost(200, 100) == 2 * page_cost(100, 100)
@@ -0,0 +1,84 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from page import Page
+from page_dedup import dedupe_pages, expand_sources, hash_page
+
+
+def test_aliases_join_documents_citing_the_kept_file():
+    items = [{"filename": "scan.pdf", "aliases": ["front.jpg", "front.jpg"]}, {"filename": "pan.jpg"}]
+    cited = {"Source Files": ["scan.pdf"]}
+    other = {"Source Files": ["pan.jpg"]}
+    expand_sources([cited, other], items)
+    assert cited["Source Files"] == ["scan.pdf", "front.jpg"]
+    assert other["Source Files"] == ["pan.jpg"]
+
+
+def test_documents_without_source_files_are_left_alone():
+    items = [{"filename": "scan.pdf", "aliases": ["front.jpg"]}]
+    documents = [{"Document Type": "PAN Card"}, {"Source Files": None}]
+    expand_sources(documents, items)
+    assert documents == [{"Document Type": "PAN Card"}, {"Source Files": None}]
+
+
+def test_no_aliases_changes_nothing():
+    documents = [{"Source Files": ["a.jpg"]}]
+    expand_sources(documents, [{"filename": "a.jpg"}])
+    assert documents == [{"Source Files": ["a.jpg"]}]
+
+
+def card(name: str, number: str, seed: int = 0) -> np.ndarray:
+    """A synthetic ID card: shared template (header band, photo box), personal text."""
+    img = np.full((540, 860, 3), 235, np.uint8)
+    img[:90] = (40, 90, 200)
+    cv2.putText(img, "GOVERNMENT OF INDIA", (200, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
+    rng = np.random.default_rng(seed)
+    img[140:400, 40:250] = rng.integers(60, 200, (260, 210, 3), dtype=np.uint8)
+    cv2.putText(img, name, (290, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (20, 20, 20), 2)
+    cv2.putText(img, number, (290, 460), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (20, 20, 20), 3)
+    return img
+
+
+def page_of(img: np.ndarray) -> Page:
+    return Page(img.tobytes(), img.shape[1], img.shape[0])
+
+
+def reencoded(img: np.ndarray, quality: int = 70) -> Page:
+    buffered = io.BytesIO()
+    Image.fromarray(img).save(buffered, format="JPEG", quality=quality)
+    return Page.from_jpeg(buffered.getvalue(), img.shape[1], img.shape[0])
+
+
+def on_a4(img: np.ndarray) -> Page:
+    """The card scanned on a white A4 sheet at a different scale."""
+    sheet = np.full((1754, 1240, 3), 255, np.uint8)
+    small = cv2.resize(img, (645, 405), interpolation=cv2.INTER_AREA)
+    sheet[200:605, 300:945] = small
+    return page_of(sheet)
+
+
+ASHA = card("ASHA VERMA", "2345 6789 0123")
+
+
+def test_same_scan_in_other_containers_is_collapsed():
+    pages = [page_of(ASHA), reencoded(ASHA), on_a4(ASHA), page_of(ASHA)]
+    result = dedupe_pages(pages)
+    assert result.duplicate_of == [None, 0, 0, 0]
+
+
+def test_same_template_different_person_is_kept():
+    other = card("RAHUL SINGH", "9876 5432 1098", seed=1)
+    a, b = hash_page(page_of(ASHA)), hash_page(page_of(other))
+    assert bin(a.dhash ^ b.dhash).count("1") < 32  # the template makes them hash close
+    result = dedupe_pages([page_of(ASHA), page_of(other), reencoded(other)])
+    assert result.duplicate_of == [None, None, 1]
+
+
+def test_pages_that_fail_to_hash_are_kept():
+    released = page_of(ASHA)
+    released.release()
+    result = dedupe_pages([page_of(ASHA), released])
+    assert result.duplicate_of == [None, None]
@@ -0,0 +1,73 @@
+import base64
+import json
+
+import pytest
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from response_modes import FaceStaticFiles, format_documents, multipart_body, photo_files, face_etag
+
+
+@pytest.fixture
+def face(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "static" / "faces").mkdir(parents=True)
+    path = "static/faces/abcd.jpg"
+    Image.new("RGB", (400, 500), (200, 120, 90)).save(path, format="JPEG")
+    return path
+
+
+def test_modes_shape_the_photo_fields(face):
+    docs = [{"Name": "Asha Verma", "Photo Path": face}, {"Name": "No Photo"}]
+
+    full = format_documents(docs, "full")[0]
+    assert full["Photo Path"] == full["Photo URL"] == "/static/faces/abcd.jpg"
+    with open(face, "rb") as f:
+        assert full["Photo Base64"] == "data:image/jpeg;base64," + base64.b64encode(f.read()).decode()
+
+    url = format_documents(docs, "url")[0]
+    assert url == {"Name": "Asha Verma", "Photo URL": "/static/faces/abcd.jpg"}
+
+    thumb = format_documents(docs, "thumbnail")[0]
+    assert "Photo Base64" not in thumb and "Photo Path" not in thumb
+    data = base64.b64decode(thumb["Photo Thumbnail Base64"].split(",", 1)[1])
+    assert len(data) < 0.5 * len(base64.b64decode(full["Photo Base64"].split(",", 1)[1]))
+
+    assert format_documents(docs, "url")[1] == {"Name": "No Photo"}
+    assert docs[0]["Photo Path"] == face  # input records are left alone
+
+
+def test_multipart_body_carries_json_then_faces(face):
+    docs = [{"Name": "Asha Verma", "Photo Path": face}, {"Name": "Gone", "Photo Path": "static/faces/missing.jpg"}]
+    payload = json.dumps({"data": format_documents(docs, "url")}).encode()
+    body = b"".join(multipart_body(payload, photo_files(docs), "b", chunk_size=100))
+
+    parts = body.split(b"--b")
+    assert parts[-1] == b"--\r\n"
+    assert len(parts) == 4  # preamble, JSON, one face, closing
+    assert b"Content-Type: application/json" in parts[1] and payload in parts[1]
+    headers, image = parts[2].split(b"\r\n\r\n", 1)
+    assert b"Content-Location: /static/faces/abcd.jpg" in headers
+    assert face_etag(face).encode() in headers
+    with open(face, "rb") as f:
+        assert image == f.read() + b"\r\n"
+
+
+def test_faces_get_content_etags_and_304(face):
+    app = Starlette(routes=[Mount("/static/faces", FaceStaticFiles(directory="static/faces"))])
+    client = TestClient(app)
+
+    first = client.get("/static/faces/abcd.jpg")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag == face_etag(face)
+    assert "immutable" in first.headers["cache-control"]
+
+    again = client.get("/static/faces/abcd.jpg", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    Image.new("RGB", (400, 500), (10, 10, 10)).save(face, format="JPEG")
+    changed = client.get("/static/faces/abcd.jpg", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+from ocr_engine import OcrLine
+from tiered_extractor import (verhoeff_valid, valid_aadhar, valid_pan, valid_dl, valid_dob,
+                              parse_ocr_fields, ocr_document, reconcile_with_ocr)
+
+
+def with_check_digit(digits: str) -> str:
+    [check] = [d for d in "0123456789" if verhoeff_valid(digits + d)]
+    return digits + check
+
+
+AADHAR = with_check_digit("23456789012")
+WRONG_CHECK_DIGIT = AADHAR[:-1] + str((int(AADHAR[-1]) + 1) % 10)
+
+
+def line(text: str, confidence: float = 95) -> OcrLine:
+    return OcrLine([(word, confidence) for word in text.split()])
+
+
+def test_verhoeff_known_values():
+    assert verhoeff_valid("2363")
+    assert verhoeff_valid("123451")
+    assert not verhoeff_valid("2364")
+    assert not verhoeff_valid("")
+
+
+def test_verhoeff_catches_single_digit_errors_and_adjacent_swaps():
+    for i in range(len(AADHAR)):
+        for d in "0123456789":
+            if d != AADHAR[i]:
+                assert not verhoeff_valid(AADHAR[:i] + d + AADHAR[i + 1:])
+    for i in range(len(AADHAR) - 1):
+        if AADHAR[i] != AADHAR[i + 1]:
+            assert not verhoeff_valid(AADHAR[:i] + AADHAR[i + 1] + AADHAR[i] + AADHAR[i + 2:])
+
+
+def test_aadhar_validator():
+    assert valid_aadhar(AADHAR)
+    assert valid_aadhar(f"{AADHAR[:4]} {AADHAR[4:8]} {AADHAR[8:]}")
+    assert not valid_aadhar(with_check_digit("13456789012"))  # cannot start with 0 or 1
+    assert not valid_aadhar(AADHAR[:-1])
+    assert not valid_aadhar(None)
+
+
+def test_format_validators():
+    assert valid_pan("abcpe1234f") and not valid_pan("ABCXE1234F") and not valid_pan("ABCPE12345")
+    assert valid_dl("MH01 20150012345") and valid_dl("MH-01-2015-0012345") and not valid_dl("MH01 1815001234")
+    assert valid_dob("1990-02-28")
+    assert not valid_dob("1990-02-30")
+    assert not valid_dob("28/02/1990")
+    assert not valid_dob((date.today() + timedelta(days=1)).isoformat())
+
+
+def test_aadhar_front_is_answered_by_ocr():
+    lines = [line("GOVERNMENT OF INDIA"), line("Asha Verma"), line("DOB: 14/03/1991"),
+             line("FEMALE"), line(f"{AADHAR[:4]} {AADHAR[4:8]} {AADHAR[8:]}")]
+    parsed = parse_ocr_fields(lines)
+    assert (parsed["Document Type"], parsed["Side"]) == ("Aadhar", "Front")
+    doc = ocr_document(parsed, "front.jpg")
+    assert doc["Name"] == "Asha Verma" and doc["Date of Birth"] == "1991-03-14" and doc["Gender"] == "Female"
+    assert doc["Sides Detected"] == ["Front"] and doc["Field Sources"]["Aadhar Number"] == "ocr"
+
+
+def test_low_confidence_or_bad_checksum_escalates():
+    lines = [line("GOVERNMENT OF INDIA"), line("Asha Verma", 40), line("DOB: 14/03/1991"),
+             line("FEMALE"), line(f"{AADHAR[:4]} {AADHAR[4:8]} {AADHAR[8:]}")]
+    assert ocr_document(parse_ocr_fields(lines), "front.jpg") is None
+
+    parsed = parse_ocr_fields([line("UNIQUE IDENTIFICATION AUTHORITY"), line(WRONG_CHECK_DIGIT)])
+    assert "Aadhar Number" not in parsed["fields"]
+
+
+def test_reconcile_replaces_only_invalid_llm_values():
+    partials = [{"Document Type": "Aadhar", "Side": "Front",
+                 "fields": {"Aadhar Number": (AADHAR, 95), "Date of Birth": ("1991-03-14", 95)}}]
+    doc = {"Document Type": "Aadhar", "Aadhar Number": WRONG_CHECK_DIGIT,
+           "Date of Birth": "1991-03-15", "Name": "Asha Verma"}
+    reconcile_with_ocr(doc, partials)
+    assert doc["Aadhar Number"] == AADHAR
+    assert doc["Date of Birth"] == "1991-03-15"  # valid LLM values are kept
+    assert doc["Field Sources"] == {"Aadhar Number": "ocr", "Date of Birth": "llm", "Name": "llm"}
@@ -0,0 +1,316 @@
+import os
+import re
+import asyncio
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from executors import run_cpu
+from metrics import span
+from llm_extractor import iter_all_documents
+from text_cleaner import clean_ocr_text
+
+# Tier 1 (local OCR + validators) is opt-in: it needs the tesseract binary
+OCR_FAST_PATH = os.environ.get("OCR_FAST_PATH", "0") == "1"
+# Minimum Tesseract word confidence (0-100) for a field to be trusted
+OCR_MIN_CONFIDENCE = float(os.environ.get("OCR_MIN_CONFIDENCE", 80))
+
+# Fields a document must have, confidently, for the OCR tier to answer it alone
+REQUIRED_FIELDS = {
+    ("Aadhar", "Front"): ("Name", "Date of Birth", "Gender", "Aadhar Number"),
+    ("Aadhar", "Back"): ("Aadhar Number", "Address"),
+    ("PAN", None): ("Name", "Father Name", "Date of Birth", "PAN Number"),
+    ("Driving Licence", None): ("Name", "DL Number", "Address"),
+}
+
+# --- Validators ---
+
+# Verhoeff tables (dihedral group D5), used by UIDAI for the Aadhaar check digit
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6], [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8], [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2], [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4], [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2], [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0], [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5], [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+# Aadhaar numbers never start with 0 or 1
+AADHAR_RE = re.compile(r"(?<!\d)([2-9]\d{3})\s?(\d{4})\s?(\d{4})(?!\d)")
+# AAAAA9999A; the 4th letter is the holder type (P = person, C = company, ...)
+PAN_RE = re.compile(r"(?<![A-Z0-9])([A-Z]{3}[PCHFATBLJG][A-Z]\d{4}[A-Z])(?![A-Z0-9])")
+# State code, RTO code, year of issue, 7-digit serial: "HR01 20000000856", "MH-12-2011-0012345"
+DL_RE = re.compile(r"(?<![A-Z0-9])([A-Z]{2})[\s-]?(\d{2})[\s-]?((?:19|20)\d{2})[\s-]?(\d{7})(?!\d)")
+DOB_RE = re.compile(r"(?<!\d)(\d{2})[/\-.](\d{2})[/\-.]((?:19|20)\d{2})(?!\d)")
+GENDER_RE = re.compile(r"\b(MALE|FEMALE|TRANSGENDER)\b", re.IGNORECASE)
+
+
+def verhoeff_valid(number: str) -> bool:
+    digits = re.sub(r"\D", "", number or "")
+    if not digits:
+        return False
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+def valid_aadhar(value) -> bool:
+    digits = re.sub(r"\D", "", str(value or ""))
+    return len(digits) == 12 and digits[0] not in "01" and verhoeff_valid(digits)
+
+
+def valid_pan(value) -> bool:
+    return bool(PAN_RE.fullmatch(str(value or "").strip().upper()))
+
+
+def valid_dl(value) -> bool:
+    return bool(DL_RE.fullmatch(str(value or "").strip().upper()))
+
+
+def valid_dob(value) -> bool:
+    """YYYY-MM-DD, a real date, not in the future."""
+    try:
+        d = date.fromisoformat(str(value or ""))
+    except ValueError:
+        return False
+    return date(1900, 1, 1) <= d <= date.today()
+
+
+# Fields with a strict validator; others are taken from the LLM as-is
+VALIDATORS = {
+    "Aadhar Number": valid_aadhar,
+    "PAN Number": valid_pan,
+    "DL Number": valid_dl,
+    "Date of Birth": valid_dob,
+}
+
+# --- OCR parsing ---
+
+Field = Tuple[str, float]  # (value, confidence)
+
+
+def _label_value(lines, i: int, label: re.Pattern) -> Optional[Field]:
+    """Value after a label on the same line ("Name: X"), else the whole next line."""
+    line = lines[i]
+    m = label.search(line.text)
+    rest = line.text[m.end():].lstrip(" :-/")
+    if len(rest) > 1:
+        start = len(line.text) - len(rest)
+        return rest.strip(), line.confidence(start)
+    if i + 1 < len(lines):
+        return lines[i + 1].text.strip(), lines[i + 1].confidence()
+    return None
+
+
+def _find_aadhar(lines) -> Optional[Field]:
+    for line in lines:
+        for m in AADHAR_RE.finditer(line.text):
+            number = " ".join(m.groups())
+            if verhoeff_valid(number):
+                return number, line.confidence(m.start(), m.end())
+    return None
+
+
+def _find_regex(lines, pattern: re.Pattern, fmt) -> Optional[Field]:
+    for line in lines:
+        m = pattern.search(line.text.upper())
+        if m:
+            return fmt(m), line.confidence(m.start(), m.end())
+    return None
+
+
+def _find_dob(lines) -> Tuple[Optional[Field], int]:
+    """First valid dd/mm/yyyy date as ISO, with the index of its line."""
+    for i, line in enumerate(lines):
+        for m in DOB_RE.finditer(line.text):
+            dd, mm, yyyy = m.groups()
+            iso = f"{yyyy}-{mm}-{dd}"
+            if valid_dob(iso):
+                return (iso, line.confidence(m.start(), m.end())), i
+    return None, -1
+
+
+_NAME_LABEL = re.compile(r"\bname\b", re.IGNORECASE)
+_FATHER_LABEL = re.compile(r"father'?s?\s*name", re.IGNORECASE)
+_ADDRESS_LABEL = re.compile(r"\badd(?:ress)?\b\s*:?", re.IGNORECASE)
+_NAME_CHARS = re.compile(r"^[A-Za-z][A-Za-z .']+$")
+
+
+def parse_ocr_fields(lines) -> Dict[str, Any]:
+    """
+    Pulls structured fields out of OCR lines with regexes and validators.
+    Returns {"Document Type", "Side", "fields": {field: (value, confidence)}}.
+    """
+    text = clean_ocr_text("\n".join(l.text for l in lines)).upper()
+    fields: Dict[str, Field] = {}
+
+    aadhar = _find_aadhar(lines)
+    pan = _find_regex(lines, PAN_RE, lambda m: m.group(1))
+    dl = _find_regex(lines, DL_RE, lambda m: f"{m.group(1)}{m.group(2)} {m.group(3)}{m.group(4)}")
+    dob, dob_line = _find_dob(lines)
+
+    if pan or "INCOME TAX" in text:
+        doc_type, side = "PAN", None
+    elif dl or "DRIVING" in text:
+        doc_type, side = "Driving Licence", None
+    elif aadhar or "AADHAAR" in text or "UNIQUE IDENTIFICATION" in text:
+        doc_type = "Aadhar"
+        side = "Back" if _ADDRESS_LABEL.search(text) and not GENDER_RE.search(text) else "Front"
+    else:
+        return {"Document Type": None, "Side": None, "fields": {}}
+
+    if dob:
+        fields["Date of Birth"] = dob
+    for i, line in enumerate(lines):
+        if doc_type != "Aadhar" and _FATHER_LABEL.search(line.text) and "Father Name" not in fields:
+            value = _label_value(lines, i, _FATHER_LABEL)
+            if value:
+                fields["Father Name"] = value
+        elif doc_type != "Aadhar" and _NAME_LABEL.search(line.text) and "Name" not in fields:
+            value = _label_value(lines, i, _NAME_LABEL)
+            if value:
+                fields["Name"] = value
+        if doc_type != "PAN" and _ADDRESS_LABEL.search(line.text) and "Address" not in fields:
+            # Address runs from the label to the end of the block (or the Aadhar number line)
+            rest = line.text[_ADDRESS_LABEL.search(line.text).end():].lstrip(" :-/")
+            parts = [(rest.strip(), line.confidence(len(line.text) - len(rest)))] if len(rest) > 1 else []
+            for nxt in lines[i + 1:]:
+                if AADHAR_RE.search(nxt.text):
+                    break
+                parts.append((nxt.text.strip(), nxt.confidence()))
+            if parts:
+                fields["Address"] = (", ".join(v for v, _ in parts), min(c for _, c in parts))
+
+    if doc_type == "Aadhar":
+        if aadhar:
+            fields["Aadhar Number"] = aadhar
+        gender = _find_regex(lines, GENDER_RE, lambda m: m.group(1).title())
+        if gender:
+            fields["Gender"] = gender
+        # On the front, the holder's name is the line just above the DOB line
+        if dob_line > 0 and _NAME_CHARS.match(lines[dob_line - 1].text.strip()):
+            fields["Name"] = (lines[dob_line - 1].text.strip(), lines[dob_line - 1].confidence())
+    elif doc_type == "PAN" and pan:
+        fields["PAN Number"] = pan
+    elif doc_type == "Driving Licence" and dl:
+        fields["DL Number"] = dl
+
+    # Names must look like names (OCR noise on photos produces symbol soup)
+    for key in ("Name", "Father Name"):
+        if key in fields and not _NAME_CHARS.match(fields[key][0]):
+            del fields[key]
+    return {"Document Type": doc_type, "Side": side, "fields": fields}
+
+
+def ocr_document(parsed: Dict[str, Any], filename: str, min_confidence: float = OCR_MIN_CONFIDENCE) -> Optional[Dict[str, Any]]:
+    """
+    Builds a document record from parsed OCR fields if every required field
+    for its type was found with at least min_confidence; None otherwise.
+    """
+    doc_type, side = parsed["Document Type"], parsed["Side"]
+    required = REQUIRED_FIELDS.get((doc_type, side))
+    if not required:
+        return None
+    fields = parsed["fields"]
+    if any(f not in fields or fields[f][1] < min_confidence for f in required):
+        return None
+
+    doc = {"Document Type": doc_type}
+    for key, (value, conf) in fields.items():
+        if conf >= min_confidence:
+            doc[key] = value
+    if doc_type == "Aadhar":
+        doc["Sides Detected"] = [side]
+    doc["Source Files"] = [filename]
+    doc["Field Sources"] = {key: "ocr" for key in doc if key not in ("Document Type", "Sides Detected", "Source Files")}
+    return doc
+
+
+def reconcile_with_ocr(doc: Dict[str, Any], partials: List[Dict[str, Any]], min_confidence: float = OCR_MIN_CONFIDENCE):
+    """
+    Tags an LLM record's fields as "llm", then fills in or corrects
+    checksum/format-validated fields (Aadhar, PAN, DL number, DOB) from
+    confident OCR reads of the same document: an LLM value that is missing
+    or fails its validator is replaced and tagged "ocr".
+    """
+    sources = {key: "llm" for key in doc if key not in ("Document Type", "Sides Detected", "Source Files", "Field Sources")}
+    for parsed in partials:
+        if not parsed["Document Type"] or parsed["Document Type"] not in (doc.get("Document Type") or ""):
+            continue
+        for key, validator in VALIDATORS.items():
+            if key not in parsed["fields"]:
+                continue
+            value, conf = parsed["fields"][key]
+            if conf >= min_confidence and validator(value) and not validator(doc.get(key)):
+                doc[key] = value
+                sources[key] = "ocr"
+    doc["Field Sources"] = sources
+    return doc
+
+
+async def extract_documents_tiered(backend, images_with_filenames: List[Dict[str, Any]], cache=None,
+                                   metrics: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """All records of iter_documents_tiered, as a list."""
+    return [doc async for doc in iter_documents_tiered(backend, images_with_filenames, cache=cache, metrics=metrics)]
+
+
+async def iter_documents_tiered(backend, images_with_filenames: List[Dict[str, Any]], cache=None,
+                                metrics: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Tier 1: OCR every page in parallel on the CPU pool and parse fields with
+    validators. Pages that yield a complete, confident document are answered
+    locally. Tier 2: the rest go to iter_all_documents (cache, batching).
+    Records are yielded as they are ready: OCR records first, then LLM
+    records as their replies stream in.
+    Every record gets "Field Sources" ({field: "ocr" | "llm"}).
+    With OCR_FAST_PATH off this is iter_all_documents, and records are
+    left as the LLM returned them (no "Field Sources").
+    """
+    metrics = metrics if metrics is not None else {}
+    if not OCR_FAST_PATH:
+        metrics["llm_pages"] = len(images_with_filenames)
+        async for doc in iter_all_documents(backend, images_with_filenames, cache=cache):
+            yield doc
+        return
+
+    from ocr_engine import ocr_page  # needs pytesseract; only imported when enabled
+
+    with span("ocr", pages=len(images_with_filenames)):
+        results = await asyncio.gather(
+            *(run_cpu(ocr_page, item["page"]) for item in images_with_filenames), return_exceptions=True
+        )
+
+    ocr_docs = []
+    escalate = []
+    partials_by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for item, result in zip(images_with_filenames, results):
+        if isinstance(result, Exception):
+            print(f"OCR failed for {item['filename']}: {result!r}")
+            escalate.append(item)
+            continue
+        parsed = parse_ocr_fields(result.lines)
+        doc = ocr_document(parsed, item["filename"])
+        if doc is not None:
+            ocr_docs.append(doc)
+        else:
+            escalate.append(item)
+            partials_by_file.setdefault(item["filename"], []).append(parsed)
+
+    metrics["ocr_pages"] = len(images_with_filenames)
+    metrics["ocr_documents"] = len(ocr_docs)
+    metrics["llm_pages"] = len(escalate)
+    metrics["llm_pages_avoided"] = len(images_with_filenames) - len(escalate)
+    print(f"OCR tier: {len(ocr_docs)} document(s) from {len(images_with_filenames) - len(escalate)} page(s); "
+          f"{len(escalate)} page(s) escalated to the LLM")
+    for doc in ocr_docs:
+        yield doc
+
+    if escalate:
+        async for doc in iter_all_documents(backend, escalate, cache=cache):
+            partials = [p for name in doc.get("Source Files") or [] for p in partials_by_file.get(name, [])]
+            yield reconcile_with_ocr(doc, partials)
@@ -0,0 +1,80 @@
+import os
+import time
+import asyncio
+import importlib
+from typing import Any, Dict
+
+from executors import run_cpu, cpu_executor
+
+# Third-party modules imported by preload(). In server.py this runs in the
+# master before forking, so workers share them copy-on-write. Only modules
+# that hold no sockets, files, threads or SQLite handles belong here; app
+# modules that open those (llm_extractor, extraction_cache, jobs) are
+# imported by each worker after the fork.
+PRELOAD_MODULES = os.environ.get(
+    "PRELOAD_MODULES",
+    "numpy,cv2,PIL.Image,fitz,httpx,openai,fastapi,starlette.staticfiles,pydantic",
+)
+# Pool processes started by warm_worker(), so the first request doesn't pay
+# for the forks. 0 starts the whole CPU pool.
+WARM_POOL_WORKERS = int(os.environ.get("WARM_POOL_WORKERS", 0))
+
+# "cold" -> "warming" -> "ready" (or "failed"); read by GET /ready
+state: Dict[str, Any] = {"status": "cold", "preload_ms": {}, "pool_workers": 0, "warm_ms": None, "error": None}
+
+
+def preload_models() -> int:
+    """Loads the face cascade and classifier templates into this process. Returns the pid (for pool warm-up)."""
+    from face_extractor import get_detector
+    from document_classifier import _load_templates
+    get_detector().cascade
+    _load_templates()
+    return os.getpid()
+
+
+def preload(modules: str = PRELOAD_MODULES) -> Dict[str, float]:
+    """
+    Imports the heavy modules and loads the models once. Idempotent; returns
+    ms per step. Modules that fail to import are reported and skipped: they
+    are imported again, lazily, on the path that needs them.
+    """
+    timings = state["preload_ms"]
+    if timings:
+        return timings
+    for name in filter(None, (m.strip() for m in modules.split(","))):
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Preload of {name} skipped: {e}")
+            continue
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    preload_models()
+    timings["models"] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+
+async def warm_worker():
+    """
+    Startup warm-up for one server process: preload() (a no-op when the
+    master already ran it), then start the CPU pool processes. GET /ready
+    answers 503 until this finishes.
+    """
+    state["status"] = "warming"
+    start = time.perf_counter()
+    try:
+        preload()
+        workers = WARM_POOL_WORKERS or cpu_executor.max_workers
+        pids = await asyncio.gather(*(run_cpu(preload_models) for _ in range(workers)))
+        state["pool_workers"] = len(set(pids))
+        state["status"] = "ready"
+    except Exception as e:
+        print(f"Warm-up failed: {e!r}")
+        state["status"] = "failed"
+        state["error"] = repr(e)
+    state["warm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def readiness() -> Dict[str, Any]:
+    return dict(state, pid=os.getpid(), worker=os.environ.get("SERVER_WORKER_INDEX"))